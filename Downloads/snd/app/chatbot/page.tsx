@@ -25,6 +25,8 @@ const ChatbotInterface = () => {
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const fileInputRef = useRef<HTMLInputElement>(null);
   const uploadedFileRef = useRef<File | null>(null);
+  // Keeps this tab's chat history separate on the backend
+  const [sessionId] = useState(() => crypto.randomUUID());
 
   useEffect(() => {
     const loadUser = async () => {
@@ -47,6 +49,7 @@ const ChatbotInterface = () => {
 
     const formData = new FormData();
     formData.append('file', file);
+    formData.append('session_id', sessionId);
 
     setIsLoading(true);
     try {
@@ -68,7 +71,7 @@ const ChatbotInterface = () => {
     } finally {
       setIsLoading(false);
     }
-  }, []);
+  }, [sessionId]);
 
   useEffect(() => {
     // Handle file upload from state if needed
@@ -127,7 +130,7 @@ const ChatbotInterface = () => {
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ message: input }),
+        body: JSON.stringify({ message: input, session_id: sessionId }),
       });
 
       if (!response.ok) {
@@ -0,0 +1,142 @@
+# activity_aggregator.py
+
+import csv
+import io
+import os
+import threading
+from datetime import date
+from typing import Dict, Optional, Tuple
+from activity_log import DEFAULT_SAMPLE_SECONDS, OpenSessionFile, daily_csv_filename, daily_sessions_filename
+
+
+class _CsvTail:
+    """Running per-category (and per-app) totals for one CSV file, read from a byte offset."""
+
+    def __init__(self, filename: str, sample_seconds: int):
+        self.filename = filename
+        self.sample_seconds = sample_seconds
+        self.reset()
+
+    def reset(self):
+        self.identity = None
+        self.offset = 0
+        self.category_index = None
+        self.duration_index = None
+        self.app_index = None
+        self.seconds_per_category: Dict[str, float] = {}
+        self.seconds_per_app: Dict[Tuple[str, str], float] = {}
+        self.rows = 0
+
+    def refresh(self):
+        """Read whatever was appended since the last call"""
+        try:
+            stat = os.stat(self.filename)
+        except OSError:
+            if self.identity is not None:
+                self.reset()
+            return
+
+        identity = (stat.st_dev, stat.st_ino)
+        if identity != self.identity or stat.st_size < self.offset:
+            # New, replaced or truncated file: rebuild from the start once
+            self.reset()
+            self.identity = identity
+        if stat.st_size == self.offset:
+            return
+
+        with open(self.filename, 'rb') as f:
+            f.seek(self.offset)
+            chunk = f.read(stat.st_size - self.offset)
+
+        # Only consume complete lines; a partially flushed row is picked up next time
+        end = chunk.rfind(b'\n')
+        if end < 0:
+            return
+        self.offset += end + 1
+        lines = io.StringIO(chunk[:end + 1].decode('utf-8', errors='replace'), newline='')
+        self._consume(csv.reader(lines))
+
+    def _consume(self, reader):
+        for row in reader:
+            if self.category_index is None:
+                # Header row: works for both the sample and the session format
+                if 'Category' not in row:
+                    continue
+                self.category_index = row.index('Category')
+                self.duration_index = row.index('Duration Seconds') if 'Duration Seconds' in row else None
+                self.app_index = row.index('App Name') if 'App Name' in row else None
+                continue
+            if len(row) <= self.category_index:
+                continue
+
+            seconds = self.sample_seconds
+            if self.duration_index is not None:
+                try:
+                    seconds = float(row[self.duration_index])
+                except (IndexError, ValueError):
+                    continue
+
+            category = row[self.category_index]
+            self.seconds_per_category[category] = self.seconds_per_category.get(category, 0) + seconds
+            if self.app_index is not None and len(row) > self.app_index:
+                key = (category, row[self.app_index])
+                self.seconds_per_app[key] = self.seconds_per_app.get(key, 0) + seconds
+            self.rows += 1
+
+
+class DailyActivityAggregator:
+    """In-memory per-category totals for a day's activity CSVs.
+
+    Instead of re-reading the whole day on every request, each call only parses
+    the rows appended since the previous call (O(new rows)). Files that are
+    replaced or truncated are detected and re-read once. The tracker's
+    open session (not in the CSV yet) is added to the totals of its day.
+    """
+
+    def __init__(self, directory: str = '', sample_seconds: int = DEFAULT_SAMPLE_SECONDS):
+        self.directory = directory
+        self.sample_seconds = sample_seconds
+        self._day = None
+        self._tails = []
+        self.open_session = OpenSessionFile(directory)
+        self._lock = threading.Lock()
+
+    def _switch_day(self, day: date):
+        self._day = day
+        self._tails = [_CsvTail(daily_csv_filename(day, self.directory), self.sample_seconds),
+                       _CsvTail(daily_sessions_filename(day, self.directory), self.sample_seconds)]
+
+    def _refreshed_tails(self, day: Optional[date]):
+        """The day's tails, caught up with the files (call with the lock held)"""
+        day = day or date.today()
+        if day != self._day:
+            self._switch_day(day)
+        for tail in self._tails:
+            tail.refresh()
+        return self._tails
+
+    def seconds_per_category(self, day: Optional[date] = None) -> Dict[str, float]:
+        """Total tracked seconds per (raw) category for day (defaults to today)"""
+        with self._lock:
+            totals: Dict[str, float] = {}
+            for tail in self._refreshed_tails(day):
+                for category, seconds in tail.seconds_per_category.items():
+                    totals[category] = totals.get(category, 0) + seconds
+            session = self.open_session.read(self._day)
+            if session:
+                category = session['Category']
+                totals[category] = totals.get(category, 0) + session['Duration Seconds']
+            return totals
+
+    def seconds_per_app(self, day: Optional[date] = None) -> Dict[Tuple[str, str], float]:
+        """Total tracked seconds per ((raw) category, app name) for day (defaults to today)"""
+        with self._lock:
+            totals: Dict[Tuple[str, str], float] = {}
+            for tail in self._refreshed_tails(day):
+                for key, seconds in tail.seconds_per_app.items():
+                    totals[key] = totals.get(key, 0) + seconds
+            session = self.open_session.read(self._day)
+            if session:
+                key = (session['Category'], session['App Name'])
+                totals[key] = totals.get(key, 0) + session['Duration Seconds']
+            return totals
@@ -0,0 +1,171 @@
+# activity_classifier.py
+
+import os
+import pickle
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from prediction_cache import PredictionCache
+from text_preprocessing import load_nltk, preprocessing
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BACKEND_DIR, 'model_reclassified.pkl')
+VECTORIZER_PATH = os.path.join(BACKEND_DIR, 'tfidf_vectorizer_reclassified.pkl')
+# Memory-mapped export of the pickles (python model_artifacts.py), shared between processes
+ARTIFACTS_DIR = os.path.join(BACKEND_DIR, 'model_artifacts')
+
+def normalize_category(category):
+    """Normalize all categories to only study, entertainment, or others."""
+    category_lower = category.lower()
+
+    # Map all categories to only 3 types
+    if category_lower in ['study', 'work', 'productivity']:
+        return 'study'
+    elif category_lower in ['entertainment', 'gaming', 'social']:
+        return 'entertainment'
+    else:
+        return 'others'
+
+def fold_probabilities(class_names, row):
+    """Sums class probabilities into the 3 normalized categories."""
+    probabilities = {}
+    for category, probability in zip(class_names, row):
+        probabilities[category] = probabilities.get(category, 0.0) + float(probability)
+    return {k: round(v, 4) for k, v in probabilities.items()}
+
+
+class ActivityClassifier:
+    """Window-title classifier (TF-IDF + model pickles) with a prediction cache.
+
+    Used in-process by both the Flask backend and the desktop tracker's
+    embedded mode. The pickles are re-checked every check_interval seconds
+    and reloaded, dropping cached predictions, when they change on disk.
+    When artifacts_dir holds an export of the current pickles, the model is
+    memory-mapped from there instead of unpickled.
+    """
+
+    def __init__(self, model_path: str = MODEL_PATH, vectorizer_path: str = VECTORIZER_PATH,
+                 cache_size: int = 2048, cache_ttl: float = 6 * 3600, check_interval: float = 10,
+                 artifacts_dir: Optional[str] = ARTIFACTS_DIR):
+        self.model_path = model_path
+        self.vectorizer_path = vectorizer_path
+        self.artifacts_dir = artifacts_dir
+        self.check_interval = check_interval
+        self.cache = PredictionCache(cache_size, cache_ttl)
+        self.model = None
+        self.vectorizer = None
+        self.source = None  # 'artifacts' or 'pickle'
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def is_ready(self) -> bool:
+        """True once the model and vectorizer are loaded"""
+        return self.model is not None and self.vectorizer is not None
+
+    def get_signature(self) -> Tuple[Optional[Tuple[int, int]], ...]:
+        """Identifies the current model files on disk by (mtime, size)"""
+        paths = [self.model_path, self.vectorizer_path]
+        if self.artifacts_dir:
+            paths.append(os.path.join(self.artifacts_dir, 'manifest.json'))
+        signature = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def load(self) -> bool:
+        """Load the model and vectorizer (artifacts if current, else pickles) and reset the prediction cache"""
+        try:
+            load_nltk()  # Preprocessing needs it for the first prediction anyway
+            signature = self.get_signature()
+            model, vectorizer = self.load_artifacts()
+            source = 'artifacts'
+            if model is None:
+                with open(self.model_path, 'rb') as f_model:
+                    model = pickle.load(f_model)
+                with open(self.vectorizer_path, 'rb') as f_vec:
+                    vectorizer = pickle.load(f_vec)
+                source = 'pickle'
+            self.model, self.vectorizer, self.source = model, vectorizer, source
+            self._signature = signature
+            self._checked_at = time.monotonic()
+            self.cache.clear()
+            print(f"✅ Model and vectorizer loaded successfully (from {source})")
+            return True
+        except Exception as e:
+            print(f"❌ Fatal Error: Could not load ML assets. {e}")
+            return False
+
+    def load_artifacts(self):
+        """(model, vectorizer) memory-mapped from artifacts_dir, or (None, None) if missing or stale"""
+        if not self.artifacts_dir:
+            return None, None
+        import model_artifacts
+        manifest = model_artifacts.read_manifest(self.artifacts_dir)
+        if manifest is None:
+            return None, None
+        if manifest['sources'] != model_artifacts.source_hashes(self.model_path, self.vectorizer_path):
+            print("⚠️  Model artifacts are out of date (re-run model_artifacts.py), using the pickles")
+            return None, None
+        return model_artifacts.load_artifacts(self.artifacts_dir, manifest)
+
+    def ensure_current(self):
+        """Reload the model when the pickles changed since the last check"""
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return
+            self._checked_at = now
+            if self.get_signature() != self._signature:
+                print("🔄 Model files changed on disk, reloading...")
+                self.load()
+
+    def classify(self, texts: List[str], with_probabilities: bool = False) -> List[Dict[str, Any]]:
+        """Classify raw texts, serving repeated titles from the prediction cache.
+
+        Returns one {'category', 'probabilities'} dict per input text, in order.
+        Cache misses are vectorized together in a single transform/predict call.
+        """
+        self.ensure_current()
+        model, vectorizer = self.model, self.vectorizer
+        if model is None or vectorizer is None:
+            raise RuntimeError("ML model not available.")
+
+        keys = [preprocessing(text) for text in texts]
+        results = [None] * len(keys)
+        misses = {}  # preprocessed text -> positions in the batch
+        for position, key in enumerate(keys):
+            cached = self.cache.get(key)
+            if cached is not None and (not with_probabilities or cached['probabilities'] is not None):
+                results[position] = cached
+            else:
+                misses.setdefault(key, []).append(position)
+
+        if misses:
+            miss_keys = list(misses)
+            text_tfidf = vectorizer.transform(miss_keys)
+            predicted_categories = model.predict(text_tfidf)
+            class_probabilities = model.predict_proba(text_tfidf) if with_probabilities else None
+            class_names = [normalize_category(str(c)) for c in model.classes_]
+
+            for index, key in enumerate(miss_keys):
+                entry = {
+                    'category': normalize_category(predicted_categories[index]),
+                    'probabilities': (fold_probabilities(class_names, class_probabilities[index])
+                                      if class_probabilities is not None else None)
+                }
+                self.cache.put(key, entry)
+                for position in misses[key]:
+                    results[position] = entry
+
+        return results
+
+    def predict_category(self, text: str) -> str:
+        """Classify a single text into study, entertainment or others"""
+        return self.classify([text])[0]['category']
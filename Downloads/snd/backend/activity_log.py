@@ -0,0 +1,288 @@
+# activity_log.py
+
+import csv
+import json
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+if TYPE_CHECKING:
+    import pandas as pd  # Imported where needed, so the CSV writer doesn't pay for pandas
+
+# One row per CHECK_INTERVAL sample
+CSV_COLUMNS = ['Timestamp', 'App Name', 'Window Title', 'Category']
+# One row per run of identical consecutive samples
+SESSION_COLUMNS = ['Start', 'End', 'App Name', 'Window Title', 'Category', 'Duration Seconds']
+# Common shape both formats are read into
+ACTIVITY_COLUMNS = ['Timestamp', 'App Name', 'Window Title', 'Category', 'Duration Seconds']
+DEFAULT_SAMPLE_SECONDS = 5
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def daily_csv_filename(day: Optional[date] = None, directory: str = '') -> str:
+    """Path of the activity CSV for a given day (defaults to today)."""
+    day = day or date.today()
+    return os.path.join(directory, f"desktop_activity_{day.strftime('%Y-%m-%d')}.csv")
+
+def daily_sessions_filename(day: Optional[date] = None, directory: str = '') -> str:
+    """Path of the run-length session CSV for a given day (defaults to today)."""
+    day = day or date.today()
+    return os.path.join(directory, f"desktop_sessions_{day.strftime('%Y-%m-%d')}.csv")
+
+def read_activity_file(filename: str, sample_seconds: int = DEFAULT_SAMPLE_SECONDS) -> 'pd.DataFrame':
+    """Reads a sample or session CSV into ACTIVITY_COLUMNS.
+
+    Sample rows count as sample_seconds each; session rows carry their own
+    duration. Missing, empty or unrecognized files give an empty frame.
+    """
+    import pandas as pd
+    empty = pd.DataFrame(columns=ACTIVITY_COLUMNS)
+    if not os.path.isfile(filename):
+        return empty
+    try:
+        df = pd.read_csv(filename)
+    except pd.errors.EmptyDataError:
+        return empty
+
+    if 'Duration Seconds' in df.columns and 'Start' in df.columns:
+        df = df.rename(columns={'Start': 'Timestamp'})
+        df['Duration Seconds'] = pd.to_numeric(df['Duration Seconds'], errors='coerce').fillna(0)
+    elif 'Timestamp' in df.columns:
+        df['Duration Seconds'] = sample_seconds
+    else:
+        return empty
+
+    if 'Category' not in df.columns:
+        return empty
+    return df.reindex(columns=ACTIVITY_COLUMNS)
+
+def load_day_activity(day: Optional[date] = None, directory: str = '',
+                      sample_seconds: int = DEFAULT_SAMPLE_SECONDS) -> 'pd.DataFrame':
+    """All activity for a day, from the sample CSV and/or the session CSV."""
+    import pandas as pd
+    frames = [read_activity_file(daily_csv_filename(day, directory), sample_seconds),
+              read_activity_file(daily_sessions_filename(day, directory), sample_seconds)]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=ACTIVITY_COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+def category_seconds(df: 'pd.DataFrame') -> Dict[str, float]:
+    """Total seconds per category for a frame from read_activity_file."""
+    if df.empty:
+        return {}
+    totals = df.groupby('Category')['Duration Seconds'].sum().sort_values(ascending=False)
+    return {category: float(seconds) for category, seconds in totals.items()}
+
+
+class ActivityCsvWriter:
+    """Long-lived, append-only writer for the daily activity CSV.
+
+    Keeps the current day's file open and writes rows with the stdlib csv
+    module. Rows are flushed every flush_rows rows or flush_interval seconds,
+    and the file is fsynced when it is closed. Each row goes to the file for
+    its own timestamp's date, so the writer rolls over at midnight.
+    """
+
+    def __init__(self, directory: str = '', columns: List[str] = CSV_COLUMNS,
+                 flush_rows: int = 12, flush_interval: float = 30,
+                 filename_for: Callable[[date, str], str] = daily_csv_filename):
+        self.directory = directory
+        self.columns = columns
+        self.filename_for = filename_for
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.filename = None
+        self._day = None
+        self._file = None
+        self._writer = None
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _open(self, day: date):
+        """Close the current file and open (or create) the one for day"""
+        self._close_file()
+        filename = self.filename_for(day, self.directory)
+        needs_header = not os.path.isfile(filename) or os.path.getsize(filename) == 0
+        self._file = open(filename, 'a', newline='', encoding='utf-8')
+        self._writer = csv.writer(self._file, lineterminator=os.linesep)  # Same line endings as pandas' to_csv
+        if needs_header:
+            self._writer.writerow(self.columns)
+        self.filename = filename
+        self._day = day
+
+    def write(self, record: Dict[str, Any], timestamp: datetime):
+        """Append one row to the file for timestamp's date"""
+        with self._lock:
+            if timestamp.date() != self._day:
+                self._open(timestamp.date())
+            self._writer.writerow([record.get(column, '') for column in self.columns])
+            self._pending += 1
+            if self._pending >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def flush_if_due(self):
+        """Flush buffered rows once flush_interval has passed (call periodically)"""
+        with self._lock:
+            if self._pending and time.monotonic() - self._last_flush >= self.flush_interval:
+                self._flush()
+
+    def flush(self):
+        """Flush buffered rows to the OS"""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """Flush, fsync and close the current file"""
+        with self._lock:
+            self._close_file()
+
+    def _flush(self):
+        if self._file:
+            self._file.flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def _close_file(self):
+        if self._file:
+            self._flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+        self._file = None
+        self._writer = None
+        self._day = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SessionCompactor:
+    """Merges consecutive identical samples into run-length sessions.
+
+    A session is extended while app, title and category stay the same and
+    samples keep arriving every sample_seconds. It is emitted when the
+    activity changes, a sample is missed, the date changes, or it reaches
+    max_session_seconds (which bounds what a crash can lose).
+
+    The open session is not emitted early; report_open() hands a snapshot of
+    it to readers (see OpenSessionFile) without splitting the row.
+    """
+
+    def __init__(self, emit: Callable[[Dict[str, Any]], None],
+                 sample_seconds: int = DEFAULT_SAMPLE_SECONDS, max_session_seconds: int = 300):
+        self.emit = emit
+        self.sample_seconds = sample_seconds
+        self.max_session_seconds = max_session_seconds
+        self._current = None
+        self._lock = threading.RLock()  # add() runs on the classifier thread, report_open() on the sampler's
+
+    def add(self, timestamp: datetime, app_name: str, window_title: str, category: str):
+        """Add one classified sample"""
+        key = (app_name, window_title, category)
+        with self._lock:
+            current = self._current
+            if current and current['key'] == key and self._continues(current, timestamp):
+                current['last'] = timestamp
+                current['samples'] += 1
+                return
+
+            self.flush()
+            self._current = {'key': key, 'start': timestamp, 'last': timestamp, 'samples': 1}
+
+    def _continues(self, current: Dict[str, Any], timestamp: datetime) -> bool:
+        gap = (timestamp - current['last']).total_seconds()
+        return (timestamp.date() == current['start'].date()
+                and gap <= self.sample_seconds * 1.5
+                and (current['samples'] + 1) * self.sample_seconds <= self.max_session_seconds)
+
+    def _session(self, current: Dict[str, Any]) -> Dict[str, Any]:
+        app_name, window_title, category = current['key']
+        return {
+            'start': current['start'],
+            'end': current['last'] + timedelta(seconds=self.sample_seconds),
+            'app_name': app_name,
+            'window_title': window_title,
+            'category': category,
+            'duration_seconds': current['samples'] * self.sample_seconds,
+        }
+
+    def report_open(self, report: Callable[[Optional[Dict[str, Any]]], None]):
+        """Pass the open session so far (None when there is none) to report, without emitting it
+
+        Runs under the same lock as emit, so a report never lands after the
+        session it describes has been emitted.
+        """
+        with self._lock:
+            report(self._session(self._current) if self._current else None)
+
+    def flush(self):
+        """Emit the open session, if any"""
+        with self._lock:
+            current = self._current
+            if not current:
+                return
+            self._current = None
+            self.emit(self._session(current))
+
+def session_to_csv_record(session: Dict[str, Any]) -> Dict[str, Any]:
+    """Maps a SessionCompactor session onto SESSION_COLUMNS."""
+    return {
+        'Start': session['start'].strftime(TIMESTAMP_FORMAT),
+        'End': session['end'].strftime(TIMESTAMP_FORMAT),
+        'App Name': session['app_name'],
+        'Window Title': session['window_title'],
+        'Category': session['category'],
+        'Duration Seconds': session['duration_seconds'],
+    }
+
+
+class OpenSessionFile:
+    """The tracker's open session, published beside the CSVs for readers.
+
+    Session rows are only written once a session ends, so readers add this
+    snapshot to today's totals (DailyActivityAggregator) to stay current.
+    The tracker replaces it periodically and clears it when the session is
+    written; a file left by a crash is cleared on the next start.
+    """
+
+    def __init__(self, directory: str = ''):
+        self.filename = os.path.join(directory, 'desktop_open_session.json')
+
+    def write(self, session: Optional[Dict[str, Any]]):
+        """Publish session (as from SessionCompactor), or clear the file for None"""
+        if session is None:
+            self.clear()
+            return
+        record = session_to_csv_record(session)
+        try:
+            with open(self.filename + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(record, f)
+            os.replace(self.filename + '.tmp', self.filename)
+        except OSError as e:
+            print(f"Could not publish the open session: {e}")
+
+    def clear(self):
+        try:
+            os.remove(self.filename)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Could not clear the open session: {e}")
+
+    def read(self, day: Optional[date] = None) -> Optional[Dict[str, Any]]:
+        """The published session (SESSION_COLUMNS record) if it started on day, else None"""
+        day = day or date.today()
+        try:
+            with open(self.filename, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+            if datetime.strptime(record['Start'], TIMESTAMP_FORMAT).date() != day:
+                return None
+            record['Duration Seconds'] = float(record['Duration Seconds'])
+            return record
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
@@ -0,0 +1,193 @@
+# activity_store.py
+"""
+Columnar (Parquet) store for closed days of activity history.
+
+Closed days are compacted from the daily CSVs into a hive-style,
+date-partitioned dataset (activity_store/date=YYYY-MM-DD/part-0.parquet) with
+dictionary-encoded app and category columns. Range queries only open the
+partitions they need and only decode the columns they ask for.
+
+Requires pyarrow (optional); without it the CSVs remain the only source.
+"""
+
+import glob
+import os
+import re
+from datetime import date
+from typing import List, Optional
+import pandas as pd
+from activity_log import (ACTIVITY_COLUMNS, DEFAULT_SAMPLE_SECONDS, daily_csv_filename,
+                          daily_sessions_filename, load_day_activity)
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+STORE_DIR = 'activity_store'
+STORE_COLUMNS = ['timestamp', 'app_name', 'window_title', 'category', 'duration_seconds']
+_CSV_DATE_PATTERN = re.compile(r"desktop_(?:activity|sessions)_(\d{4}-\d{2}-\d{2})\.csv$")
+
+
+class ActivityStore:
+    """Date-partitioned Parquet dataset of activity rows."""
+
+    def __init__(self, root: str = STORE_DIR, csv_directory: str = '',
+                 sample_seconds: int = DEFAULT_SAMPLE_SECONDS):
+        self.root = root
+        self.csv_directory = csv_directory
+        self.sample_seconds = sample_seconds
+
+    @staticmethod
+    def available() -> bool:
+        """True when pyarrow is installed"""
+        return pa is not None
+
+    def _partition_dir(self, day: date) -> str:
+        return os.path.join(self.root, f"date={day.isoformat()}")
+
+    def has_day(self, day: date) -> bool:
+        """True when day has been compacted into the store"""
+        return os.path.isfile(os.path.join(self._partition_dir(day), 'part-0.parquet'))
+
+    def is_stale(self, day: date) -> bool:
+        """True when day has CSVs that are missing from, or newer than, its partition"""
+        csv_mtimes = [os.path.getmtime(filename)
+                      for filename in (daily_csv_filename(day, self.csv_directory),
+                                       daily_sessions_filename(day, self.csv_directory))
+                      if os.path.isfile(filename)]
+        if not csv_mtimes:
+            return False
+        partition = os.path.join(self._partition_dir(day), 'part-0.parquet')
+        return not os.path.isfile(partition) or os.path.getmtime(partition) < max(csv_mtimes)
+
+    def days(self) -> List[date]:
+        """All compacted days, oldest first"""
+        found = []
+        for path in glob.glob(os.path.join(self.root, 'date=*')):
+            try:
+                found.append(date.fromisoformat(os.path.basename(path)[len('date='):]))
+            except ValueError:
+                continue
+        return sorted(found)
+
+    def compact_day(self, day: date, remove_csv: bool = False) -> int:
+        """Convert a day's sample/session CSVs into its Parquet partition.
+
+        Returns the number of rows written (0 if the day had no data).
+        """
+        if not self.available():
+            raise RuntimeError("pyarrow is not installed (pip install pyarrow)")
+
+        df = load_day_activity(day, self.csv_directory, self.sample_seconds)
+        if df.empty:
+            return 0
+
+        timestamps = pd.to_datetime(df['Timestamp'], format="%Y-%m-%d %H:%M:%S", errors='coerce')
+        table = pa.table({
+            'timestamp': pa.array(timestamps, type=pa.timestamp('s')),
+            'app_name': pa.array(df['App Name'].fillna('').astype(str)).dictionary_encode(),
+            'window_title': pa.array(df['Window Title'].fillna('').astype(str)),
+            'category': pa.array(df['Category'].fillna('').astype(str)).dictionary_encode(),
+            'duration_seconds': pa.array(df['Duration Seconds'].astype(float), type=pa.float64()),
+        })
+
+        partition_dir = self._partition_dir(day)
+        os.makedirs(partition_dir, exist_ok=True)
+        target = os.path.join(partition_dir, 'part-0.parquet')
+        # Write next to the target and swap in, so readers never see a half-written file
+        temp = target + '.tmp'
+        pq.write_table(table, temp, compression='zstd')
+        os.replace(temp, target)
+
+        if remove_csv:
+            for filename in (daily_csv_filename(day, self.csv_directory),
+                             daily_sessions_filename(day, self.csv_directory)):
+                if os.path.isfile(filename):
+                    os.remove(filename)
+        return table.num_rows
+
+    def compact_closed_days(self, today: Optional[date] = None, remove_csv: bool = False) -> List[date]:
+        """Compact every day before today whose CSVs are newer than its partition"""
+        today = today or date.today()
+        pattern = os.path.join(self.csv_directory or '.', 'desktop_*_*.csv')
+        csv_days = set()
+        for filename in glob.glob(pattern):
+            match = _CSV_DATE_PATTERN.search(os.path.basename(filename))
+            if not match:
+                continue
+            day = date.fromisoformat(match.group(1))
+            if day < today:
+                csv_days.add(day)
+
+        compacted = []
+        for day in sorted(csv_days):
+            if not self.is_stale(day):
+                continue
+            if self.compact_day(day, remove_csv=remove_csv):
+                compacted.append(day)
+        return compacted
+
+    def read(self, start: Optional[date] = None, end: Optional[date] = None,
+             columns: Optional[List[str]] = None, categories: Optional[List[str]] = None) -> pd.DataFrame:
+        """Rows between start and end (inclusive) as a DataFrame.
+
+        Date and category filters are pushed down to the Parquet scan, and only
+        the requested columns (plus 'date') are decoded.
+        """
+        columns = list(columns or STORE_COLUMNS)
+        if 'date' not in columns:
+            columns.append('date')
+        if not self.available() or not os.path.isdir(self.root):
+            return pd.DataFrame(columns=columns)
+
+        dataset = ds.dataset(self.root, format='parquet',
+                             partitioning=ds.partitioning(pa.schema([('date', pa.date32())]), flavor='hive'),
+                             exclude_invalid_files=True)
+        expression = None
+        conditions = []
+        if start:
+            conditions.append(ds.field('date') >= start)
+        if end:
+            conditions.append(ds.field('date') <= end)
+        if categories:
+            conditions.append(ds.field('category').isin(categories))
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        table = dataset.to_table(columns=columns, filter=expression)
+        return table.to_pandas()
+
+def load_day(day: Optional[date] = None, directory: str = '', store: Optional[ActivityStore] = None,
+             sample_seconds: int = DEFAULT_SAMPLE_SECONDS) -> pd.DataFrame:
+    """A day's activity in ACTIVITY_COLUMNS, from its CSVs or else from the store."""
+    day = day or date.today()
+    df = load_day_activity(day, directory, sample_seconds)
+    if not df.empty:
+        return df
+
+    store = store or ActivityStore(csv_directory=directory, sample_seconds=sample_seconds)
+    if not store.has_day(day):
+        return df
+    stored = store.read(day, day)
+    if stored.empty:
+        return df
+    return pd.DataFrame({
+        'Timestamp': stored['timestamp'].dt.strftime("%Y-%m-%d %H:%M:%S"),
+        'App Name': stored['app_name'].astype(str),
+        'Window Title': stored['window_title'],
+        'Category': stored['category'].astype(str),
+        'Duration Seconds': stored['duration_seconds'],
+    }, columns=ACTIVITY_COLUMNS)
+
+if __name__ == "__main__":
+    store = ActivityStore()
+    if not store.available():
+        print("❌ pyarrow is not installed (pip install pyarrow)")
+    else:
+        days = store.compact_closed_days()
+        print(f"✅ Compacted {len(days)} day(s) into {store.root}/")
+        for day in days:
+            print(f"   {day.isoformat()}")
@@ -0,0 +1,138 @@
+# auth_context.py
+"""
+Per-request user identity for the Flask backend.
+
+Requests carry a Supabase access token (`Authorization: Bearer <jwt>`); its
+`sub` claim is the user the request acts for. Tokens are HS256 JWTs signed
+with the project's JWT secret (Supabase dashboard > Settings > API), which is
+read from SUPABASE_JWT_SECRET and checked here with hmac, so no round trip to
+Supabase Auth is needed per request.
+
+Requests without a token act as the demo user, unless AUTH_REQUIRED=1.
+
+Internal calls (the tracker and importer telling the backend which cached
+dates changed) aren't made for a user: they are accepted from loopback, or
+only with the shared SERVICE_TOKEN (X-Service-Token header) when it is set.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+import uuid
+from typing import Any, Dict, Mapping, Optional
+
+DEMO_USER_ID = "00000000-0000-0000-0000-000000000001"
+JWT_SECRET_ENV = 'SUPABASE_JWT_SECRET'
+JWT_AUDIENCE = 'authenticated'  # Supabase's audience for signed-in users
+CLOCK_SKEW = 30  # seconds of leeway on exp/nbf
+SERVICE_TOKEN_ENV = 'SERVICE_TOKEN'
+SERVICE_TOKEN_HEADER = 'X-Service-Token'
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+
+class AuthError(Exception):
+    """The request's credentials were missing or invalid (HTTP 401)"""
+
+
+def _b64url_decode(segment: str) -> bytes:
+    return base64.urlsafe_b64decode(segment + '=' * (-len(segment) % 4))
+
+def decode_jwt(token: str, secret: str, audience: Optional[str] = JWT_AUDIENCE,
+               now: Optional[float] = None) -> Dict[str, Any]:
+    """Verify an HS256 JWT and return its claims; raises AuthError"""
+    try:
+        header_b64, payload_b64, signature_b64 = token.split('.')
+        header = json.loads(_b64url_decode(header_b64))
+        claims = json.loads(_b64url_decode(payload_b64))
+        signature = _b64url_decode(signature_b64)
+    except (ValueError, TypeError):
+        raise AuthError("Malformed token")
+
+    if header.get('alg') != 'HS256':
+        raise AuthError(f"Unsupported token algorithm {header.get('alg')!r}")
+    expected = hmac.new(secret.encode('utf-8'), f"{header_b64}.{payload_b64}".encode('ascii'),
+                        hashlib.sha256).digest()
+    if not hmac.compare_digest(signature, expected):
+        raise AuthError("Invalid token signature")
+
+    now = time.time() if now is None else now
+    if 'exp' in claims and now > claims['exp'] + CLOCK_SKEW:
+        raise AuthError("Token expired")
+    if 'nbf' in claims and now < claims['nbf'] - CLOCK_SKEW:
+        raise AuthError("Token not yet valid")
+    if audience is not None:
+        aud = claims.get('aud')
+        if audience not in (aud if isinstance(aud, list) else [aud]):
+            raise AuthError("Token audience mismatch")
+    return claims
+
+def encode_jwt(claims: Dict[str, Any], secret: str) -> str:
+    """Sign claims as an HS256 JWT (for scripts and tests)"""
+    def segment(data: Dict[str, Any]) -> str:
+        raw = json.dumps(data, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+    signing_input = f"{segment({'alg': 'HS256', 'typ': 'JWT'})}.{segment(claims)}"
+    signature = hmac.new(secret.encode('utf-8'), signing_input.encode('ascii'), hashlib.sha256).digest()
+    return f"{signing_input}.{base64.urlsafe_b64encode(signature).rstrip(b'=').decode('ascii')}"
+
+def user_id_from_headers(headers: Mapping[str, str], secret: Optional[str] = None,
+                         require_auth: Optional[bool] = None) -> str:
+    """The user a request acts for: the token's subject, or the demo user when there is no token"""
+    if secret is None:
+        secret = os.getenv(JWT_SECRET_ENV)
+    if require_auth is None:
+        require_auth = os.getenv('AUTH_REQUIRED', '0') == '1'
+
+    authorization = headers.get('Authorization', '')
+    if not authorization:
+        if require_auth:
+            raise AuthError("Missing Authorization header")
+        return DEMO_USER_ID
+
+    scheme, _, token = authorization.partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        raise AuthError("Expected 'Authorization: Bearer <token>'")
+    if not secret:
+        raise AuthError(f"Token verification is not configured (set {JWT_SECRET_ENV})")
+
+    subject = decode_jwt(token.strip(), secret).get('sub')
+    try:
+        return str(uuid.UUID(str(subject)))
+    except ValueError:
+        raise AuthError("Token subject is not a user id")
+
+def service_headers(token: Optional[str] = None) -> Dict[str, str]:
+    """Headers for an internal call (empty when no service token is configured)"""
+    token = token if token is not None else os.getenv(SERVICE_TOKEN_ENV)
+    return {SERVICE_TOKEN_HEADER: token} if token else {}
+
+def is_trusted_service(headers: Mapping[str, str], remote_addr: Optional[str],
+                       token: Optional[str] = None) -> bool:
+    """True for internal calls: the service token when one is set, else loopback only"""
+    token = token if token is not None else os.getenv(SERVICE_TOKEN_ENV)
+    if token:
+        return hmac.compare_digest(headers.get(SERVICE_TOKEN_HEADER, '').encode('utf-8'), token.encode('utf-8'))
+    return remote_addr in LOOPBACK_ADDRESSES
+
+if __name__ == "__main__":
+    # Self-check with a throwaway secret
+    secret = 'test-secret'
+    user = '3f1c2b7a-0000-4000-8000-000000000042'
+    token = encode_jwt({'sub': user, 'aud': JWT_AUDIENCE, 'exp': time.time() + 60}, secret)
+    assert user_id_from_headers({'Authorization': f'Bearer {token}'}, secret) == user
+    assert user_id_from_headers({}, secret) == DEMO_USER_ID
+    for bad in (token[:-2] + 'xx', encode_jwt({'sub': user, 'aud': JWT_AUDIENCE, 'exp': time.time() - 60}, secret),
+                encode_jwt({'sub': user, 'aud': JWT_AUDIENCE}, 'other-secret'), 'not-a-token'):
+        try:
+            user_id_from_headers({'Authorization': f'Bearer {bad}'}, secret)
+            raise SystemExit("❌ Accepted an invalid token")
+        except AuthError as e:
+            print(f"✅ Rejected: {e}")
+    assert is_trusted_service({}, '127.0.0.1', token='') and not is_trusted_service({}, '10.0.0.5', token='')
+    assert is_trusted_service(service_headers('s3cret'), '10.0.0.5', token='s3cret')
+    assert not is_trusted_service({}, '127.0.0.1', token='s3cret')
+    print("✅ Service calls: loopback without a token, token required once set")
+    print("✅ Token checks passed")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark the phone usage aggregation on synthetic app_usage_logs rows
+Compares the original per-row loops from flask_backend_step2.py with
+phone_usage_analytics.py and checks that both produce the same totals
+"""
+
+import random
+import time
+from datetime import datetime, timedelta, timezone
+import phone_usage_analytics as analytics
+
+ROWS = 100_000
+REPEATS = 3
+APPS = ['WhatsApp', 'YouTube', 'Chrome', 'Instagram', 'Spotify', 'Maps', 'Gmail', 'Telegram',
+        'Netflix', 'Reddit', 'Camera', 'Settings', 'Duolingo', 'Kindle', 'Discord', 'X']
+
+# --- Original implementation (copied from flask_backend_step2.py) ---
+
+def parse_phone_duration(duration_str):
+    parts = duration_str.split(':')
+    if len(parts) == 3:
+        hours, minutes, seconds = map(int, parts)
+        return hours * 3600 + minutes * 60 + seconds
+    if len(parts) == 2:
+        minutes, seconds = map(int, parts)
+        return minutes * 60 + seconds
+    return 0
+
+def legacy_by_app(rows):
+    app_times = {}
+    for log in rows:
+        app_name = log.get('app_name', 'Unknown')
+        duration_str = log.get('duration', '00:00:00')
+        try:
+            app_times[app_name] = app_times.get(app_name, 0) + parse_phone_duration(duration_str)
+        except Exception:
+            pass
+    return [{'app_name': app, 'total_seconds': seconds}
+            for app, seconds in sorted(app_times.items(), key=lambda x: x[1], reverse=True)]
+
+def legacy_by_day(rows):
+    daily_top_apps = {}
+    for log in rows:
+        created_at = log.get('created_at', '')
+        log_date = created_at.split('T')[0] if 'T' in created_at else created_at[:10]
+        app_name = log.get('app_name', 'Unknown')
+        try:
+            seconds = parse_phone_duration(log.get('duration', '00:00:00'))
+        except Exception:
+            continue
+        apps = daily_top_apps.setdefault(log_date, {})
+        apps[app_name] = apps.get(app_name, 0) + seconds
+    return [{'usage_date': day, 'total_seconds': sum(apps.values()),
+             'top_app': max(apps.items(), key=lambda x: x[1])[0]}
+            for day, apps in sorted(daily_top_apps.items())]
+
+# --- Benchmark ---
+
+def build_rows(count):
+    """A week of logs in Supabase's shape (UTC timestamps, mixed duration formats)"""
+    rng = random.Random(42)
+    start = datetime(2026, 10, 10, tzinfo=timezone.utc)
+    rows = []
+    for _ in range(count):
+        minutes, seconds = rng.randrange(60), rng.randrange(60)
+        duration = (f"{rng.randrange(3):02d}:{minutes:02d}:{seconds:02d}" if rng.random() < 0.8
+                    else f"{minutes}:{seconds:02d}")
+        rows.append({
+            'app_name': rng.choice(APPS),
+            'duration': duration,
+            'created_at': (start + timedelta(seconds=rng.randrange(7 * 86400))).isoformat()
+        })
+    return rows
+
+def measure(function):
+    """Best of REPEATS runs, in seconds"""
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+if __name__ == "__main__":
+    rows = build_rows(ROWS)
+    print(f"📱 {len(rows):,} synthetic app_usage_logs rows")
+
+    before_app, legacy_apps = measure(lambda: legacy_by_app(rows))
+    before_day, legacy_days = measure(lambda: legacy_by_day(rows))
+    load_apps, app_frame = measure(lambda: analytics.to_frame(rows, dates=False))  # As the per-app endpoint loads it
+    load, frame = measure(lambda: analytics.to_frame(rows))
+    after_app, apps = measure(lambda: analytics.usage_by_app(app_frame))
+    after_day, days = measure(lambda: analytics.usage_by_day(frame))
+
+    # Totals must match; ties between apps may be ordered differently
+    same_apps = sorted(map(tuple, map(dict.values, legacy_apps))) == sorted(map(tuple, map(dict.values, apps)))
+    same_days = [(d['usage_date'], d['total_seconds']) for d in legacy_days] == \
+                [(d['usage_date'], d['total_seconds']) for d in days]
+    print(f"{'✅' if same_apps and same_days else '❌'} Same per-app and per-day totals")
+
+    print(f"Per app  before: {before_app * 1000:8.1f} ms   after: {(load_apps + after_app) * 1000:8.1f} ms "
+          f"({after_app * 1000:.1f} ms on a loaded frame)")
+    print(f"Per day  before: {before_day * 1000:8.1f} ms   after: {(load + after_day) * 1000:8.1f} ms "
+          f"({after_day * 1000:.1f} ms on a loaded frame)")
+    print(f"Loading the frame (parse durations + timestamps): {load * 1000:.1f} ms, "
+          f"without timestamps: {load_apps * 1000:.1f} ms")
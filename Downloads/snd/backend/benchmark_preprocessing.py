@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark the text preprocessing pipeline on the bundled CSV data
+Compares the original notebook implementation with text_preprocessing.py
+and checks that both produce exactly the same output
+"""
+
+import csv
+import glob
+import re
+import time
+from nltk.corpus import stopwords
+from nltk import PorterStemmer
+from text_preprocessing import preprocessing
+
+REPEATS = 5
+
+# --- Original implementation (copied from flask_backend_step2.py) ---
+
+stop_words = set(stopwords.words('english'))
+port_stemmer = PorterStemmer()
+def legacy_preprocessing(text):
+    text = text.lower()
+    text = re.sub(r"http\S+", "", text)
+    text = re.sub(r"[^a-zA-Z]", " ", text)
+    text = re.sub(r"\s+", " ", text)
+    text = re.sub(r'[^\w\s,.!?]', '', text)
+    text = text.split()
+    text = [port_stemmer.stem(word) for word in text if not word in stop_words]
+    return ' '.join(text)
+
+def load_titles():
+    """Builds the same "<process> <title>" strings the tracker sends to /predict"""
+    titles = []
+    for filename in sorted(glob.glob("desktop_activity_*.csv")):
+        with open(filename, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                titles.append(f"{row['App Name']} {row['Window Title']}")
+    return titles
+
+def measure(function, titles):
+    """Returns titles/sec over REPEATS passes"""
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        for title in titles:
+            function(title)
+    elapsed = time.perf_counter() - start
+    return len(titles) * REPEATS / elapsed
+
+if __name__ == "__main__":
+    titles = load_titles()
+    if not titles:
+        print("❌ No desktop_activity_*.csv files found (run from the backend folder)")
+        raise SystemExit(1)
+
+    mismatches = [t for t in titles if legacy_preprocessing(t) != preprocessing(t)]
+    print(f"📁 {len(titles)} titles, {len(set(titles))} distinct")
+    print(f"{'✅' if not mismatches else '❌'} Identical output: {len(titles) - len(mismatches)}/{len(titles)}")
+    for title in mismatches[:5]:
+        print(f"   {title!r}: {legacy_preprocessing(title)!r} != {preprocessing(title)!r}")
+
+    before = measure(legacy_preprocessing, titles)
+    after = measure(preprocessing, titles)
+    print(f"Before: {before:,.0f} titles/sec")
+    print(f"After:  {after:,.0f} titles/sec ({after / before:.1f}x)")
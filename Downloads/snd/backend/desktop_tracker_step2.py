@@ -1,28 +1,48 @@
 # desktop_tracker_step2.py
 
 import time
+import queue
+import threading
 import psutil
 import win32gui
 import win32process
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
-import os
-from datetime import datetime
+from datetime import date, datetime
 from supabase_helper import SupabaseHelper
+from activity_store import ActivityStore, load_day
+from activity_log import (ActivityCsvWriter, OpenSessionFile, SessionCompactor, CSV_COLUMNS, SESSION_COLUMNS,
+                          category_seconds, daily_csv_filename, daily_sessions_filename,
+                          session_to_csv_record)
+from activity_classifier import ActivityClassifier
+from sync_queue import SyncSpool, SupabaseSyncWorker
+from query_cache import notify_invalidation
+from serve import backend_url
 
 # --- Configuration ---
-FLASK_API_URL = "http://127.0.0.1:5000/predict"
+FLASK_API_URL = backend_url('/predict')  # BACKEND_HOST/BACKEND_PORT, as for serve.py
+CACHE_INVALIDATE_URL = backend_url('/api/cache/invalidate')  # Told which dates changed after each sync
+CLASSIFIER_MODE = "embedded"  # "embedded" = classify in-process, "http" = ask the Flask backend
+EMBEDDED_RETRY_INTERVAL = 300  # seconds before retrying a failed embedded model load
 CHECK_INTERVAL = 5  # seconds
-CSV_COLUMNS = ['Timestamp', 'App Name', 'Window Title', 'Category']
+HTTP_POOL_SIZE = 2  # Keep-alive connections to the Flask backend
+CLASSIFY_BACKLOG_WARNING = 20  # Warn when this many samples are waiting for a category
+CSV_FLUSH_ROWS = 12  # Flush the sample CSV after this many rows (session rows are flushed at once)...
+CSV_FLUSH_INTERVAL = 30  # ...or after this many seconds, whichever comes first
+COMPACT_SESSIONS = True  # Log runs of identical samples as one session row (desktop_sessions_*.csv)
+MAX_SESSION_SECONDS = 300  # Split long sessions so a crash loses at most this much
+OPEN_SESSION_INTERVAL = 30  # seconds between snapshots of the open session for the dashboard
 USE_SUPABASE = False  # Set to False to use CSV only (avoiding Supabase errors)
-BATCH_SIZE = 1  # Number of activities to batch before sending to Supabase (1 = immediate sync)
+BATCH_SIZE = 20  # Send to Supabase once this many activities are spooled...
+SYNC_MAX_BATCH_AGE = 30  # ...or once the oldest spooled activity is this many seconds old
+SYNC_MAX_BACKOFF = 300  # Upper bound (seconds) for the retry delay while Supabase is unreachable
 
 # --- Core Functions ---
 
 def get_daily_csv_filename():
     """Generates the CSV filename for the current day."""
-    today = datetime.now().strftime("%Y-%m-%d")
-    return f"desktop_activity_{today}.csv"
+    return daily_sessions_filename() if COMPACT_SESSIONS else daily_csv_filename()
 
 def get_active_window_info():
     """Get the process name and window title of the currently active window."""
@@ -36,13 +56,43 @@ def get_active_window_info():
     except (psutil.NoSuchProcess, win32gui.error, psutil.AccessDenied):
         return None, None
 
-def get_category(process_name, window_title):
+_embedded_classifier = None
+_embedded_failed_at = None
+
+def get_embedded_classifier():
+    """Loads the model pickles in-process on first use (None if unavailable)."""
+    global _embedded_classifier, _embedded_failed_at
+    if _embedded_classifier is not None:
+        return _embedded_classifier
+    if _embedded_failed_at is not None and time.monotonic() - _embedded_failed_at < EMBEDDED_RETRY_INTERVAL:
+        return None
+
+    classifier = ActivityClassifier()
+    if classifier.load():
+        _embedded_classifier = classifier
+        _embedded_failed_at = None
+        return classifier
+
+    print("Embedded classifier unavailable, falling back to the Flask backend.")
+    _embedded_failed_at = time.monotonic()
+    return None
+
+_http_session = None
+
+def get_http_session():
+    """Returns a pooled keep-alive session for talking to the Flask backend."""
+    global _http_session
+    if _http_session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount('http://', adapter)
+        _http_session = session
+    return _http_session
+
+def get_category_http(text_to_predict):
     """Send activity data to the Flask backend and get a category prediction."""
-    if not process_name or not window_title:
-        return 'Uncategorized'
     try:
-        text_to_predict = f"{process_name} {window_title}"
-        response = requests.post(FLASK_API_URL, json={'text': text_to_predict}, timeout=3)
+        response = get_http_session().post(FLASK_API_URL, json={'text': text_to_predict}, timeout=3)
         if response.status_code == 200:
             return response.json().get('category', 'Uncategorized')
         else:
@@ -55,25 +105,82 @@ def get_category(process_name, window_title):
         print(f"An unexpected error occurred during prediction: {e}")
         return 'Uncategorized'
 
-def append_to_csv(filename, record):
-    """Appends a new record to the specified CSV file."""
-    file_exists = os.path.isfile(filename)
-    df = pd.DataFrame([record])
-    df.to_csv(filename, mode='a', header=not file_exists, index=False)
+def get_category(process_name, window_title):
+    """Classify the active window, in-process when possible, else over HTTP."""
+    if not process_name or not window_title:
+        return 'Uncategorized'
+    text_to_predict = f"{process_name} {window_title}"
+
+    if CLASSIFIER_MODE == "embedded":
+        classifier = get_embedded_classifier()
+        if classifier:
+            try:
+                return classifier.predict_category(text_to_predict)
+            except Exception as e:
+                print(f"Embedded prediction failed, using the Flask backend: {e}")
 
-def load_and_calculate_time(filename):
-    """Loads the daily CSV and calculates cumulative time per category."""
-    if not os.path.isfile(filename):
-        return {}
+    return get_category_http(text_to_predict)
+
+class ClassificationWorker(threading.Thread):
+    """Classifies sampled windows off the sampling thread.
+
+    The sampler only captures (timestamp, app, title) and queues it, so a slow
+    or unreachable classifier delays when a record is written, never when the
+    next sample is taken or what timestamp it gets.
+    """
+
+    def __init__(self, on_record):
+        super().__init__(name="classification-worker", daemon=True)
+        self.on_record = on_record
+        self.samples = queue.Queue()
+
+    def submit(self, timestamp, process_name, window_title):
+        """Queue a sample for classification (never blocks)."""
+        self.samples.put((timestamp, process_name, window_title))
+        backlog = self.samples.qsize()
+        if backlog >= CLASSIFY_BACKLOG_WARNING and backlog % CLASSIFY_BACKLOG_WARNING == 0:
+            print(f"⚠️  Classifier is falling behind ({backlog} samples waiting)")
+
+    def run(self):
+        while True:
+            sample = self.samples.get()
+            if sample is None:
+                break
+            timestamp, process_name, window_title = sample
+            try:
+                category = get_category(process_name, window_title)
+                self.on_record(timestamp, process_name, window_title, category)
+            except Exception as e:
+                print(f"Error recording activity: {e}")
+
+    def stop(self):
+        """Finish the queued samples, then stop the worker."""
+        self.samples.put(None)
+        self.join()
+
+def invalidate_dashboard_cache(activities):
+    """Tells the Flask backend which dates just changed in Supabase (best effort)."""
+    days = {datetime.fromisoformat(activity['timestamp']).date() for activity in activities}
+    notify_invalidation(days, CACHE_INVALIDATE_URL, session=get_http_session())
+
+def load_and_calculate_time(day=None):
+    """Loads the day's activity (CSVs, or the columnar store for compacted days) and calculates cumulative time per category."""
     try:
-        df = pd.read_csv(filename)
-        # Each row represents one CHECK_INTERVAL
-        time_per_category = (df['Category'].value_counts() * CHECK_INTERVAL).to_dict()
-        return {k: v for k, v in time_per_category.items()}
-    except (pd.errors.EmptyDataError, KeyError):
-        # Handle empty or malformed CSV
+        return category_seconds(load_day(day, sample_seconds=CHECK_INTERVAL))
+    except Exception as e:
+        # Handle malformed CSV
+        print(f"Could not summarize activity: {e}")
         return {}
 
+def compact_history(activity_store):
+    """Compacts closed days into the columnar store (best effort)."""
+    try:
+        compacted = activity_store.compact_closed_days()
+        if compacted:
+            print(f"🗜️  Compacted {len(compacted)} closed day(s) into {activity_store.root}/")
+    except Exception as e:
+        print(f"⚠️  Could not compact activity history: {e}")
+
 def print_summary(time_per_category):
     """Prints a summary table of time spent per category."""
     print("\n--- Activity Summary ---")
@@ -93,78 +200,152 @@ def print_summary(time_per_category):
 def start_tracking():
     """The main loop to run the tracker and log activity to CSV and Supabase."""
     csv_filename = get_daily_csv_filename()
+    if COMPACT_SESSIONS:
+        csv_writer = ActivityCsvWriter(columns=SESSION_COLUMNS, flush_rows=CSV_FLUSH_ROWS,
+                                       flush_interval=CSV_FLUSH_INTERVAL,
+                                       filename_for=daily_sessions_filename)
+    else:
+        csv_writer = ActivityCsvWriter(columns=CSV_COLUMNS, flush_rows=CSV_FLUSH_ROWS,
+                                       flush_interval=CSV_FLUSH_INTERVAL)
     print("=" * 60)
     print("🚀 Starting Desktop Activity Tracker")
     print("=" * 60)
-    print(f"📁 CSV Logging: {csv_filename}")
+    print(f"📁 CSV Logging: {csv_filename}{' (sessions)' if COMPACT_SESSIONS else ''}")
+    print(f"🤖 Classifier: {'Embedded (HTTP fallback)' if CLASSIFIER_MODE == 'embedded' else 'Flask backend'}")
     
     # Initialize Supabase
     supabase_helper = None
-    activity_buffer = []
+    sync_worker = None
     
     if USE_SUPABASE:
         try:
             supabase_helper = SupabaseHelper()
             supabase_helper.set_user_id("00000000-0000-0000-0000-000000000001")  # Demo user for testing (valid UUID)
-            print(f"💾 Supabase: Enabled (batch size: {BATCH_SIZE})")
+            # Rows are spooled to disk and sent in the background, so a slow or
+            # offline Supabase never blocks tracking and nothing is lost on exit.
+            # Errors are raised so rejected rows can be told from an outage
+            sync_worker = SupabaseSyncWorker(lambda batch: supabase_helper.upsert_activity_batch(batch, raise_errors=True),
+                                             SyncSpool(),
+                                             user_id=supabase_helper.user_id, batch_size=BATCH_SIZE,
+                                             max_batch_age=SYNC_MAX_BATCH_AGE, max_backoff=SYNC_MAX_BACKOFF,
+                                             on_synced=invalidate_dashboard_cache)
+            pending = sync_worker.spool.count()
+            sync_worker.start()
+            print(f"💾 Supabase: Enabled (batch size: {BATCH_SIZE}, max age: {SYNC_MAX_BATCH_AGE}s)")
+            if pending:
+                print(f"   Resuming sync of {pending} spooled activities")
+            failed = sync_worker.spool.failed_count()
+            if failed:
+                print(f"   {failed} activities were rejected by Supabase (failed table of {sync_worker.spool.path})")
         except Exception as e:
             print(f"⚠️  Supabase: Disabled ({e})")
             print("   Falling back to CSV only")
     else:
         print(f"💾 Supabase: Disabled (CSV only)")
     
+    # Compact finished days into the columnar store (needs pyarrow)
+    activity_store = ActivityStore(sample_seconds=CHECK_INTERVAL)
+    if activity_store.available():
+        compact_history(activity_store)
+    tracking_day = date.today()
+
     print("=" * 60)
     print("Press Ctrl+C to stop tracking\n")
 
+    def queue_for_supabase(timestamp, process_name, window_title, category, duration_seconds):
+        """Spools one activity row for the background Supabase sync."""
+        if not sync_worker:
+            return
+        sync_worker.enqueue({
+            'app_name': process_name,
+            'window_title': window_title,
+            'category': category,
+            'duration_seconds': duration_seconds,
+            'timestamp': timestamp.isoformat(),
+            'date': timestamp.date().isoformat()
+        })
+
+    # Readers add the open session's snapshot to today's totals, so they see
+    # ongoing activity without the session being split into extra rows
+    open_session = OpenSessionFile()
+    open_session.clear()  # Left over from a crash; its samples were never written
+
+    def record_session(session):
+        """Writes one finished run-length session to CSV and the Supabase spool."""
+        # The writer switches to the next day's file at midnight. Session rows are
+        # few, so each is flushed at once: the snapshot is cleared as it becomes visible
+        csv_writer.write(session_to_csv_record(session), session['start'])
+        csv_writer.flush()
+        open_session.clear()
+        queue_for_supabase(session['start'], session['app_name'], session['window_title'],
+                           session['category'], session['duration_seconds'])
+
+    compactor = SessionCompactor(record_session, CHECK_INTERVAL, MAX_SESSION_SECONDS) if COMPACT_SESSIONS else None
+    next_snapshot = time.monotonic() + OPEN_SESSION_INTERVAL
+
+    def record_activity(timestamp, process_name, window_title, category):
+        """Records one classified sample (runs on the worker thread)."""
+        if compactor:
+            compactor.add(timestamp, process_name, window_title, category)
+        else:
+            record = {
+                'Timestamp': timestamp.strftime("%Y-%m-%d %H:%M:%S"),
+                'App Name': process_name,
+                'Window Title': window_title,
+                'Category': category
+            }
+            # Save to CSV (the writer switches to the next day's file at midnight)
+            csv_writer.write(record, timestamp)
+            queue_for_supabase(timestamp, process_name, window_title, category, CHECK_INTERVAL)
+
+        print(f"[{timestamp.strftime('%H:%M:%S')}] {category.upper():15} | {process_name}")
+
+    worker = ClassificationWorker(record_activity)
+    worker.start()
+
     try:
+        # Fixed-rate clock: each tick is scheduled from the previous one, not
+        # from when the previous iteration happened to finish.
+        next_tick = time.monotonic()
         while True:
             process_name, window_title = get_active_window_info()
-            
-            # We get the category even if the window info is partial to handle edge cases
-            category = get_category(process_name, window_title)
 
             if process_name and window_title:
-                timestamp = datetime.now()
-                record = {
-                    'Timestamp': timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-                    'App Name': process_name,
-                    'Window Title': window_title,
-                    'Category': category
-                }
-                
-                # Save to CSV
-                append_to_csv(csv_filename, record)
-                
-                # Add to Supabase buffer
-                if supabase_helper:
-                    activity_buffer.append({
-                        'app_name': process_name,
-                        'window_title': window_title,
-                        'category': category,
-                        'duration_seconds': CHECK_INTERVAL,
-                        'timestamp': timestamp.isoformat(),
-                        'date': timestamp.date().isoformat()
-                    })
-                    
-                    # Send batch to Supabase
-                    if len(activity_buffer) >= BATCH_SIZE:
-                        if supabase_helper.insert_activity_batch(activity_buffer):
-                            print(f"✅ Synced {len(activity_buffer)} activities to Supabase")
-                        activity_buffer = []
-                
-                print(f"[{timestamp.strftime('%H:%M:%S')}] {category.upper():15} | {process_name}")
-            
-            time.sleep(CHECK_INTERVAL)
+                worker.submit(datetime.now(), process_name, window_title)
+            csv_writer.flush_if_due()
+            if compactor and time.monotonic() >= next_snapshot:
+                compactor.report_open(open_session.write)
+                next_snapshot = time.monotonic() + OPEN_SESSION_INTERVAL
+
+            if date.today() != tracking_day:
+                # Past midnight: compact the day that just closed, off the sampling thread
+                tracking_day = date.today()
+                if activity_store.available():
+                    threading.Thread(target=compact_history, args=(activity_store,),
+                                     name="history-compaction", daemon=True).start()
+
+            next_tick += CHECK_INTERVAL
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind (e.g. the machine was suspended): resync instead of bursting
+                next_tick = time.monotonic()
 
     except KeyboardInterrupt:
         print("\n" + "=" * 60)
         print("🛑 Stopping tracker...")
         print("=" * 60)
     finally:
-        # Save remaining buffer to Supabase
-        if supabase_helper and activity_buffer:
-            if supabase_helper.insert_activity_batch(activity_buffer):
-                print(f"✅ Synced final {len(activity_buffer)} activities to Supabase")
+        # Classify and write whatever was still queued, close the open session, then fsync the CSV
+        worker.stop()
+        if compactor:
+            compactor.flush()
+        csv_writer.close()
+
+        # Try to send what is still spooled; anything unsent syncs on the next run
+        if sync_worker:
+            sync_worker.stop()
         
         # Update weekly summary (daily summary updates automatically via triggers)
         if supabase_helper:
@@ -173,7 +354,7 @@ def start_tracking():
             print("✅ Weekly summary updated")
         
         # Recalculate final times from the CSV for an accurate summary
-        final_times = load_and_calculate_time(csv_filename)
+        final_times = load_and_calculate_time()
         print_summary(final_times)
         
         print("=" * 60)
@@ -1,64 +1,185 @@
 # flask_backend_step2.py
 
-import pickle
-import re
-import nltk
-import pandas as pd
+import base64
+import json
 import os
-from datetime import datetime, date, timedelta
-from flask import Flask, request, jsonify, render_template
+from datetime import datetime, date, timedelta, timezone
+from flask import Flask, g, request, jsonify, render_template
 from flask_cors import CORS
-from nltk.corpus import stopwords
-from nltk import PorterStemmer
-from supabase_helper import SupabaseHelper
+from activity_classifier import ActivityClassifier, normalize_category
+from activity_aggregator import DailyActivityAggregator
+from activity_log import category_seconds, load_day_activity
+from auth_context import AuthError, DEMO_USER_ID, is_trusted_service, user_id_from_headers
+from lazy_resource import LazyResource
+from query_cache import InvalidationLog
 
 # --- Configuration & Setup ---
 CHECK_INTERVAL = 5 # Must match the tracker's interval
-
-# --- Preprocessing Logic (from notebook) ---
-try:
-    stopwords.words('english')
-except LookupError:
-    nltk.download('stopwords')
-    nltk.download('punkt')
-
-stop_words = set(stopwords.words('english'))
-port_stemmer = PorterStemmer()
-def preprocessing(text):
-    text = text.lower()
-    text = re.sub(r"http\S+", "", text)
-    text = re.sub(r"[^a-zA-Z]", " ", text)
-    text = re.sub(r"\s+", " ", text)
-    text = re.sub(r'[^\w\s,.!?]', '', text)
-    text = text.split()
-    text = [port_stemmer.stem(word) for word in text if not word in stop_words]
-    return ' '.join(text)
+MAX_BATCH_SIZE = 5000 # Upper bound on texts accepted by /predict/batch
+PREDICTION_CACHE_SIZE = 2048 # Distinct preprocessed titles kept in memory
+PREDICTION_CACHE_TTL = 6 * 3600 # seconds
+MODEL_CHECK_INTERVAL = 10 # seconds between checks for a changed model pickle
+# Where multi-day endpoints get their data: 'auto' (Supabase, falling back to
+# the local CSV history), 'local' (always local) or 'supabase' (never local)
+ANALYTICS_SOURCE = os.getenv('ANALYTICS_SOURCE', 'auto')
+CLOSED_DAY_MAX_AGE = 24 * 3600 # Browser cache lifetime (seconds) for responses about past dates only
+STATS_QUERY_TIMEOUT = 5 # seconds /api/stats waits for its slowest Supabase query
+# Shares query cache invalidations between server worker processes (see serve.py)
+CACHE_INVALIDATION_LOG = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'query_cache_invalidations.log')
+SERVICE_PATHS = {'/api/cache/invalidate'} # Called by the tracker/importer, not for a user (no JWT)
+# Startup: the model, Supabase and the local history load in background threads
+# so the server accepts connections immediately (see /healthz)
+MODEL_STARTUP_TIMEOUT = 10 # seconds /predict waits for the model before answering 503
+SUPABASE_STARTUP_TIMEOUT = 10 # seconds an API request waits for the Supabase connection
 
 # --- Flask App Initialization & ML Asset Loading ---
 app = Flask(__name__, template_folder='.') # Serve templates from the root directory
-CORS(app)  # Enable CORS for frontend access
+CORS(app, expose_headers=['X-Next-Cursor'])  # Enable CORS for frontend access (and let it read the page cursor)
 
-# Initialize Supabase
+# Initialize Supabase (in the background; the supabase client import alone takes most of a second)
 supabase_helper = None
 supabase_client = None
-try:
-    supabase_helper = SupabaseHelper()
-    supabase_helper.set_user_id("00000000-0000-0000-0000-000000000001")  # Demo user for testing (valid UUID)
+
+def connect_supabase():
+    global supabase_helper, supabase_client
+    try:
+        from supabase_helper import SupabaseHelper
+        # One helper (and HTTP connection pool) for all requests; each call names its user
+        helper = SupabaseHelper()
+    except Exception as e:
+        print(f"⚠️  Supabase not available: {e}")
+        raise
+    supabase_helper = helper
     # Also get direct Supabase client for phone data
-    supabase_client = supabase_helper.supabase
+    supabase_client = helper.supabase
     print("✅ Supabase connected")
-except Exception as e:
-    print(f"⚠️  Supabase not available: {e}")
-
-model, vectorizer = None, None
-try:
-    with open('model_reclassified.pkl', 'rb') as f_model:
-        model = pickle.load(f_model)
-    with open('tfidf_vectorizer_reclassified.pkl', 'rb') as f_vec:
-        vectorizer = pickle.load(f_vec)
-    print("✅ Model and vectorizer loaded successfully")
-except Exception as e:
-    print(f"❌ Fatal Error: Could not load ML assets. {e}")
+    return helper
+
+supabase_startup = LazyResource('supabase', connect_supabase).start()
+
+def use_supabase(client, helper=None):
+    """Serve from the given client (and helper) instead, e.g. a local stand-in in tests.
+
+    Waits for the background connect first, so it can't overwrite them afterwards.
+    """
+    global supabase_helper, supabase_client
+    supabase_startup.wait()
+    supabase_client = client
+    supabase_helper = helper
+
+classifier = ActivityClassifier(cache_size=PREDICTION_CACHE_SIZE,
+                                cache_ttl=PREDICTION_CACHE_TTL,
+                                check_interval=MODEL_CHECK_INTERVAL)
+
+def load_model():
+    # Unpickling pulls in NLTK, scipy and sklearn
+    if not classifier.load():
+        raise RuntimeError('ML model could not be loaded')
+    return classifier
+
+model_startup = LazyResource('model', load_model).start()
+
+# Today's per-category totals, updated incrementally from the tracker's CSV
+daily_aggregator = DailyActivityAggregator(sample_seconds=CHECK_INTERVAL)
+
+def load_activity_store():
+    # Closed days compacted into date-partitioned Parquet (see activity_store.py)
+    from activity_store import ActivityStore
+    return ActivityStore(sample_seconds=CHECK_INTERVAL)
+
+def load_local_analytics():
+    # N-day summaries and top apps from the local history (closed-day rollups cached beside the CSVs)
+    from local_analytics import LocalAnalytics
+    return LocalAnalytics(sample_seconds=CHECK_INTERVAL, store=activity_store.get(), aggregator=daily_aggregator)
+
+# Both import pandas, which only the history/analytics endpoints need
+activity_store = LazyResource('activity_store', load_activity_store).start()
+local_analytics = LazyResource('local_analytics', load_local_analytics).start()
+invalidation_log = InvalidationLog(CACHE_INVALIDATION_LOG)
+
+# --- HTTP Caching ---
+
+def _requested_dates():
+    """Dates named in the query string (?date=, ?start=, ?end=)"""
+    dates = []
+    for name in ('date', 'start', 'end'):
+        value = request.args.get(name)
+        if value:
+            try:
+                dates.append(date.fromisoformat(value))
+            except ValueError:
+                return []
+    if 'start' in request.args and 'end' not in request.args:
+        dates.append(date.today())  # Open-ended ranges run up to today
+    return dates
+
+def wait_until_started(timeout=None):
+    """Blocks until every background startup task has finished; True if the model is ready."""
+    for resource in (supabase_startup, activity_store, local_analytics):
+        resource.wait(timeout)
+    return model_startup.wait(timeout)
+
+@app.before_request
+def wait_for_supabase():
+    """API requests hold on (briefly) until the Supabase connection attempt is done."""
+    if request.path.startswith('/api/'):
+        supabase_startup.wait(SUPABASE_STARTUP_TIMEOUT)
+
+@app.before_request
+def resolve_user():
+    """Identifies the user an API request acts for (see auth_context.py)."""
+    if not request.path.startswith('/api/') or request.path in SERVICE_PATHS:
+        return None  # Service routes check their caller themselves
+    try:
+        g.user_id = user_id_from_headers(request.headers)
+    except AuthError as e:
+        return jsonify({'error': str(e)}), 401
+
+@app.before_request
+def apply_cache_invalidations():
+    """Picks up invalidations received by other worker processes."""
+    if supabase_helper:
+        invalidation_log.apply(supabase_helper.cache)
+
+@app.after_request
+def add_cache_headers(response):
+    """ETag + Cache-Control on API reads, answering If-None-Match with 304.
+
+    Responses about closed dates only may be reused for a day; everything else
+    must be revalidated, which is a cheap 304 when nothing changed.
+    """
+    if (request.method != 'GET' or not request.path.startswith('/api/')
+            or response.status_code != 200 or response.mimetype != 'application/json'):
+        return response
+
+    response.add_etag()
+    response.vary.add('Authorization')  # Responses differ per user
+    dates = _requested_dates()
+    if dates and max(dates) < date.today():
+        response.cache_control.private = True
+        response.cache_control.max_age = CLOSED_DAY_MAX_AGE
+    else:
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+# --- Health Check ---
+
+@app.route('/healthz')
+def healthz():
+    """Readiness: 200 once the model can serve /predict, 503 while it is still loading."""
+    subsystems = {
+        'model': model_startup.status(),
+        'supabase': supabase_startup.status(),
+        'local_history': local_analytics.status(),
+    }
+    if model_startup.state == 'loading':
+        return jsonify({'status': 'starting', 'subsystems': subsystems}), 503
+    if model_startup.ready and all(resource.ready for resource in (supabase_startup, local_analytics)):
+        status = 'ready'
+    else:
+        status = 'degraded'  # Serving, but without the model, Supabase or the local history
+    return jsonify({'status': status, 'subsystems': subsystems}), 200 if model_startup.ready else 503
 
 # --- Web Page Routes ---
 
@@ -69,37 +190,34 @@ def dashboard():
 
 # --- API Routes ---
 
+def serves_local_history():
+    """The tracker's local CSVs and store hold the demo user's data only."""
+    return g.user_id == DEMO_USER_ID
+
+def todays_supabase_summary():
+    """Today's daily_summary row for the request's user (None when missing or unavailable)."""
+    return supabase_helper.get_daily_summary(user_id=g.user_id) if supabase_helper else None
+
 @app.route('/api/activity-data')
 def get_activity_data():
-    """Reads the daily CSV and returns aggregated time per category."""
-    today_csv = f"desktop_activity_{datetime.now().strftime('%Y-%m-%d')}.csv"
-    if not os.path.isfile(today_csv):
-        return jsonify({})
+    """Returns today's aggregated time per category from the daily CSV (samples or sessions)."""
     try:
-        df = pd.read_csv(today_csv)
-        if df.empty:
-            return jsonify({})
-        time_per_category = (df['Category'].value_counts() * CHECK_INTERVAL / 60).round(2) # in minutes
-        return jsonify(time_per_category.to_dict())
+        if not serves_local_history():
+            summary = todays_supabase_summary() or {}
+            return jsonify({category: summary[f'{category}_minutes']
+                            for category in ('study', 'entertainment', 'others') if summary})
+        seconds_per_category = daily_aggregator.seconds_per_category()
+        time_per_category = {k: round(v / 60, 2) for k, v in seconds_per_category.items()} # in minutes
+        return jsonify(time_per_category)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def normalize_category(category):
-    """Normalize all categories to only study, entertainment, or others."""
-    category_lower = category.lower()
-    
-    # Map all categories to only 3 types
-    if category_lower in ['study', 'work', 'productivity']:
-        return 'study'
-    elif category_lower in ['entertainment', 'gaming', 'social']:
-        return 'entertainment'
-    else:
-        return 'others'
-
 @app.route('/predict', methods=['POST'])
 def predict():
     """Receives text and returns a category prediction (for the tracker)."""
-    if not model or not vectorizer:
+    if not model_startup.wait(MODEL_STARTUP_TIMEOUT) and model_startup.state == 'loading':
+        return jsonify({'error': 'ML model is still loading.'}), 503
+    if not classifier.is_ready():
         return jsonify({'error': 'ML model not available.'}), 500
 
     data = request.get_json()
@@ -108,26 +226,97 @@ def predict():
 
     try:
         text_input = data['text']
-        preprocessed_text = preprocessing(text_input)
-        text_tfidf = vectorizer.transform([preprocessed_text])
-        predicted_category = model.predict(text_tfidf)[0]
-        
-        # Normalize to only 3 categories
-        normalized_category = normalize_category(predicted_category)
+        # Already normalized to only 3 categories
+        normalized_category = classifier.predict_category(text_input)
         return jsonify({'category': normalized_category})
     except Exception as e:
         return jsonify({'error': f'Prediction error: {str(e)}'}), 500
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Classifies a list of texts in one vectorized pass (for CSV backfills)."""
+    if not model_startup.wait(MODEL_STARTUP_TIMEOUT) and model_startup.state == 'loading':
+        return jsonify({'error': 'ML model is still loading.'}), 503
+    if not classifier.is_ready():
+        return jsonify({'error': 'ML model not available.'}), 500
+
+    data = request.get_json(silent=True)
+    texts = data.get('texts') if isinstance(data, dict) else None
+    if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+        return jsonify({'error': 'Invalid request. Expected {"texts": [...]}.'}), 400
+    if len(texts) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'Batch too large (max {MAX_BATCH_SIZE} texts).'}), 413
+    if not texts:
+        return jsonify({'categories': []})
+
+    try:
+        with_probabilities = bool(data.get('probabilities'))
+        # One sparse matrix for all uncached texts instead of one row per request
+        results = classifier.classify(texts, with_probabilities)
+
+        response = {'categories': [result['category'] for result in results]}
+        if with_probabilities:
+            # The model's classes folded into the same 3 normalized categories
+            response['probabilities'] = [result['probabilities'] for result in results]
+
+        return jsonify(response)
+    except Exception as e:
+        return jsonify({'error': f'Prediction error: {str(e)}'}), 500
+
+@app.route('/api/prediction-cache', methods=['GET'])
+def get_prediction_cache_stats():
+    """Hit/miss/eviction counters for the prediction cache."""
+    return jsonify(classifier.cache.stats())
+
+@app.route('/api/query-cache', methods=['GET'])
+def get_query_cache_stats():
+    """Hit/miss/invalidation counters for the Supabase query cache."""
+    if not supabase_helper:
+        return jsonify({'error': 'Supabase not available'}), 503
+    return jsonify(supabase_helper.cache.stats())
+
+@app.route('/api/cache/invalidate', methods=['POST'])
+def invalidate_query_cache():
+    """Drops cached Supabase results for the given dates (all when none are given).
+
+    Called by the tracker's sync worker and the importer after they write rows.
+    Body: {"dates": ["YYYY-MM-DD", ...]}
+    Only accepted from loopback, or with the SERVICE_TOKEN when one is set.
+    """
+    if not is_trusted_service(request.headers, request.remote_addr):
+        return jsonify({'error': 'Service token required.'}), 403
+    if not supabase_helper:
+        return jsonify({'invalidated': 0})
+
+    data = request.get_json(silent=True) or {}
+    try:
+        dates = [date.fromisoformat(value) for value in data.get('dates') or []]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'dates must be a list of YYYY-MM-DD strings.'}), 400
+
+    # Other workers apply it from the log on their next request
+    invalidation_log.publish(dates or None)
+    if not dates:
+        supabase_helper.cache.clear()
+        return jsonify({'invalidated': 'all'})
+    return jsonify({'invalidated': supabase_helper.cache.invalidate_dates(dates)})
+
 # --- New Supabase API Routes ---
 
 @app.route('/api/daily-summary', methods=['GET'])
 def get_daily_summary_api():
-    """Get daily summary from CSV file."""
+    """Get today's summary from the tracker's CSV file (other users: from Supabase)."""
     try:
-        # Get today's CSV file
-        today_csv = f"desktop_activity_{datetime.now().strftime('%Y-%m-%d')}.csv"
-        
-        if not os.path.isfile(today_csv):
+        if serves_local_history():
+            # Today's totals from the sample and/or session CSV (only new rows are parsed)
+            raw_seconds_per_category = daily_aggregator.seconds_per_category()
+        else:
+            summary = todays_supabase_summary()
+            if summary:
+                return jsonify({**summary, 'message': 'Data from Supabase'}), 200
+            raw_seconds_per_category = {}
+
+        if not raw_seconds_per_category:
             # No data yet today
             return jsonify({
                 'study_minutes': 0,
@@ -139,32 +328,16 @@ def get_daily_summary_api():
                 'others_percentage': 0,
                 'message': 'No data tracked yet today'
             }), 200
-        
-        # Read CSV and calculate summary
-        df = pd.read_csv(today_csv)
-        
-        if df.empty:
-            return jsonify({
-                'study_minutes': 0,
-                'entertainment_minutes': 0,
-                'others_minutes': 0,
-                'total_minutes': 0,
-                'study_percentage': 0,
-                'entertainment_percentage': 0,
-                'others_percentage': 0,
-                'message': 'No data tracked yet today'
-            }), 200
-        
-        # Normalize categories
-        df['Category'] = df['Category'].str.lower()
-        df['Category'] = df['Category'].apply(normalize_category)
-        
-        # Calculate minutes per category (each row = CHECK_INTERVAL seconds)
-        category_counts = df['Category'].value_counts()
-        
-        study_minutes = (category_counts.get('study', 0) * CHECK_INTERVAL) / 60.0
-        entertainment_minutes = (category_counts.get('entertainment', 0) * CHECK_INTERVAL) / 60.0
-        others_minutes = (category_counts.get('others', 0) * CHECK_INTERVAL) / 60.0
+
+        # Normalize categories (once per distinct category, not per row)
+        seconds_per_category = {}
+        for category, seconds in raw_seconds_per_category.items():
+            normalized = normalize_category(str(category))
+            seconds_per_category[normalized] = seconds_per_category.get(normalized, 0) + seconds
+
+        study_minutes = seconds_per_category.get('study', 0) / 60.0
+        entertainment_minutes = seconds_per_category.get('entertainment', 0) / 60.0
+        others_minutes = seconds_per_category.get('others', 0) / 60.0
         total_minutes = study_minutes + entertainment_minutes + others_minutes
         
         # Calculate percentages
@@ -180,7 +353,7 @@ def get_daily_summary_api():
             'study_percentage': round(study_percentage, 2),
             'entertainment_percentage': round(entertainment_percentage, 2),
             'others_percentage': round(others_percentage, 2),
-            'total_activities': len(df),
+            'total_activities': int(round(total_minutes * 60 / CHECK_INTERVAL)),  # in samples
             'updated_at': datetime.now().isoformat(),
             'message': 'Data from CSV'
         }), 200
@@ -189,27 +362,118 @@ def get_daily_summary_api():
         print(f"Error in daily summary API: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/history', methods=['GET'])
+def get_history_api():
+    """Per-day minutes by category for a date range, from the columnar store (+ uncompacted CSVs)."""
+    if not serves_local_history():
+        return jsonify([])  # The store is the tracker's (demo user's) history
+    store = activity_store.get()
+    if store is None or not store.available():
+        return jsonify({'error': 'Columnar store not available (pip install pyarrow)'}), 503
+
+    try:
+        end_date = date.fromisoformat(request.args['end']) if 'end' in request.args else date.today()
+        start_date = (date.fromisoformat(request.args['start']) if 'start' in request.args
+                      else end_date - timedelta(days=6))
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+
+    try:
+        # Only the date/category/duration columns of the partitions in range are read
+        df = store.read(start_date, end_date, columns=['category', 'duration_seconds'])
+        # Closed days the tracker hasn't compacted yet (e.g. it has run past midnight)
+        # are read from their CSVs instead of a missing or outdated partition
+        last_closed_day = min(end_date, date.today() - timedelta(days=1))
+        stale_days = [start_date + timedelta(days=offset) for offset in range((last_closed_day - start_date).days + 1)]
+        stale_days = [day for day in stale_days if store.is_stale(day)]
+        minutes_by_day = {}
+        if not df.empty:
+            df['category'] = df['category'].astype(str)
+            df = df[~df['date'].isin(stale_days)]
+            totals = df.groupby(['date', 'category'])['duration_seconds'].sum()
+            for (day, category), seconds in totals.items():
+                day_totals = minutes_by_day.setdefault(day.isoformat(), {})
+                normalized = normalize_category(category)
+                day_totals[normalized] = day_totals.get(normalized, 0) + seconds / 60.0
+
+        for day in stale_days:
+            day_totals = minutes_by_day.setdefault(day.isoformat(), {})
+            for category, seconds in category_seconds(load_day_activity(day, sample_seconds=CHECK_INTERVAL)).items():
+                normalized = normalize_category(category)
+                day_totals[normalized] = day_totals.get(normalized, 0) + seconds / 60.0
+
+        # Today isn't compacted yet: take it from the live aggregator
+        if start_date <= date.today() <= end_date:
+            day_totals = minutes_by_day.setdefault(date.today().isoformat(), {})
+            for category, seconds in daily_aggregator.seconds_per_category().items():
+                normalized = normalize_category(category)
+                day_totals[normalized] = day_totals.get(normalized, 0) + seconds / 60.0
+
+        history = []
+        for day in sorted(minutes_by_day):
+            day_totals = minutes_by_day[day]
+            history.append({
+                'date': day,
+                'study_minutes': round(day_totals.get('study', 0), 2),
+                'entertainment_minutes': round(day_totals.get('entertainment', 0), 2),
+                'others_minutes': round(day_totals.get('others', 0), 2),
+                'total_minutes': round(sum(day_totals.values()), 2)
+            })
+        return jsonify(history)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def serve_analytics(supabase_query, local_query):
+    """Runs a range query against Supabase and/or the local CSV history.
+
+    ANALYTICS_SOURCE = 'local' always answers locally; 'supabase' never does;
+    'auto' asks Supabase first and falls back to the local history when it is
+    unavailable, fails, or has nothing for the range.
+    Returns None only when no source could answer. The local history is the
+    tracker's own (the demo user's), so other users only get Supabase data.
+    """
+    if not serves_local_history():
+        local_query = lambda: None
+    if ANALYTICS_SOURCE == 'local' or (not supabase_helper and ANALYTICS_SOURCE == 'auto'):
+        return local_query()
+    if not supabase_helper:
+        return None
+
+    try:
+        result = supabase_query()
+    except Exception as e:
+        if ANALYTICS_SOURCE == 'supabase':
+            raise
+        print(f"Supabase query failed, using local history: {e}")
+        result = None
+    if result or ANALYTICS_SOURCE == 'supabase':
+        return result
+    return local_query()
+
 @app.route('/api/last-7-days', methods=['GET'])
 def get_last_7_days_api():
-    """Get last 7 days summary from Supabase."""
-    if not supabase_helper:
-        return jsonify({'error': 'Supabase not available'}), 503
-    
+    """Get last 7 days summary from Supabase (or the local CSV history)."""
     try:
         days = int(request.args.get('days', 7))
-        summaries = supabase_helper.get_last_n_days(days)
+        user_id = g.user_id
+        summaries = serve_analytics(lambda: supabase_helper.get_last_n_days(days, user_id=user_id),
+                                    lambda: local_analytics.get().get_last_n_days(days))
+        if summaries is None:
+            return jsonify({'error': 'Supabase not available'}), 503
         return jsonify(summaries)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/weekly-summary', methods=['GET'])
 def get_weekly_summary_api():
-    """Get weekly summary from Supabase."""
-    if not supabase_helper:
+    """Get weekly summary from Supabase (or the local CSV history)."""
+    if not supabase_helper and ANALYTICS_SOURCE == 'supabase':
         return jsonify({'error': 'Supabase not available'}), 503
     
     try:
-        summary = supabase_helper.get_weekly_summary()
+        user_id = g.user_id
+        summary = serve_analytics(lambda: supabase_helper.get_weekly_summary(user_id=user_id),
+                                  lambda: local_analytics.get().get_weekly_summary())
         if summary:
             return jsonify(summary)
         else:
@@ -219,35 +483,64 @@ def get_weekly_summary_api():
 
 @app.route('/api/top-apps', methods=['GET'])
 def get_top_apps_api():
-    """Get top applications by category from Supabase."""
-    if not supabase_helper:
-        return jsonify({'error': 'Supabase not available'}), 503
-    
+    """Get top applications by category from Supabase (or the local CSV history)."""
     try:
         days = int(request.args.get('days', 7))
-        top_apps = supabase_helper.get_top_apps(days)
+        user_id = g.user_id
+        top_apps = serve_analytics(lambda: supabase_helper.get_top_apps(days, user_id=user_id),
+                                   lambda: local_analytics.get().get_top_apps(days))
+        if top_apps is None:
+            return jsonify({'error': 'Supabase not available'}), 503
         return jsonify(top_apps)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def encode_cursor(row):
+    """Keyset cursor for the row after which the next page starts (URL-safe)"""
+    raw = json.dumps([row['timestamp'], row['app_name']], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+def decode_cursor(cursor):
+    """{'timestamp', 'app_name'} from encode_cursor; raises ValueError"""
+    try:
+        timestamp, app_name = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (TypeError, ValueError):  # Bad base64, JSON or shape
+        raise ValueError("Invalid cursor")
+    return {'timestamp': str(timestamp), 'app_name': str(app_name)}
+
 @app.route('/api/activity-logs', methods=['GET'])
 def get_activity_logs_api():
-    """Get activity logs from Supabase."""
+    """Get activity logs from Supabase, newest first.
+    
+    Pages with ?limit=N; when more rows may follow, the X-Next-Cursor header
+    holds the value to pass as ?before= for the next page.
+    """
     if not supabase_helper:
         return jsonify({'error': 'Supabase not available'}), 503
     
     try:
         date_str = request.args.get('date')
         limit = int(request.args.get('limit', 100))
+        cursor = request.args.get('before')
+        before = None
+        if cursor:
+            # Cursor encodes (timestamp, app_name) of the last row already seen
+            try:
+                before = decode_cursor(cursor)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
         
         if date_str:
             from datetime import datetime as dt
             target_date = dt.strptime(date_str, '%Y-%m-%d').date()
-            logs = supabase_helper.get_activity_logs(target_date, limit)
+            logs = supabase_helper.get_activity_logs(target_date, limit, before=before, user_id=g.user_id)
         else:
-            logs = supabase_helper.get_activity_logs(limit=limit)
+            logs = supabase_helper.get_activity_logs(limit=limit, before=before, user_id=g.user_id)
         
-        return jsonify(logs)
+        response = jsonify(logs)
+        if len(logs) == limit:
+            response.headers['X-Next-Cursor'] = encode_cursor(logs[-1])
+        return response
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -258,51 +551,115 @@ def get_stats_api():
         return jsonify({'error': 'Supabase not available'}), 503
     
     try:
-        # Get today's summary
-        today_summary = supabase_helper.get_daily_summary()
-        
-        # Get last 7 days
-        last_7_days = supabase_helper.get_last_n_days(7)
+        # The four queries are independent: run them concurrently so the
+        # endpoint takes as long as the slowest one, not their sum
+        user_id = g.user_id  # The queries run on pool threads, outside the request context
+        stats, errors = supabase_helper.fetch_parallel({
+            'today': lambda: supabase_helper.get_daily_summary(user_id=user_id, raise_errors=True),
+            'last_7_days': lambda: supabase_helper.get_last_n_days(7, user_id=user_id, raise_errors=True),
+            'current_week': lambda: supabase_helper.get_weekly_summary(user_id=user_id, raise_errors=True),
+            'top_apps': lambda: supabase_helper.get_top_apps(7, user_id=user_id, raise_errors=True)
+        }, timeout=STATS_QUERY_TIMEOUT)
         
-        # Get current week
-        weekly_summary = supabase_helper.get_weekly_summary()
-        
-        # Get top apps
-        top_apps = supabase_helper.get_top_apps(7)
-        
-        return jsonify({
-            'today': today_summary,
-            'last_7_days': last_7_days,
-            'current_week': weekly_summary,
-            'top_apps': top_apps
-        })
+        if errors:
+            # Partial result: serve what arrived and say what is missing
+            stats['errors'] = errors
+        return jsonify(stats)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # --- Phone Usage API Routes ---
+# Aggregated server-side by the SQL functions in supabase/migrations
+# (20261017010000_phone_usage_rpcs.sql); until they are deployed the rows are
+# fetched and aggregated with pandas (phone_usage_analytics.py) instead.
+# Per-day totals come from the phone_usage_daily rollups, which a trigger keeps
+# current (20261017030000_phone_usage_daily.sql), so they cost the same however
+# many logs there are.
+
+# Phone logs sent without a user are rolled up under this id and shown to the demo user
+UNOWNED_PHONE_USER_ID = '00000000-0000-0000-0000-000000000000'
+
+def phone_user_ids(user_id):
+    """The user_id values whose phone usage a user sees"""
+    return [user_id, UNOWNED_PHONE_USER_ID] if user_id == DEMO_USER_ID else [user_id]
+
+def owned_logs(query, user_ids):
+    """Restricts an app_usage_logs query to user_ids (NULL user_id = unowned)"""
+    owners = [user for user in user_ids if user != UNOWNED_PHONE_USER_ID]
+    if len(owners) < len(user_ids):
+        return query.or_(f"user_id.in.({','.join(owners)}),user_id.is.null")
+    return query.in_('user_id', owners)
+
+def phone_usage_frame(query, dates=True):
+    """Runs an app_usage_logs query and loads the rows for phone_usage_analytics"""
+    import phone_usage_analytics  # pandas; only needed when the RPCs are missing
+    return phone_usage_analytics, phone_usage_analytics.to_frame(query.execute().data or [], dates)
+
+def phone_usage_by_app(user_ids, since):
+    """[{app_name, total_seconds}] since a point in time, largest first"""
+    try:
+        return supabase_client.rpc('phone_usage_by_app', {
+            'p_user_ids': user_ids,
+            'since': since.isoformat()
+        }).execute().data or []
+    except Exception as e:
+        print(f"phone_usage_by_app RPC unavailable, aggregating in Python: {e}")
+
+    analytics, frame = phone_usage_frame(owned_logs(supabase_client.table('app_usage_logs')
+                                                    .select('app_name,duration')
+                                                    .gte('created_at', since.isoformat()), user_ids),
+                                         dates=False)
+    return analytics.usage_by_app(frame)
+
+def phone_usage_by_day(user_ids, start_date, end_date):
+    """[{usage_date, total_seconds, top_app}] for each day with usage between two dates"""
+    try:
+        return supabase_client.rpc('phone_usage_by_day', {
+            'p_user_ids': user_ids,
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat()
+        }).execute().data or []
+    except Exception as e:
+        print(f"phone_usage_by_day RPC unavailable, aggregating in Python: {e}")
+
+    analytics, frame = phone_usage_frame(owned_logs(supabase_client.table('app_usage_logs')
+                                                    .select('app_name,duration,created_at')
+                                                    .gte('created_at', f'{start_date.isoformat()}T00:00:00+00:00')
+                                                    .lt('created_at', f'{(end_date + timedelta(days=1)).isoformat()}T00:00:00+00:00'),
+                                                    user_ids))
+    return analytics.usage_by_day(frame)
+
+def phone_usage_on(user_ids, day):
+    """[{app_name, total_seconds}] for one UTC day, largest first"""
+    try:
+        rows = supabase_client.table('phone_usage_daily')\
+            .select('app_name,total_seconds')\
+            .in_('user_id', user_ids)\
+            .eq('usage_date', day.isoformat())\
+            .gt('log_count', 0)\
+            .execute().data or []
+    except Exception as e:
+        print(f"phone_usage_daily unavailable, aggregating the logs: {e}")
+        return phone_usage_by_app(user_ids, datetime.combine(day, datetime.min.time(), timezone.utc))
+
+    app_seconds = {}
+    for row in rows:  # One row per user and app
+        app_seconds[row['app_name']] = app_seconds.get(row['app_name'], 0) + int(row['total_seconds'])
+    return [{'app_name': app, 'total_seconds': seconds}
+            for app, seconds in sorted(app_seconds.items(), key=lambda x: (-x[1], x[0]))]
 
 @app.route('/api/phone-usage-today', methods=['GET'])
 def get_phone_usage_today():
-    """Get today's phone usage summary from app_usage_logs"""
+    """Get today's (UTC calendar day) phone usage summary"""
     if not supabase_client:
         return jsonify({'error': 'Supabase not available'}), 503
     
     try:
-        # Get all logs from last 24 hours (more reliable than date filtering)
-        from datetime import datetime as dt
-        now = dt.now()
-        yesterday = now - timedelta(days=1)
-        
-        # Get all logs from today
-        result = supabase_client.table('app_usage_logs')\
-            .select('*')\
-            .gte('created_at', yesterday.isoformat())\
-            .order('created_at', desc=True)\
-            .execute()
+        # The same UTC days as the weekly chart, so today's bar and this summary agree
+        app_seconds = phone_usage_on(phone_user_ids(g.user_id), datetime.now(timezone.utc).date())
+        print(f"Phone usage: {len(app_seconds)} unique apps")
         
-        print(f"Phone usage query returned {len(result.data) if result.data else 0} records")
-        
-        if not result.data:
+        if not app_seconds:
             return jsonify({
                 'total_minutes': 0,
                 'total_apps': 0,
@@ -310,46 +667,14 @@ def get_phone_usage_today():
                 'message': 'No phone usage data today'
             }), 200
         
-        # Calculate total time and top apps
-        app_times = {}
-        for log in result.data:
-            app_name = log.get('app_name', 'Unknown')
-            duration_str = log.get('duration', '00:00:00')
-            
-            # Parse duration (format: HH:MM:SS or MM:SS)
-            try:
-                parts = duration_str.split(':')
-                if len(parts) == 3:
-                    hours, minutes, seconds = map(int, parts)
-                    total_seconds = hours * 3600 + minutes * 60 + seconds
-                elif len(parts) == 2:
-                    minutes, seconds = map(int, parts)
-                    total_seconds = minutes * 60 + seconds
-                else:
-                    total_seconds = 0
-                
-                if app_name in app_times:
-                    app_times[app_name] += total_seconds
-                else:
-                    app_times[app_name] = total_seconds
-            except Exception as e:
-                print(f"Error parsing duration '{duration_str}': {e}")
-                continue
-        
-        print(f"Processed {len(app_times)} unique apps")
-        
-        # Convert to minutes and sort
-        total_minutes = sum(app_times.values()) / 60.0
-        top_apps = sorted(
-            [{'app': app, 'minutes': round(seconds / 60.0, 2)} 
-             for app, seconds in app_times.items()],
-            key=lambda x: x['minutes'],
-            reverse=True
-        )[:5]  # Top 5 apps
+        import phone_usage_analytics  # pandas, loaded on first use
+        total_minutes = sum(row['total_seconds'] for row in app_seconds) / 60.0
+        top_apps = [{'app': row['app_name'], 'minutes': round(row['total_seconds'] / 60.0, 2)}
+                    for row in phone_usage_analytics.top_apps(app_seconds, 5)]
         
         return jsonify({
             'total_minutes': round(total_minutes, 2),
-            'total_apps': len(app_times),
+            'total_apps': len(app_seconds),
             'top_apps': top_apps,
             'message': 'Phone usage data loaded'
         }), 200
@@ -365,71 +690,20 @@ def get_phone_usage_weekly():
         return jsonify({'error': 'Supabase not available'}), 503
     
     try:
-        # Get data for last 7 days
-        start_date = (date.today() - timedelta(days=6)).isoformat()
-        end_date = date.today().isoformat()
-        
-        result = supabase_client.table('app_usage_logs')\
-            .select('*')\
-            .gte('created_at', f'{start_date}T00:00:00')\
-            .lte('created_at', f'{end_date}T23:59:59')\
-            .execute()
-        
-        # Group by date
-        daily_usage = {}
-        daily_top_apps = {}
-        
-        for log in result.data:
-            created_at = log.get('created_at', '')
-            log_date = created_at.split('T')[0] if 'T' in created_at else created_at[:10]
-            app_name = log.get('app_name', 'Unknown')
-            duration_str = log.get('duration', '00:00:00')
-            
-            # Parse duration
-            try:
-                parts = duration_str.split(':')
-                if len(parts) == 3:
-                    hours, minutes, seconds = map(int, parts)
-                    total_seconds = hours * 3600 + minutes * 60 + seconds
-                elif len(parts) == 2:
-                    minutes, seconds = map(int, parts)
-                    total_seconds = minutes * 60 + seconds
-                else:
-                    total_seconds = 0
-                
-                # Add to daily total
-                if log_date not in daily_usage:
-                    daily_usage[log_date] = 0
-                    daily_top_apps[log_date] = {}
-                
-                daily_usage[log_date] += total_seconds
-                
-                # Track per-app usage per day
-                if app_name not in daily_top_apps[log_date]:
-                    daily_top_apps[log_date][app_name] = 0
-                daily_top_apps[log_date][app_name] += total_seconds
-                
-            except:
-                continue
+        today = datetime.now(timezone.utc).date()  # Phone usage days are UTC dates
+        user_ids = phone_user_ids(g.user_id)
+        days = {str(row['usage_date']): row for row in phone_usage_by_day(user_ids, today - timedelta(days=6), today)}
         
         # Format for last 7 days
         weekly_data = []
         for i in range(6, -1, -1):
-            day_date = (date.today() - timedelta(days=i)).isoformat()
-            day_name = (date.today() - timedelta(days=i)).strftime('%a')
-            
-            minutes = daily_usage.get(day_date, 0) / 60.0
-            
-            # Get top app for this day
-            top_app = 'None'
-            if day_date in daily_top_apps and daily_top_apps[day_date]:
-                top_app = max(daily_top_apps[day_date].items(), key=lambda x: x[1])[0]
-            
+            day = today - timedelta(days=i)
+            usage = days.get(day.isoformat())
             weekly_data.append({
-                'day': day_name,
-                'date': day_date,
-                'minutes': round(minutes, 2),
-                'top_app': top_app
+                'day': day.strftime('%a'),
+                'date': day.isoformat(),
+                'minutes': round(usage['total_seconds'] / 60.0, 2) if usage else 0.0,
+                'top_app': usage['top_app'] if usage else 'None'
             })
         
         return jsonify({
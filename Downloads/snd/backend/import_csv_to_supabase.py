@@ -2,75 +2,275 @@
 """
 Import existing CSV data to Supabase
 Run this to import today's CSV data into Supabase database
+(or another day's with --date YYYY-MM-DD, a range with --start/--end, or every
+file matching --glob; closed days are read from the columnar store once compacted)
+
+Batches are uploaded concurrently and progress is checkpointed to
+import_checkpoint.json, so an interrupted backfill resumes where it stopped.
 """
 
-import pandas as pd
+import argparse
+import glob
+import json
 import os
-from datetime import datetime
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date, timedelta
+from typing import Any, Dict, List
+import pandas as pd
 from supabase_helper import SupabaseHelper
+from query_cache import notify_invalidation
+from activity_log import TIMESTAMP_FORMAT, daily_csv_filename, daily_sessions_filename
+from activity_store import ActivityStore, load_day
+
+DEMO_USER_ID = "00000000-0000-0000-0000-000000000001"
+CHECKPOINT_FILE = 'import_checkpoint.json'
+DEFAULT_WORKERS = 4
+DEFAULT_BATCH_SIZE = 500
+MIN_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 2000
+TARGET_BATCH_SECONDS = 2.0  # Grow batches while uploads finish faster than this
+MAX_ATTEMPTS = 3
+_DATE_IN_FILENAME = re.compile(r"(\d{4}-\d{2}-\d{2})")
+
+# --- Conversion ---
+
+def to_activity_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Converts ACTIVITY_COLUMNS rows into activity_logs payloads (vectorized)"""
+    timestamps = pd.to_datetime(df['Timestamp'], format=TIMESTAMP_FORMAT, errors='coerce')
+    valid = timestamps.notna()
+    records = pd.DataFrame({
+        'app_name': df['App Name'].fillna('').astype(str),
+        'window_title': df['Window Title'].fillna('').astype(str),
+        'category': df['Category'].fillna('others').astype(str).str.lower(),
+        'duration_seconds': pd.to_numeric(df['Duration Seconds'], errors='coerce').fillna(0).astype(int),
+        'timestamp': timestamps.dt.strftime('%Y-%m-%dT%H:%M:%S'),
+        'date': timestamps.dt.strftime('%Y-%m-%d'),
+    })[valid]
+    return records.to_dict('records')
+
+# --- Batch sizing ---
+
+class AdaptiveBatchSize:
+    """Batch size that grows while uploads are fast and halves on slow or failed ones."""
+
+    def __init__(self, initial: int = DEFAULT_BATCH_SIZE, minimum: int = MIN_BATCH_SIZE,
+                 maximum: int = MAX_BATCH_SIZE, target_seconds: float = TARGET_BATCH_SECONDS):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_seconds = target_seconds
+        self.value = max(minimum, min(maximum, initial))
+        self._lock = threading.Lock()
+
+    def record(self, ok: bool, seconds: float):
+        with self._lock:
+            if not ok or seconds > self.target_seconds:
+                self.value = max(self.minimum, self.value // 2)
+            elif seconds < self.target_seconds / 2:
+                self.value = min(self.maximum, int(self.value * 1.5))
+
+# --- Checkpoint ---
+
+class ImportCheckpoint:
+    """Per-day count of rows already imported, persisted as JSON.
+
+    The daily CSVs are append-only, so the first rows_done rows of a day are
+    skipped on the next run and only newer rows are sent.
+    """
+
+    def __init__(self, filename: str = CHECKPOINT_FILE):
+        self.filename = filename
+        self._lock = threading.Lock()
+        try:
+            with open(filename, 'r', encoding='utf-8') as f:
+                self.days = json.load(f)
+        except (OSError, ValueError):
+            self.days = {}
+
+    def rows_done(self, day: date) -> int:
+        return self.days.get(day.isoformat(), {}).get('rows_done', 0)
+
+    def update(self, day: date, rows_done: int, total_rows: int):
+        with self._lock:
+            self.days[day.isoformat()] = {'rows_done': rows_done, 'total_rows': total_rows}
+            with open(self.filename + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(self.days, f, indent=2, sort_keys=True)
+            os.replace(self.filename + '.tmp', self.filename)
+
+    def reset(self, day: date):
+        with self._lock:
+            self.days.pop(day.isoformat(), None)
+
+# --- Day selection ---
 
-def import_csv_to_supabase():
-    """Import today's CSV data to Supabase"""
-    
-    # Get today's CSV filename
-    today = datetime.now().strftime("%Y-%m-%d")
-    csv_filename = f"desktop_activity_{today}.csv"
-    
-    if not os.path.exists(csv_filename):
-        print(f"❌ CSV file not found: {csv_filename}")
+def days_in_range(start: date, end: date, store: ActivityStore) -> List[date]:
+    """Days between start and end (inclusive) that have CSV or store data"""
+    days = []
+    day = start
+    while day <= end:
+        if (os.path.exists(daily_csv_filename(day)) or os.path.exists(daily_sessions_filename(day))
+                or store.has_day(day)):
+            days.append(day)
+        day += timedelta(days=1)
+    return days
+
+def days_from_glob(pattern: str) -> List[date]:
+    """Days named by the files matching pattern (e.g. 'desktop_*_2026-09-*.csv')"""
+    days = set()
+    for filename in glob.glob(pattern):
+        match = _DATE_IN_FILENAME.search(os.path.basename(filename))
+        if match:
+            try:
+                days.add(date.fromisoformat(match.group(1)))
+            except ValueError:
+                continue
+    return sorted(days)
+
+# --- Upload ---
+
+class BulkImporter:
+    """Uploads days of activity with a bounded pool of concurrent batch upserts."""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, batch_size: int = DEFAULT_BATCH_SIZE,
+                 checkpoint: ImportCheckpoint = None, store: ActivityStore = None):
+        self.workers = workers
+        self.batch_size = AdaptiveBatchSize(batch_size)
+        self.checkpoint = checkpoint or ImportCheckpoint()
+        self.store = store or ActivityStore()
+        self._local = threading.local()
+        self.rows_sent = 0
+        self.rows_failed = 0
+
+    def _helper(self) -> SupabaseHelper:
+        """One Supabase client per worker thread"""
+        helper = getattr(self._local, 'helper', None)
+        if helper is None:
+            helper = SupabaseHelper()
+            helper.set_user_id(DEMO_USER_ID)
+            self._local.helper = helper
+        return helper
+
+    def _send(self, batch: List[Dict[str, Any]]) -> bool:
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            started = time.perf_counter()
+            ok = self._helper().upsert_activity_batch(batch)
+            self.batch_size.record(ok, time.perf_counter() - started)
+            if ok:
+                return True
+            if attempt < MAX_ATTEMPTS:
+                time.sleep(2 ** attempt)
+        return False
+
+    def import_day(self, day: date, executor: ThreadPoolExecutor) -> bool:
+        """Imports one day; returns False if any batch could not be sent"""
+        df = load_day(day, store=self.store)
+        records = to_activity_records(df) if not df.empty else []
+        total = len(records)
+        start = self.checkpoint.rows_done(day)
+        if start > total:
+            print(f"⚠️  {day}: source has fewer rows than the checkpoint, importing it again")
+            self.checkpoint.reset(day)
+            start = 0
+        if start == total:
+            print(f"⏭️  {day}: already imported ({total} rows)")
+            return True
+        if start:
+            print(f"↪️  {day}: resuming at row {start}/{total}")
+
+        # Batches finish out of order; the checkpoint only advances over a contiguous prefix
+        finished = {}
+        rows_done = start
+        failed = False
+        in_flight = {}
+        offset = start
+
+        def collect(done_futures):
+            nonlocal rows_done, failed
+            for future in done_futures:
+                batch_start, batch_end = in_flight.pop(future)
+                if future.result():
+                    self.rows_sent += batch_end - batch_start
+                    finished[batch_start] = batch_end
+                else:
+                    self.rows_failed += batch_end - batch_start
+                    failed = True
+            while rows_done in finished:
+                rows_done = finished.pop(rows_done)
+            self.checkpoint.update(day, rows_done, total)
+
+        while offset < total and not failed:
+            if len(in_flight) >= self.workers:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+                continue
+            end = min(total, offset + self.batch_size.value)
+            in_flight[executor.submit(self._send, records[offset:end])] = (offset, end)
+            offset = end
+        if in_flight:
+            done, _ = wait(in_flight)
+            collect(done)
+
+        status = "❌" if failed else "✅"
+        print(f"{status} {day}: {rows_done}/{total} rows imported")
+        return not failed
+
+    def run(self, days: List[date]) -> bool:
+        started = time.perf_counter()
+        ok = True
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='import') as executor:
+            for day in days:
+                ok = self.import_day(day, executor) and ok
+                elapsed = time.perf_counter() - started
+                print(f"   {self.rows_sent} rows sent, {self.rows_sent / elapsed if elapsed else 0:.0f} rows/s, "
+                      f"batch size {self.batch_size.value}")
+        elapsed = time.perf_counter() - started
+        print(f"\n📈 {self.rows_sent} rows in {elapsed:.1f}s ({self.rows_sent / elapsed if elapsed else 0:.0f} rows/s)")
+        if self.rows_failed:
+            print(f"❌ {self.rows_failed} rows failed; run again to resume")
+        return ok
+
+def import_csv_to_supabase(target_date=None, start=None, end=None, pattern=None,
+                           workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE,
+                           checkpoint_file=CHECKPOINT_FILE, resume=True):
+    """Import tracked activity to Supabase (default: today)"""
+    store = ActivityStore()
+    if pattern:
+        days = days_from_glob(pattern)
+    elif start or end:
+        days = days_in_range(start or end, end or date.today(), store)
+    else:
+        days = days_in_range(target_date or date.today(), target_date or date.today(), store)
+
+    if not days:
+        print("❌ No CSV files or stored days found for the requested dates")
         print("   No data to import.")
         return
-    
-    print(f"📁 Reading CSV: {csv_filename}")
-    
+
+    print(f"📁 {len(days)} day(s) to import: {days[0]} .. {days[-1]}")
+    checkpoint = ImportCheckpoint(checkpoint_file)
+    if not resume:
+        for day in days:
+            checkpoint.reset(day)
+
     try:
-        # Read CSV
-        df = pd.read_csv(csv_filename)
-        
-        if df.empty:
-            print("❌ CSV file is empty")
-            return
-        
-        print(f"✅ Found {len(df)} activities in CSV")
-        
-        # Initialize Supabase
         print("🔗 Connecting to Supabase...")
-        supabase_helper = SupabaseHelper()
-        supabase_helper.set_user_id("00000000-0000-0000-0000-000000000001")
+        SupabaseHelper()
         print("✅ Connected to Supabase")
-        
-        # Prepare activities for batch insert
-        activities = []
-        for _, row in df.iterrows():
-            timestamp = datetime.strptime(row['Timestamp'], "%Y-%m-%d %H:%M:%S")
-            activity = {
-                'app_name': row['App Name'],
-                'window_title': row['Window Title'],
-                'category': row['Category'].lower(),
-                'duration_seconds': 5,  # Default 5 seconds per activity
-                'timestamp': timestamp.isoformat(),
-                'date': timestamp.date().isoformat()
-            }
-            activities.append(activity)
-        
-        # Insert in batches of 50
-        batch_size = 50
-        total_batches = (len(activities) + batch_size - 1) // batch_size
-        
-        print(f"📤 Importing {len(activities)} activities in {total_batches} batches...")
-        
-        for i in range(0, len(activities), batch_size):
-            batch = activities[i:i+batch_size]
-            if supabase_helper.insert_activity_batch(batch):
-                print(f"✅ Batch {i//batch_size + 1}/{total_batches}: Synced {len(batch)} activities")
-            else:
-                print(f"❌ Batch {i//batch_size + 1}/{total_batches}: Failed")
-        
-        print("\n" + "=" * 60)
-        print("✅ Import completed successfully!")
-        print("=" * 60)
-        print("\n💡 Tip: Refresh your dashboard to see the data")
-        
+        print(f"📤 Uploading with {workers} workers (initial batch size {batch_size})...")
+
+        importer = BulkImporter(workers=workers, batch_size=batch_size, checkpoint=checkpoint, store=store)
+        ok = importer.run(days)
+        # Let a running Flask backend drop its cached summaries for these days
+        if importer.rows_sent and notify_invalidation(days):
+            print("🔄 Dashboard cache invalidated")
+        if ok:
+            print("\n" + "=" * 60)
+            print("✅ Import completed successfully!")
+            print("=" * 60)
+            print("\n💡 Tip: Refresh your dashboard to see the data")
+
     except Exception as e:
         print(f"❌ Error importing CSV: {e}")
         import traceback
@@ -81,4 +281,15 @@ if __name__ == "__main__":
     print("📊 CSV to Supabase Importer")
     print("=" * 60)
     print()
-    import_csv_to_supabase()
+    parser = argparse.ArgumentParser(description="Import tracked activity into Supabase")
+    parser.add_argument('--date', type=date.fromisoformat, default=None, help="Day to import (YYYY-MM-DD, default: today)")
+    parser.add_argument('--start', type=date.fromisoformat, default=None, help="First day of a range to import")
+    parser.add_argument('--end', type=date.fromisoformat, default=None, help="Last day of a range (default: today)")
+    parser.add_argument('--glob', dest='pattern', default=None, help="Import the days of every matching CSV, e.g. 'desktop_*_2026-09-*.csv'")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Concurrent uploads")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="Initial rows per batch (adapts while running)")
+    parser.add_argument('--checkpoint', default=CHECKPOINT_FILE, help="Progress file used to resume")
+    parser.add_argument('--no-resume', action='store_true', help="Ignore the checkpoint and import the days again")
+    args = parser.parse_args()
+    import_csv_to_supabase(args.date, args.start, args.end, args.pattern, args.workers,
+                           args.batch_size, args.checkpoint, resume=not args.no_resume)
@@ -0,0 +1,81 @@
+# lazy_resource.py
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class LazyResource:
+    """A value that is expensive to build (heavy imports, model files, network).
+
+    It is built exactly once: in a background thread after start(), or by the
+    first caller of get(). Other callers wait for that build instead of
+    starting their own. status() reports progress for readiness checks.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self.name = name
+        self.factory = factory
+        self.value = None
+        self.error = None
+        self.state = 'idle'  # idle -> loading -> ready | failed
+        self.load_seconds = None
+        self._thread = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def _claim(self) -> bool:
+        """True if the caller should build the value"""
+        with self._lock:
+            if self.state != 'idle':
+                return False
+            self.state = 'loading'
+            return True
+
+    def _build(self):
+        started = time.perf_counter()
+        try:
+            self.value = self.factory()
+            self.state = 'ready'
+        except Exception as e:
+            self.error = str(e)
+            self.state = 'failed'
+        finally:
+            self.load_seconds = round(time.perf_counter() - started, 3)
+            self._done.set()
+
+    def start(self) -> 'LazyResource':
+        """Begin building in a background thread (no-op if already started)"""
+        if self._claim():
+            self._thread = threading.Thread(target=self._build, name=f"load-{self.name}", daemon=True)
+            self._thread.start()
+        return self
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """The value, building it here if nobody has started; None if it failed or isn't ready in time"""
+        if self._claim():
+            self._build()
+        self._done.wait(timeout)
+        return self.value if self.state == 'ready' else None
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a started build to finish; True when it is ready"""
+        if self.state == 'idle':
+            return False
+        self._done.wait(timeout)
+        if self._thread is not None and self._done.is_set():
+            self._thread.join(timeout)
+        return self.state == 'ready'
+
+    @property
+    def ready(self) -> bool:
+        return self.state == 'ready'
+
+    def status(self) -> Dict[str, Any]:
+        """State, build time and error, for health checks"""
+        status = {'status': self.state}
+        if self.load_seconds is not None:
+            status['load_seconds'] = self.load_seconds
+        if self.error:
+            status['error'] = self.error
+        return status
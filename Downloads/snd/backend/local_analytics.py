@@ -0,0 +1,213 @@
+# local_analytics.py
+"""
+Multi-day analytics served from the local activity history.
+
+Answers the same questions as the Supabase summary tables (last N days,
+current week, top apps) from the daily CSVs and the columnar store, so range
+dashboards keep working offline. Each closed day is reduced once to a small
+rollup (desktop_rollup_YYYY-MM-DD.json, written beside the CSVs) that is reused
+until that day's source files change. Today is still growing, so its totals
+come from the incremental DailyActivityAggregator and are never persisted.
+"""
+
+import json
+import os
+import threading
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+from activity_aggregator import DailyActivityAggregator
+from activity_classifier import normalize_category
+from activity_log import DEFAULT_SAMPLE_SECONDS, daily_csv_filename, daily_sessions_filename
+from activity_store import ActivityStore, load_day
+
+CATEGORIES = ['study', 'entertainment', 'others']
+ROLLUP_VERSION = 1
+
+
+class LocalAnalytics:
+    """Daily/weekly summaries and top apps computed from per-day rollups."""
+
+    def __init__(self, directory: str = '', sample_seconds: int = DEFAULT_SAMPLE_SECONDS,
+                 store: Optional[ActivityStore] = None, aggregator: Optional[DailyActivityAggregator] = None):
+        self.directory = directory
+        self.sample_seconds = sample_seconds
+        self.store = store or ActivityStore(csv_directory=directory, sample_seconds=sample_seconds)
+        self.aggregator = aggregator or DailyActivityAggregator(directory, sample_seconds)
+        self._rollups: Dict[date, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    # --- Rollups ---
+
+    def _rollup_filename(self, day: date) -> str:
+        return os.path.join(self.directory, f"desktop_rollup_{day.isoformat()}.json")
+
+    def _source_signature(self, day: date) -> List[Any]:
+        """(path, mtime, size) of every file the day's data can come from"""
+        partition = os.path.join(self.store.root, f"date={day.isoformat()}", 'part-0.parquet')
+        signature = []
+        for path in (daily_csv_filename(day, self.directory), daily_sessions_filename(day, self.directory), partition):
+            try:
+                stat = os.stat(path)
+                signature.append([path, stat.st_mtime_ns, stat.st_size])
+            except OSError:
+                continue
+        return signature
+
+    def day_rollup(self, day: date) -> Optional[Dict[str, Any]]:
+        """Per-category and per-app totals for one day (None when nothing was tracked)"""
+        today = date.today()
+        if day > today:
+            return None
+        if day == today:
+            return self._live_rollup(day)
+
+        signature = self._source_signature(day)
+        if not signature:
+            return None
+
+        with self._lock:
+            cached = self._rollups.get(day)
+            if cached and cached['signature'] == signature:
+                return cached
+
+            rollup = self._read_rollup_file(day)
+            if not rollup or rollup.get('signature') != signature or rollup.get('version') != ROLLUP_VERSION:
+                rollup = self._build_rollup(day, signature)
+                self._write_rollup_file(day, rollup)
+            self._rollups[day] = rollup
+            return rollup
+
+    def _live_rollup(self, day: date) -> Optional[Dict[str, Any]]:
+        """Today's rollup from the aggregator, which only parses rows appended since the last call"""
+        totals = self.aggregator.seconds_per_app(day)
+        if not totals:
+            return None
+        return self._rollup(day, [], totals.items())
+
+    def _build_rollup(self, day: date, signature: List[Any]) -> Dict[str, Any]:
+        df = load_day(day, self.directory, self.store, self.sample_seconds)
+        totals = {}
+        if not df.empty:
+            totals = df.groupby(['Category', 'App Name'])['Duration Seconds'].sum()
+        return self._rollup(day, signature, totals.items())
+
+    def _rollup(self, day: date, signature: List[Any], totals) -> Dict[str, Any]:
+        """Rollup from ((raw category, app name), seconds) pairs"""
+        seconds_per_category = {category: 0.0 for category in CATEGORIES}
+        apps: Dict[str, Dict[str, float]] = {category: {} for category in CATEGORIES}
+        for (category, app_name), seconds in totals:
+            category = normalize_category(str(category))
+            category_apps = apps.setdefault(category, {})
+            category_apps[str(app_name)] = category_apps.get(str(app_name), 0.0) + float(seconds)
+            seconds_per_category[category] = seconds_per_category.get(category, 0.0) + float(seconds)
+
+        return {
+            'version': ROLLUP_VERSION,
+            'date': day.isoformat(),
+            'signature': signature,
+            'seconds_per_category': seconds_per_category,
+            'seconds_per_app': apps,
+        }
+
+    def _read_rollup_file(self, day: date) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._rollup_filename(day), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_rollup_file(self, day: date, rollup: Dict[str, Any]):
+        filename = self._rollup_filename(day)
+        try:
+            with open(filename + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(rollup, f)
+            os.replace(filename + '.tmp', filename)
+        except OSError as e:
+            print(f"Could not cache rollup for {day}: {e}")
+
+    # --- Summaries (same shapes as the Supabase tables) ---
+
+    def _summarize(self, rollup: Dict[str, Any]) -> Dict[str, Any]:
+        minutes = {category: rollup['seconds_per_category'].get(category, 0.0) / 60.0 for category in CATEGORIES}
+        total_minutes = sum(minutes.values())
+        app_seconds = {}
+        for category_apps in rollup['seconds_per_app'].values():
+            for app_name, seconds in category_apps.items():
+                app_seconds[app_name] = app_seconds.get(app_name, 0.0) + seconds
+
+        summary = {'date': rollup['date']}
+        for category in CATEGORIES:
+            summary[f'{category}_minutes'] = round(minutes[category], 2)
+        summary['total_minutes'] = round(total_minutes, 2)
+        for category in CATEGORIES:
+            summary[f'{category}_percentage'] = round(minutes[category] / total_minutes * 100, 2) if total_minutes > 0 else 0
+        summary['most_used_app'] = max(app_seconds, key=app_seconds.get) if app_seconds else None
+        summary['total_activities'] = int(round(total_minutes * 60 / self.sample_seconds))
+        return summary
+
+    def get_daily_summary(self, target_date: date = None) -> Optional[Dict[str, Any]]:
+        """Summary row for one day (None when nothing was tracked)"""
+        rollup = self.day_rollup(target_date or date.today())
+        return self._summarize(rollup) if rollup else None
+
+    def get_last_n_days(self, days: int = 7) -> List[Dict[str, Any]]:
+        """Summary rows for the last N days that have data, oldest first"""
+        start_date = date.today() - timedelta(days=days - 1)
+        summaries = []
+        for offset in range(days):
+            summary = self.get_daily_summary(start_date + timedelta(days=offset))
+            if summary:
+                summaries.append(summary)
+        return summaries
+
+    def get_weekly_summary(self, target_date: date = None) -> Optional[Dict[str, Any]]:
+        """Summary for the ISO week (Monday-Sunday) containing target_date"""
+        target_date = target_date or date.today()
+        week_start = target_date - timedelta(days=target_date.weekday())
+        week_end = week_start + timedelta(days=6)
+        daily = [s for s in (self.get_daily_summary(week_start + timedelta(days=i)) for i in range(7)) if s]
+        if not daily:
+            return None
+
+        minutes = {category: sum(day[f'{category}_minutes'] for day in daily) for category in CATEGORIES}
+        total_minutes = sum(minutes.values())
+        year, week_number, _ = target_date.isocalendar()
+        summary = {
+            'week_start_date': week_start.isoformat(),
+            'week_end_date': week_end.isoformat(),
+            'year': year,
+            'week_number': week_number,
+        }
+        for category in CATEGORIES:
+            summary[f'{category}_minutes'] = round(minutes[category], 2)
+        summary['total_minutes'] = round(total_minutes, 2)
+        for category in CATEGORIES:
+            summary[f'{category}_percentage'] = round(minutes[category] / total_minutes * 100, 2) if total_minutes > 0 else 0
+        summary['avg_daily_minutes'] = round(total_minutes / len(daily), 2)
+        summary['most_productive_day'] = max(daily, key=lambda day: day['study_minutes'])['date']
+        return summary
+
+    def get_top_apps(self, days: int = 7, limit: int = 5) -> Dict[str, List[Dict[str, Any]]]:
+        """Top apps per category over the last N days"""
+        start_date = date.today() - timedelta(days=days - 1)
+        seconds: Dict[str, Dict[str, float]] = {}
+        for offset in range(days):
+            rollup = self.day_rollup(start_date + timedelta(days=offset))
+            if not rollup:
+                continue
+            for category, category_apps in rollup['seconds_per_app'].items():
+                totals = seconds.setdefault(category, {})
+                for app_name, app_seconds in category_apps.items():
+                    totals[app_name] = totals.get(app_name, 0.0) + app_seconds
+
+        top_apps = {}
+        for category, totals in seconds.items():
+            ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+            if ranked:
+                top_apps[category] = [{
+                    'app_name': app_name,
+                    'category': category,
+                    'total_minutes': round(app_seconds / 60.0, 2),
+                    'usage_count': int(round(app_seconds / self.sample_seconds))
+                } for app_name, app_seconds in ranked]
+        return top_apps
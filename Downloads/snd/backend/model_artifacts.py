@@ -0,0 +1,288 @@
+# model_artifacts.py
+"""
+Compact, memory-mappable export of the TF-IDF + linear classifier pickles.
+
+pickle.load() gives every backend process its own copy of the model and a
+46k-entry Python dict for the vocabulary. The export stores everything as flat
+arrays instead, which np.load(mmap_mode='r') maps straight from the page
+cache, so all processes share one copy:
+
+    model_artifacts/
+        manifest.json          vectorizer settings, classes, source pickle hashes
+        vocab_hashes.npy       uint64 blake2b-64 of each term, sorted
+        vocab_columns.npy      int32 feature column for each sorted hash
+        vocab_offsets.npy      int64 start of each column's term in vocab_terms.bin
+        vocab_terms.bin        UTF-8 terms in column order (to rule out hash collisions)
+        idf.npy                float64 idf per column
+        coef.npy, intercept.npy
+
+Terms are looked up with np.searchsorted over the hashes, then checked
+against the stored bytes. The arithmetic goes through the same scipy/sklearn
+routines as the pickled pipeline, so predictions are bit-identical; after
+exporting, the artifacts are checked against the pickles on the bundled CSV
+titles and on every vocabulary term.
+
+ActivityClassifier uses the artifacts when their manifest names the current
+pickles (by SHA-256), and falls back to unpickling otherwise.
+
+Usage:
+    python model_artifacts.py            # export next to the pickles and verify
+    python model_artifacts.py --check    # only verify existing artifacts
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+from typing import List, Optional
+
+import numpy as np
+import scipy.sparse as sp
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ARTIFACTS_DIR = os.path.join(BACKEND_DIR, 'model_artifacts')
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+def term_hashes(terms: List[str]) -> np.ndarray:
+    """64-bit blake2b of each term (stable across processes, unlike hash())"""
+    return np.fromiter((int.from_bytes(hashlib.blake2b(term.encode('utf-8'), digest_size=8).digest(), 'little')
+                        for term in terms), dtype=np.uint64, count=len(terms))
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def source_hashes(model_path: str, vectorizer_path: str) -> dict:
+    """Identifies the pickles an export was made from"""
+    return {'model': file_sha256(model_path), 'vectorizer': file_sha256(vectorizer_path)}
+
+# --- Loading ---
+
+class CompactVectorizer:
+    """TfidfVectorizer.transform() over memory-mapped arrays"""
+
+    def __init__(self, directory: str, manifest: dict):
+        self.token_pattern = re.compile(manifest['token_pattern'])
+        self.lowercase = manifest['lowercase']
+        self.sublinear_tf = manifest['sublinear_tf']
+        self.norm = manifest['norm']
+        self.hashes = np.load(os.path.join(directory, 'vocab_hashes.npy'), mmap_mode='r')
+        self.columns = np.load(os.path.join(directory, 'vocab_columns.npy'), mmap_mode='r')
+        self.offsets = np.load(os.path.join(directory, 'vocab_offsets.npy'), mmap_mode='r')
+        self.terms = np.memmap(os.path.join(directory, 'vocab_terms.bin'), dtype=np.uint8, mode='r')
+        self.idf = np.load(os.path.join(directory, 'idf.npy'), mmap_mode='r')
+        self.n_features = len(self.idf)
+
+    def lookup(self, tokens: List[str]) -> np.ndarray:
+        """Feature column of each token, -1 for terms outside the vocabulary"""
+        if not tokens:
+            return np.empty(0, dtype=np.int64)
+        hashes = term_hashes(tokens)
+        positions = np.minimum(np.searchsorted(self.hashes, hashes), len(self.hashes) - 1)
+        columns = np.where(self.hashes[positions] == hashes, self.columns[positions], -1).astype(np.int64)
+        for i in np.flatnonzero(columns >= 0):
+            column = columns[i]
+            stored = self.terms[self.offsets[column]:self.offsets[column + 1]].tobytes()
+            if stored != tokens[i].encode('utf-8'):
+                columns[i] = -1  # Hash collision with an unknown word
+        return columns
+
+    def transform(self, texts: List[str]):
+        from sklearn.preprocessing import normalize
+
+        # Count matrix built the way CountVectorizer._count_vocab builds it
+        docs = [self.token_pattern.findall(text.lower() if self.lowercase else text) for text in texts]
+        columns = self.lookup([token for doc in docs for token in doc])
+        indptr, indices, values = [0], [], []
+        start = 0
+        for doc in docs:
+            counts = {}
+            for column in columns[start:start + len(doc)]:
+                if column >= 0:
+                    counts[int(column)] = counts.get(int(column), 0) + 1
+            start += len(doc)
+            indices.extend(counts)
+            values.extend(counts.values())
+            indptr.append(len(indices))
+        X = sp.csr_array((np.asarray(values, dtype=np.intc), np.asarray(indices, dtype=np.int32),
+                          np.asarray(indptr, dtype=np.int32)),
+                         shape=(len(texts), self.n_features), dtype=np.float64)
+        X.sort_indices()
+
+        # Then TfidfTransformer.transform
+        if self.sublinear_tf:
+            np.log(X.data, X.data)
+            X.data += 1.0
+        X.data *= self.idf[X.indices]
+        if self.norm is not None:
+            X = normalize(X, norm=self.norm, copy=False)
+        return sp.csr_matrix(X)
+
+class CompactLinearModel:
+    """LogisticRegression predict()/predict_proba() over memory-mapped coefficients"""
+
+    def __init__(self, directory: str, manifest: dict):
+        self.classes_ = np.array(manifest['classes'])
+        self.coef = np.load(os.path.join(directory, 'coef.npy'), mmap_mode='r')
+        self.intercept = np.load(os.path.join(directory, 'intercept.npy'), mmap_mode='r')
+
+    def decision_function(self, X) -> np.ndarray:
+        from sklearn.utils.extmath import safe_sparse_dot
+        scores = safe_sparse_dot(X, self.coef.T, dense_output=True) + self.intercept
+        return scores.ravel() if scores.shape[1] == 1 else scores
+
+    def predict(self, X) -> np.ndarray:
+        scores = self.decision_function(X)
+        indices = (scores > 0).astype(int) if scores.ndim == 1 else scores.argmax(axis=1)
+        return self.classes_[indices]
+
+    def predict_proba(self, X) -> np.ndarray:
+        from scipy.special import expit
+        from sklearn.utils.extmath import softmax
+        scores = self.decision_function(X)
+        if scores.ndim == 1:
+            positive = expit(scores)
+            return np.vstack([1 - positive, positive]).T
+        return softmax(scores, copy=False)
+
+def read_manifest(directory: str = ARTIFACTS_DIR) -> Optional[dict]:
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get('format_version') == FORMAT_VERSION else None
+
+def load_artifacts(directory: str = ARTIFACTS_DIR, manifest: Optional[dict] = None):
+    """(model, vectorizer) backed by the exported arrays"""
+    manifest = manifest or read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"No model artifacts in {directory}")
+    return CompactLinearModel(directory, manifest), CompactVectorizer(directory, manifest)
+
+# --- Export ---
+
+def export_artifacts(model, vectorizer, directory: str, sources: dict) -> dict:
+    """Writes the arrays and manifest for a fitted TfidfVectorizer + linear classifier"""
+    params = vectorizer.get_params()
+    unsupported = {name: params[name] for name, default in (
+        ('analyzer', 'word'), ('ngram_range', (1, 1)), ('tokenizer', None), ('preprocessor', None),
+        ('stop_words', None), ('strip_accents', None), ('binary', False), ('use_idf', True))
+        if params[name] != default}
+    if unsupported:
+        raise ValueError(f"Vectorizer settings not supported by the compact format: {unsupported}")
+
+    terms = [None] * len(vectorizer.vocabulary_)
+    for term, column in vectorizer.vocabulary_.items():
+        terms[column] = term
+    hashes = term_hashes(terms)
+    order = np.argsort(hashes, kind='stable')
+    if len(np.unique(hashes)) != len(hashes):
+        raise ValueError("Two vocabulary terms share a 64-bit hash")
+    encoded = [term.encode('utf-8') for term in terms]
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    np.cumsum([len(term) for term in encoded], out=offsets[1:])
+
+    tmp_dir = directory + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, 'vocab_hashes.npy'), hashes[order])
+    np.save(os.path.join(tmp_dir, 'vocab_columns.npy'), order.astype(np.int32))
+    np.save(os.path.join(tmp_dir, 'vocab_offsets.npy'), offsets)
+    with open(os.path.join(tmp_dir, 'vocab_terms.bin'), 'wb') as f:
+        f.write(b''.join(encoded))
+    np.save(os.path.join(tmp_dir, 'idf.npy'), np.ascontiguousarray(vectorizer.idf_, dtype=np.float64))
+    np.save(os.path.join(tmp_dir, 'coef.npy'), np.ascontiguousarray(model.coef_))
+    np.save(os.path.join(tmp_dir, 'intercept.npy'), np.ascontiguousarray(model.intercept_))
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'n_features': len(terms),
+        'classes': [str(c) for c in model.classes_],
+        'token_pattern': params['token_pattern'],
+        'lowercase': params['lowercase'],
+        'sublinear_tf': params['sublinear_tf'],
+        'norm': params['norm'],
+        'sources': sources,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap the whole directory so a running backend never sees half an export
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_dir, directory)
+    return manifest
+
+def sample_titles() -> List[str]:
+    """The "<process> <title>" strings in the bundled CSVs, preprocessed like /predict does"""
+    import csv
+    from text_preprocessing import preprocessing
+    titles = set()
+    for filename in sorted(glob.glob(os.path.join(BACKEND_DIR, 'desktop_activity_*.csv'))):
+        with open(filename, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                titles.add(preprocessing(f"{row.get('App Name', '')} {row.get('Window Title', '')}"))
+    return sorted(titles)
+
+def vocabulary_documents(vectorizer, words_per_doc: int = 7) -> List[str]:
+    """Every vocabulary term (some repeated, mixed with unknown words), so each lookup is exercised"""
+    terms = sorted(vectorizer.vocabulary_)
+    return [' '.join(terms[i:i + words_per_doc] + terms[i:i + 2] + ['zzunknownzz'])
+            for i in range(0, len(terms), words_per_doc)]
+
+def verify(model, vectorizer, compact_model, compact_vectorizer, texts: List[str]) -> bool:
+    """True when the artifacts give bit-identical tf-idf rows, scores, labels and probabilities"""
+    X, X_compact = vectorizer.transform(texts), compact_vectorizer.transform(texts)
+    if (X != X_compact).nnz or not np.array_equal(X.indices, X_compact.indices):
+        return False
+    return (np.array_equal(model.decision_function(X), compact_model.decision_function(X_compact))
+            and np.array_equal(model.predict(X), compact_model.predict(X_compact))
+            and np.array_equal(model.predict_proba(X), compact_model.predict_proba(X_compact)))
+
+def main():
+    import pickle
+    from activity_classifier import MODEL_PATH, VECTORIZER_PATH
+
+    parser = argparse.ArgumentParser(description="Export the classifier pickles as memory-mappable arrays")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--vectorizer', default=VECTORIZER_PATH)
+    parser.add_argument('--out', default=ARTIFACTS_DIR)
+    parser.add_argument('--check', action='store_true', help="Only verify existing artifacts")
+    args = parser.parse_args()
+
+    with open(args.model, 'rb') as f:
+        model = pickle.load(f)
+    with open(args.vectorizer, 'rb') as f:
+        vectorizer = pickle.load(f)
+
+    sources = source_hashes(args.model, args.vectorizer)
+    if args.check:
+        manifest = read_manifest(args.out)
+        if manifest is None or manifest['sources'] != sources:
+            print(f"❌ {args.out} is missing or was exported from different pickles")
+            sys.exit(1)
+    else:
+        manifest = export_artifacts(model, vectorizer, args.out, sources)
+        size = sum(os.path.getsize(path) for path in glob.glob(os.path.join(args.out, '*')))
+        print(f"📦 Exported {manifest['n_features']} terms, {len(manifest['classes'])} classes "
+              f"to {args.out} ({size / 1024:.0f} KB)")
+
+    titles = sample_titles()
+    texts = titles + vocabulary_documents(vectorizer)
+    compact_model, compact_vectorizer = load_artifacts(args.out)
+    if not verify(model, vectorizer, compact_model, compact_vectorizer, texts):
+        print(f"❌ Artifacts do not reproduce the pickled pipeline on {len(texts)} texts")
+        sys.exit(1)
+    print(f"✅ Bit-identical to the pickled pipeline on {len(titles)} distinct titles "
+          f"and {len(texts) - len(titles)} vocabulary documents")
+
+if __name__ == '__main__':
+    main()
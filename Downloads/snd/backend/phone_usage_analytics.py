@@ -0,0 +1,90 @@
+# phone_usage_analytics.py
+"""
+Phone usage aggregation over app_usage_logs rows, in pandas.
+
+Used by the phone usage endpoints when the SQL functions in
+supabase/migrations/20261017010000_phone_usage_rpcs.sql are not deployed,
+and follows the same rules: durations are 'HH:MM:SS' or 'MM:SS' (anything
+else counts as 0), a missing app name is 'Unknown', days are UTC dates and
+ties go to the alphabetically first app.
+"""
+
+from operator import itemgetter
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+PHONE_LOG_COLUMNS = ['app_name', 'duration', 'created_at']
+DURATION_PATTERN = r'^(\d+):(\d+)(?::(\d+))?$'
+
+def parse_durations(durations: pd.Series) -> pd.Series:
+    """Vectorized 'HH:MM:SS' / 'MM:SS' -> seconds (int64, 0 when malformed)
+
+    Logs repeat the same few thousand durations, so only the distinct
+    strings go through the regex and the results are spread back by code.
+    """
+    codes, distinct = pd.factorize(durations)
+    parts = pd.Series(distinct, dtype=object).str.extract(DURATION_PATTERN)
+    has_hours = parts[2].notna().to_numpy()
+    first, second, third = (parts[i].astype(float).fillna(0).to_numpy(dtype=np.int64) for i in range(3))
+    seconds = np.append(np.where(has_hours, first * 3600 + second * 60 + third, first * 60 + second), 0)
+    return pd.Series(seconds[codes], index=durations.index, dtype=np.int64)  # code -1 (missing) -> 0
+
+def utc_dates(created_at: pd.Series) -> pd.Series:
+    """ISO timestamps -> 'YYYY-MM-DD' of the UTC day, as strings (missing when missing or invalid)"""
+    text = created_at.astype('string')
+    if len(text) and text.str.endswith(('+00:00', 'Z')).all():
+        return text.str.slice(0, 10)  # Supabase returns UTC: the date is the prefix
+    parsed = pd.to_datetime(created_at, utc=True, format='ISO8601', errors='coerce')
+    return parsed.dt.strftime('%Y-%m-%d').astype('string').where(parsed.notna())
+
+def column(rows: List[Dict[str, Any]], name: str) -> pd.Series:
+    """One field of every row, as an object Series (None where it is missing)"""
+    try:
+        values = list(map(itemgetter(name), rows))  # Loops in C; PostgREST rows have every selected column
+    except KeyError:
+        values = [row.get(name) for row in rows]
+    return pd.Series(values, dtype=object)
+
+def to_frame(rows: List[Dict[str, Any]], dates: bool = True) -> pd.DataFrame:
+    """app_usage_logs rows -> DataFrame of app_name, seconds and (UTC) usage_date
+
+    Pass dates=False when only per-app totals are needed (no usage_date column).
+    """
+    frame = {
+        'app_name': column(rows, 'app_name').fillna('Unknown').astype(str),
+        'seconds': parse_durations(column(rows, 'duration')),
+    }
+    if dates:
+        frame['usage_date'] = utc_dates(column(rows, 'created_at'))
+    return pd.DataFrame(frame)
+
+def usage_by_app(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """[{app_name, total_seconds}], largest first"""
+    if frame.empty:
+        return []
+    totals = frame.groupby('app_name', sort=True)['seconds'].sum()
+    totals = totals.sort_values(ascending=False, kind='stable')  # Ties stay alphabetical
+    return [{'app_name': app, 'total_seconds': int(seconds)} for app, seconds in totals.items()]
+
+def top_apps(usage: List[Dict[str, Any]], n: int = 5) -> List[Dict[str, Any]]:
+    """The n apps with the most usage, from [{app_name, total_seconds}] rows (any order, apps may repeat)"""
+    if not usage:
+        return []
+    totals = pd.DataFrame(usage).groupby('app_name', sort=True)['total_seconds'].sum()
+    top = totals.nlargest(n, keep='first')  # Grouped alphabetically, so ties go to the first app
+    return [{'app_name': app, 'total_seconds': int(seconds)} for app, seconds in top.items()]
+
+def usage_by_day(frame: pd.DataFrame) -> List[Dict[str, Any]]:
+    """[{usage_date, total_seconds, top_app}] for each day with usage, oldest first"""
+    frame = frame.dropna(subset=['usage_date'])
+    if frame.empty:
+        return []
+    per_app = frame.groupby(['usage_date', 'app_name'], sort=True)['seconds'].sum().reset_index()
+    totals = per_app.groupby('usage_date', sort=True)['seconds'].sum()
+    # Most used app per day; the stable sort keeps the alphabetical order on ties
+    top = (per_app.sort_values('seconds', ascending=False, kind='stable')
+           .drop_duplicates('usage_date').set_index('usage_date')['app_name'])
+    return [{'usage_date': day, 'total_seconds': int(seconds), 'top_app': top[day]}
+            for day, seconds in totals.items()]
@@ -0,0 +1,180 @@
+# query_cache.py
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+import requests
+from auth_context import service_headers
+from serve import backend_url
+
+INVALIDATE_URL = backend_url('/api/cache/invalidate')
+TODAY_TTL = 30  # seconds; today's numbers change while the tracker runs
+EMPTY_TTL = 60  # seconds; a closed day with no data may still be backfilled
+_MISSING = object()
+
+
+class QueryCache:
+    """Bounded LRU cache of Supabase query results, tagged with the dates they cover.
+
+    Each entry has its own TTL (None = never expires), so summaries of closed
+    days are kept indefinitely while anything touching today expires quickly.
+    Entries are also dropped explicitly when rows for one of their dates are
+    written (invalidate_dates).
+    """
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value for key, or default on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: Any, ttl_seconds: Optional[float], dates: Tuple[date, date]):
+        """Store value for ttl_seconds (None = until invalidated); dates is the (first, last) day it covers"""
+        with self._lock:
+            expires_at = None if ttl_seconds is None else time.monotonic() + ttl_seconds
+            self._entries[key] = (value, expires_at, dates)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def cached(self, key: Hashable, dates: Tuple[date, date], load, is_empty=lambda value: not value):
+        """Return the cached value for key, or load() it and cache it with a TTL picked from dates"""
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        value = load()
+        self.put(key, value, ttl_for(dates, is_empty(value)), dates)
+        return value
+
+    def invalidate_dates(self, days: Iterable[date]) -> int:
+        """Drop every entry covering one of days; returns how many were dropped"""
+        days = set(days)
+        with self._lock:
+            stale = [key for key, (_, _, (first, last)) in self._entries.items()
+                     if any(first <= day <= last for day in days)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters for monitoring the cache hit rate"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+            }
+
+class InvalidationLog:
+    """Append-only file that carries cache invalidations to every server process.
+
+    With several workers each process has its own QueryCache, but an
+    invalidation request reaches only one of them. That process appends the
+    dates here; the others notice the file grew (one stat per request) and
+    apply the same invalidation to their own cache.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._offset = self._size()  # Older entries predate this process's (empty) cache
+
+    def _size(self) -> int:
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def publish(self, days: Optional[Iterable[date]]):
+        """Record an invalidation (None = everything) for all processes"""
+        entry = {'dates': None if days is None else sorted({day.isoformat() for day in days})}
+        mode = 'w' if self._size() > self.max_bytes else 'a'  # Start over once the log is large
+        with open(self.path, mode, encoding='utf-8') as f:
+            f.write(json.dumps(entry) + '\n')
+
+    def apply(self, cache: QueryCache):
+        """Apply entries published (by any process) since the last call"""
+        size = self._size()
+        with self._lock:
+            if size == self._offset:
+                return
+            if size < self._offset:
+                # The log was restarted: entries may have been missed, so drop everything
+                cache.clear()
+                self._offset = 0
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                chunk = f.read(size - self._offset)
+            end = chunk.rfind(b'\n')
+            if end < 0:
+                return
+            self._offset += end + 1
+
+        for line in chunk[:end + 1].decode('utf-8', errors='replace').splitlines():
+            try:
+                dates = json.loads(line)['dates']
+            except (ValueError, KeyError, TypeError):
+                continue
+            if dates is None:
+                cache.clear()
+            else:
+                cache.invalidate_dates(date.fromisoformat(day) for day in dates)
+
+def ttl_for(dates: Tuple[date, date], empty: bool = False) -> Optional[float]:
+    """TTL for a result covering dates: brief if it includes today, forever if all days are closed"""
+    if dates[1] >= date.today():
+        return TODAY_TTL
+    if empty:
+        return EMPTY_TTL
+    return None
+
+def notify_invalidation(days: Iterable[date], url: str = INVALIDATE_URL, session=None, timeout: float = 2) -> bool:
+    """Ask the Flask backend to drop cached results for days (best effort, e.g. after a sync)"""
+    try:
+        response = (session or requests).post(url, json={'dates': sorted({day.isoformat() for day in days})},
+                                              headers=service_headers(), timeout=timeout)
+        return response.ok
+    except requests.RequestException:
+        return False
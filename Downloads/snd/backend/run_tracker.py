@@ -3,17 +3,36 @@
 import subprocess
 import time
 import sys
+import requests
 
 # Import the tracker's main function
 from desktop_tracker_step2 import start_tracking
+from serve import backend_url
+
+HEALTH_URL = backend_url('/healthz')  # Same BACKEND_HOST/BACKEND_PORT as serve.py
+STARTUP_TIMEOUT = 60 # seconds to wait for the backend to report ready
+
+def wait_for_backend(process, timeout=STARTUP_TIMEOUT):
+    """Polls the backend's /healthz until the model is loaded; False on timeout."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False  # The server exited
+        try:
+            if requests.get(HEALTH_URL, timeout=1).status_code == 200:
+                return True
+        except requests.RequestException:
+            pass  # Not listening yet
+        time.sleep(0.25)
+    return False
 
 def main():
     """Starts the backend server and then the desktop tracker."""
     print("--- Starting the Activity Tracker Application ---")
 
-    # Command to run the Flask backend
+    # Command to run the Flask backend with a multi-threaded server (see serve.py)
     # We use sys.executable to ensure we use the same Python interpreter
-    backend_command = [sys.executable, "flask_backend_step2.py"]
+    backend_command = [sys.executable, "serve.py"]
 
     # Start the backend server as a background process
     print("\nStep 1: Starting the backend server in the background...")
@@ -21,8 +40,12 @@ def main():
     backend_process = subprocess.Popen(backend_command)
     
     print(f"Backend server started with PID: {backend_process.pid}")
-    print("Waiting a few seconds for the server to initialize...")
-    time.sleep(5) # Give the server a moment to start up
+    print("Waiting for the server to report ready...")
+    started = time.monotonic()
+    if wait_for_backend(backend_process):
+        print(f"Backend ready after {time.monotonic() - started:.1f}s")
+    else:
+        print("⚠️  Backend did not report ready, starting the tracker anyway")
 
     # Start the desktop tracker in the foreground
     print("\nStep 2: Starting the desktop tracker...")
@@ -0,0 +1,119 @@
+# serve.py
+"""
+Production launcher for the Flask backend (flask_backend_step2.py).
+
+Serves the app with a multi-threaded WSGI server so a slow Supabase-bound
+dashboard request never holds up the tracker's /predict calls:
+
+- POSIX: gunicorn with BACKEND_WORKERS processes x BACKEND_THREADS threads.
+  The app (and the classifier) is imported once in the master, and the
+  background startup is awaited before the workers fork, so the model is
+  shared copy-on-write.
+- Windows: waitress, one process with BACKEND_THREADS threads.
+- Neither installed: Flask's threaded server (no debugger/reloader).
+
+Configuration (environment variables):
+    BACKEND_HOST     default 127.0.0.1
+    BACKEND_PORT     default 5000
+    BACKEND_SERVER   auto | gunicorn | waitress | flask   (default auto)
+    BACKEND_WORKERS  gunicorn worker processes (default 2)
+    BACKEND_THREADS  threads per worker (default 8)
+
+The tracker and the importer build their backend URLs with backend_url(),
+so they follow BACKEND_HOST/BACKEND_PORT too.
+"""
+
+import gc
+import os
+import sys
+
+HOST = os.getenv('BACKEND_HOST', '127.0.0.1')
+PORT = int(os.getenv('BACKEND_PORT', '5000'))
+SERVER = os.getenv('BACKEND_SERVER', 'auto')
+WORKERS = int(os.getenv('BACKEND_WORKERS', '2'))
+THREADS = int(os.getenv('BACKEND_THREADS', '8'))
+
+def backend_url(path: str) -> str:
+    """URL of a backend route on BACKEND_HOST/BACKEND_PORT (loopback when bound to all interfaces)"""
+    host = '127.0.0.1' if HOST in ('', '0.0.0.0', '::') else HOST
+    if ':' in host:
+        host = f'[{host}]'  # IPv6 literal
+    return f"http://{host}:{PORT}{path}"
+
+def load_app(wait: bool = False):
+    """Imports the Flask app and freezes it for copy-on-write sharing.
+
+    The model and Supabase load in background threads; with wait=True (before
+    forking, where those threads would not survive) they are awaited first.
+    """
+    from flask_backend_step2 import app, wait_until_started
+    if wait:
+        wait_until_started()
+    # Move everything allocated so far out of the GC's reach, so collections in
+    # forked workers don't write to (and un-share) the parent's pages
+    gc.collect()
+    gc.freeze()
+    return app
+
+def pick_server() -> str:
+    if SERVER != 'auto':
+        return SERVER
+    if os.name != 'nt':
+        try:
+            import gunicorn  # noqa: F401
+            return 'gunicorn'
+        except ImportError:
+            pass
+    try:
+        import waitress  # noqa: F401
+        return 'waitress'
+    except ImportError:
+        return 'flask'
+
+def serve_gunicorn():
+    from gunicorn.app.base import BaseApplication
+
+    class BackendApplication(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f"{HOST}:{PORT}")
+            self.cfg.set('workers', WORKERS)
+            self.cfg.set('threads', THREADS)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('preload_app', True)  # Load the model once, before forking
+            self.cfg.set('timeout', 120)
+
+        def load(self):
+            return load_app(wait=True)
+
+    BackendApplication().run()
+
+def serve_waitress():
+    from waitress import serve
+    serve(load_app(), host=HOST, port=PORT, threads=THREADS)
+
+def serve_flask():
+    load_app().run(host=HOST, port=PORT, threaded=True, debug=False, use_reloader=False)
+
+def main():
+    server = pick_server()
+    print("=" * 60)
+    print("🚀 Starting Flask Backend Server")
+    print("=" * 60)
+    print(f"📍 Server: http://{HOST}:{PORT}")
+    if server == 'gunicorn':
+        print(f"⚙️  gunicorn: {WORKERS} workers x {THREADS} threads (model preloaded, shared copy-on-write)")
+    elif server == 'waitress':
+        print(f"⚙️  waitress: {THREADS} threads")
+    else:
+        print("⚙️  Flask threaded server (pip install waitress or gunicorn for production)")
+    print("=" * 60)
+    sys.stdout.flush()
+
+    serve = {'gunicorn': serve_gunicorn, 'waitress': serve_waitress, 'flask': serve_flask}.get(server)
+    if serve is None:
+        print(f"❌ Unknown BACKEND_SERVER '{server}' (use auto, gunicorn, waitress or flask)")
+        sys.exit(1)
+    serve()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+# sqlite_rpc.py
+"""
+SQLite stand-in for the Supabase phone usage RPCs.
+
+Mirrors the SQL functions in supabase/migrations (phone_usage_by_app,
+phone_usage_by_day) and the trigger-maintained phone_usage_daily rollups over
+a local app_usage_logs table. Answers client.rpc(name, params).execute().data
+like the Supabase client does, plus the table(...).select().eq()/in_()/gte()/lt()
+reads of the routes and their fallbacks, so the Flask phone routes can be
+exercised without a Supabase project:
+
+    import flask_backend_step2 as backend
+    backend.supabase_client = SqliteRpcClient()
+"""
+
+import re
+import sqlite3
+import threading
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Iterable, List
+
+_HMS = re.compile(r"^\d+:\d+:\d+$")
+_MS = re.compile(r"^\d+:\d+$")
+NIL_USER_ID = '00000000-0000-0000-0000-000000000000'
+_OR_TERM = re.compile(r"(\w+)\.in\.\(([^)]*)\)|(\w+)\.is\.null")
+
+def phone_duration_seconds(duration) -> int:
+    """'HH:MM:SS' or 'MM:SS' -> seconds (anything else counts as 0), like the SQL function"""
+    if not isinstance(duration, str):
+        return 0
+    if _HMS.match(duration):
+        hours, minutes, seconds = map(int, duration.split(':'))
+        return hours * 3600 + minutes * 60 + seconds
+    if _MS.match(duration):
+        minutes, seconds = map(int, duration.split(':'))
+        return minutes * 60 + seconds
+    return 0
+
+def _utc_text(value) -> str:
+    """Timestamps are stored as UTC 'YYYY-MM-DDTHH:MM:SS' text so they sort and compare as strings"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime('%Y-%m-%dT%H:%M:%S')
+
+
+class _Response:
+    def __init__(self, data: List[Dict[str, Any]]):
+        self.data = data
+
+
+class _RpcCall:
+    def __init__(self, client: 'SqliteRpcClient', name: str, params: Dict[str, Any]):
+        self.client = client
+        self.name = name
+        self.params = params
+
+    def execute(self) -> _Response:
+        handler = self.client.functions.get(self.name)
+        if handler is None:
+            raise LookupError(f"Could not find the function public.{self.name}")
+        return _Response(handler(**self.params))
+
+
+class _TableQuery:
+    """The subset of the postgrest query builder the phone routes use"""
+
+    _OPERATORS = {'eq': '=', 'gte': '>=', 'gt': '>', 'lte': '<=', 'lt': '<'}
+
+    def __init__(self, client: 'SqliteRpcClient', name: str):
+        self.client = client
+        self.name = name
+        self.columns = '*'
+        self.filters = []
+
+    def select(self, columns: str = '*') -> '_TableQuery':
+        self.columns = columns
+        return self
+
+    def _filter(self, operator: str, column: str, value) -> '_TableQuery':
+        if column == 'created_at':
+            value = _utc_text(value)
+        self.filters.append((f"{column} {self._OPERATORS[operator]} ?", [value]))
+        return self
+
+    def in_(self, column: str, values) -> '_TableQuery':
+        values = list(values)
+        self.filters.append((f"{column} IN ({','.join('?' * len(values)) or 'NULL'})", values))
+        return self
+
+    def or_(self, filters: str) -> '_TableQuery':
+        """Only the column.in.(a,b) and column.is.null terms"""
+        terms, params = [], []
+        for column, values, null_column in _OR_TERM.findall(filters):
+            if null_column:
+                terms.append(f"{null_column} IS NULL")
+            else:
+                values = [value for value in values.split(',') if value]
+                terms.append(f"{column} IN ({','.join('?' * len(values)) or 'NULL'})")
+                params.extend(values)
+        self.filters.append(('(' + ' OR '.join(terms) + ')', params))
+        return self
+
+    def eq(self, column, value): return self._filter('eq', column, value)
+    def gte(self, column, value): return self._filter('gte', column, value)
+    def gt(self, column, value): return self._filter('gt', column, value)
+    def lte(self, column, value): return self._filter('lte', column, value)
+    def lt(self, column, value): return self._filter('lt', column, value)
+
+    def execute(self) -> _Response:
+        where = ' AND '.join(condition for condition, _ in self.filters) or '1'
+        rows = self.client._query(f"SELECT {self.columns} FROM {self.name} WHERE {where} ORDER BY rowid",
+                                  tuple(value for _, values in self.filters for value in values))
+        for row in rows:
+            if 'created_at' in row:
+                row['created_at'] += '+00:00'  # timestamptz comes back with its offset
+        return _Response(rows)
+
+
+class SqliteRpcClient:
+    """In-process database exposing the phone usage RPCs."""
+
+    def __init__(self, path: str = ':memory:'):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.create_function('phone_duration_seconds', 1, phone_duration_seconds, deterministic=True)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS app_usage_logs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT,
+                app_name TEXT,
+                duration TEXT,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS app_usage_logs_created_at_idx ON app_usage_logs (created_at);
+        """)
+        self._create_rollups()
+        self.functions = {
+            'phone_usage_by_app': self.phone_usage_by_app,
+            'phone_usage_by_day': self.phone_usage_by_day,
+        }
+
+    def _create_rollups(self):
+        """phone_usage_daily and the triggers that keep it current, as in 20261017030000_phone_usage_daily.sql"""
+        apply = """
+            INSERT INTO phone_usage_daily (user_id, usage_date, app_name, total_seconds, log_count)
+            VALUES (coalesce({row}.user_id, '{nil}'), substr({row}.created_at, 1, 10),
+                    coalesce({row}.app_name, 'Unknown'), {sign} * phone_duration_seconds({row}.duration), {sign})
+            ON CONFLICT (user_id, usage_date, app_name) DO UPDATE
+                SET total_seconds = total_seconds + excluded.total_seconds,
+                    log_count = log_count + excluded.log_count;
+        """
+        add = apply.format(row='NEW', sign=1, nil=NIL_USER_ID)
+        remove = apply.format(row='OLD', sign=-1, nil=NIL_USER_ID)
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS phone_usage_daily (
+                user_id TEXT NOT NULL DEFAULT '{NIL_USER_ID}',
+                usage_date TEXT NOT NULL,
+                app_name TEXT NOT NULL,
+                total_seconds INTEGER NOT NULL DEFAULT 0,
+                log_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_id, usage_date, app_name)
+            );
+            CREATE TRIGGER IF NOT EXISTS app_usage_logs_rollup_insert AFTER INSERT ON app_usage_logs
+            BEGIN {add} END;
+            CREATE TRIGGER IF NOT EXISTS app_usage_logs_rollup_update AFTER UPDATE ON app_usage_logs
+            BEGIN {remove} {add} END;
+            CREATE TRIGGER IF NOT EXISTS app_usage_logs_rollup_delete AFTER DELETE ON app_usage_logs
+            BEGIN {remove} END;
+        """)
+
+    def drop_rollups(self):
+        """Removes phone_usage_daily, as if its migration wasn't applied"""
+        with self._lock:
+            self._conn.executescript("""
+                DROP TRIGGER IF EXISTS app_usage_logs_rollup_insert;
+                DROP TRIGGER IF EXISTS app_usage_logs_rollup_update;
+                DROP TRIGGER IF EXISTS app_usage_logs_rollup_delete;
+                DROP TABLE IF EXISTS phone_usage_daily;
+            """)
+
+    def insert_app_usage(self, rows: Iterable[Dict[str, Any]]):
+        """Adds app_usage_logs rows ({'app_name', 'duration', 'created_at', optional 'user_id'})"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO app_usage_logs (user_id, app_name, duration, created_at) VALUES (?, ?, ?, ?)",
+                [(row.get('user_id'), row.get('app_name'), row.get('duration'), _utc_text(row['created_at']))
+                 for row in rows])
+            self._conn.commit()
+
+    def delete_app_usage(self, created_before):
+        """Deletes the logs created before a point in time (the triggers update the rollups)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM app_usage_logs WHERE created_at < ?", (_utc_text(created_before),))
+            self._conn.commit()
+
+    def rpc(self, name: str, params: Dict[str, Any] = None) -> _RpcCall:
+        return _RpcCall(self, name, params or {})
+
+    def table(self, name: str) -> _TableQuery:
+        return _TableQuery(self, name)
+
+    def _query(self, sql: str, params: tuple) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+
+    # --- Functions (same results as the Postgres versions) ---
+
+    def phone_usage_by_app(self, p_user_ids, since) -> List[Dict[str, Any]]:
+        return self._query(f"""
+            SELECT coalesce(app_name, 'Unknown') AS app_name,
+                   sum(phone_duration_seconds(duration)) AS total_seconds
+            FROM app_usage_logs
+            WHERE coalesce(user_id, '{NIL_USER_ID}') IN ({','.join('?' * len(p_user_ids))})
+              AND created_at >= ?
+            GROUP BY 1
+            ORDER BY 2 DESC, 1
+        """, (*p_user_ids, _utc_text(since)))
+
+    def phone_usage_by_day(self, p_user_ids, start_date, end_date) -> List[Dict[str, Any]]:
+        return self._query(f"""
+            WITH per_app AS (
+                SELECT usage_date, app_name, sum(total_seconds) AS seconds
+                FROM phone_usage_daily
+                WHERE user_id IN ({','.join('?' * len(p_user_ids))})
+                  AND usage_date BETWEEN ? AND ?
+                  AND log_count > 0
+                GROUP BY 1, 2
+            ), ranked AS (
+                SELECT usage_date, app_name,
+                       sum(seconds) OVER (PARTITION BY usage_date) AS total_seconds,
+                       row_number() OVER (PARTITION BY usage_date ORDER BY seconds DESC, app_name) AS app_rank
+                FROM per_app
+            )
+            SELECT usage_date, total_seconds, app_name AS top_app
+            FROM ranked
+            WHERE app_rank = 1
+            ORDER BY usage_date
+        """, (*p_user_ids, date.fromisoformat(str(start_date)).isoformat(), date.fromisoformat(str(end_date)).isoformat()))
@@ -1,10 +1,39 @@
 # supabase_helper.py
 import os
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, date, timedelta
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from supabase import create_client, Client
-import pandas as pd
+from query_cache import QueryCache
+from auth_context import DEMO_USER_ID
+
+# Unique key of an activity_logs row (see supabase/migrations)
+ACTIVITY_NATURAL_KEY = 'user_id,timestamp,app_name'
+
+# Columns fetched per table (only what the API and dashboard use)
+DAILY_SUMMARY_COLUMNS = ('date,study_minutes,entertainment_minutes,others_minutes,total_minutes,'
+                         'study_percentage,entertainment_percentage,others_percentage,'
+                         'most_used_app,total_activities')
+WEEKLY_SUMMARY_COLUMNS = ('week_start_date,week_end_date,year,week_number,'
+                          'study_minutes,entertainment_minutes,others_minutes,total_minutes,'
+                          'study_percentage,entertainment_percentage,others_percentage,'
+                          'avg_daily_minutes,most_productive_day')
+ACTIVITY_LOG_COLUMNS = 'id,timestamp,app_name,window_title,category,duration_seconds,date'
+APP_USAGE_COLUMNS = 'app_name,category,total_minutes,usage_count'
+
+QUERY_TIMEOUT = 5  # seconds a parallel fan-out waits for its slowest query
+QUERY_WORKERS = 8  # threads shared by all fan-outs of one helper
+
+def _is_no_rows(error: Exception) -> bool:
+    """True for PostgREST's "no rows" error from .single() (not a failure)"""
+    error_dict = error.args[0] if error.args else {}
+    return isinstance(error_dict, dict) and error_dict.get('code') == 'PGRST116'
+
+def _filter_value(value: str) -> str:
+    """Quote a value for a PostgREST or=(...) filter"""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
 
 class SupabaseHelper:
     def __init__(self):
@@ -21,6 +50,9 @@ class SupabaseHelper:
         
         self.supabase: Client = create_client(self.supabase_url, self.supabase_key)
         self.user_id = None
+        # Read results, kept indefinitely for closed days and briefly for today
+        self.cache = QueryCache()
+        self._pool = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix='supabase-query')
         
     def _load_env_file(self):
         """Load environment variables from .env.local or .env file"""
@@ -44,7 +76,7 @@ class SupabaseHelper:
                     break
     
     def set_user_id(self, user_id: str):
-        """Set the current user ID for all operations"""
+        """Set the default user ID (for methods called without user_id)"""
         self.user_id = user_id
     
     def get_demo_user_id(self) -> str:
@@ -52,21 +84,29 @@ class SupabaseHelper:
         if not self.user_id:
             # Use a consistent demo user ID in valid UUID format
             # This is a fixed UUID for demo/testing purposes
-            self.user_id = "00000000-0000-0000-0000-000000000001"
+            self.user_id = DEMO_USER_ID
         return self.user_id
     
+    def _user(self, user_id: Optional[str]) -> str:
+        """The user an operation acts for: the explicit user_id, else the default user.
+        
+        A server sharing one helper between requests passes user_id on every
+        call and never mutates self.user_id.
+        """
+        return user_id or self.user_id or DEMO_USER_ID
+    
     def insert_activity_log(self, app_name: str, window_title: str, category: str, 
-                           duration_seconds: int = 5, timestamp: datetime = None) -> bool:
+                           duration_seconds: int = 5, timestamp: datetime = None,
+                           user_id: Optional[str] = None) -> bool:
         """Insert a single activity log entry"""
         try:
-            if not self.user_id:
-                self.get_demo_user_id()
+            user_id = self._user(user_id)
             
             if timestamp is None:
                 timestamp = datetime.now()
             
             data = {
-                'user_id': self.user_id,
+                'user_id': user_id,
                 'timestamp': timestamp.isoformat(),
                 'app_name': app_name,
                 'window_title': window_title,
@@ -76,38 +116,40 @@ class SupabaseHelper:
             }
             
             result = self.supabase.table('activity_logs').insert(data).execute()
+            self.cache.invalidate_dates([timestamp.date()])
             return True
             
         except Exception as e:
             print(f"Error inserting activity log: {e}")
             return False
     
-    def insert_activity_batch(self, activities: List[Dict[str, Any]]) -> bool:
+    def _activity_row(self, activity: Dict[str, Any], user_id: str) -> Dict[str, Any]:
+        """Build an activity_logs row for user_id from an activity dict"""
+        timestamp = activity.get('timestamp', datetime.now())
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+        
+        return {
+            'user_id': user_id,
+            'timestamp': timestamp.isoformat(),
+            'app_name': activity['app_name'],
+            'window_title': activity['window_title'],
+            'category': activity['category'].lower(),
+            'duration_seconds': activity.get('duration_seconds', 5),
+            'date': timestamp.date().isoformat()
+        }
+    
+    def insert_activity_batch(self, activities: List[Dict[str, Any]], user_id: Optional[str] = None) -> bool:
         """Insert multiple activity logs in batch"""
         try:
-            if not self.user_id:
-                self.get_demo_user_id()
+            user_id = self._user(user_id)
             
             # Prepare batch data
-            batch_data = []
-            for activity in activities:
-                timestamp = activity.get('timestamp', datetime.now())
-                if isinstance(timestamp, str):
-                    timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                
-                data = {
-                    'user_id': self.user_id,
-                    'timestamp': timestamp.isoformat(),
-                    'app_name': activity['app_name'],
-                    'window_title': activity['window_title'],
-                    'category': activity['category'].lower(),
-                    'duration_seconds': activity.get('duration_seconds', 5),
-                    'date': timestamp.date().isoformat()
-                }
-                batch_data.append(data)
+            batch_data = [self._activity_row(activity, user_id) for activity in activities]
             
             # Insert batch
             result = self.supabase.table('activity_logs').insert(batch_data).execute()
+            self.cache.invalidate_dates({date.fromisoformat(row['date']) for row in batch_data})
             print(f"Successfully inserted {len(batch_data)} activity logs")
             return True
             
@@ -115,36 +157,73 @@ class SupabaseHelper:
             print(f"Error inserting activity batch: {e}")
             return False
     
-    def get_daily_summary(self, target_date: date = None) -> Optional[Dict[str, Any]]:
-        """Get daily summary for a specific date"""
+    def upsert_activity_batch(self, activities: List[Dict[str, Any]], ignore_duplicates: bool = True,
+                              user_id: Optional[str] = None, raise_errors: bool = False) -> bool:
+        """Idempotently write multiple activity logs.
+        
+        Rows are keyed by (user_id, timestamp, app_name), so replaying a batch
+        (importer reruns, sync retries) never creates duplicates. Existing rows
+        are left untouched unless ignore_duplicates is False, in which case
+        they are overwritten. Needs the activity_logs_natural_key constraint
+        (supabase/migrations/20261017000000_activity_logs_natural_key.sql).
+        raise_errors: raise failures instead of returning False (the sync worker
+        tells rejected rows from network errors by the exception).
+        """
         try:
-            if not self.user_id:
-                self.get_demo_user_id()
+            user_id = self._user(user_id)
+            
+            # A statement may not touch the same key twice, so dedupe within the batch (last wins)
+            rows = {}
+            for activity in activities:
+                row = self._activity_row(activity, user_id)
+                rows[(row['user_id'], row['timestamp'], row['app_name'])] = row
+            batch_data = list(rows.values())
+            
+            result = self.supabase.table('activity_logs').upsert(
+                batch_data, on_conflict=ACTIVITY_NATURAL_KEY, ignore_duplicates=ignore_duplicates
+            ).execute()
+            self.cache.invalidate_dates({date.fromisoformat(row['date']) for row in batch_data})
+            print(f"Successfully upserted {len(batch_data)} activity logs")
+            return True
+            
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"Error upserting activity batch: {e}")
+            return False
+    
+    def get_daily_summary(self, target_date: date = None, user_id: Optional[str] = None,
+                          raise_errors: bool = False) -> Optional[Dict[str, Any]]:
+        """Get daily summary for a specific date (raise_errors: raise failures instead of returning None)"""
+        try:
+            user_id = self._user(user_id)
             
             if target_date is None:
                 target_date = date.today()
             
-            result = self.supabase.table('daily_summary')\
-                .select('*')\
-                .eq('user_id', self.user_id)\
-                .eq('date', target_date.isoformat())\
-                .single()\
-                .execute()
-            
-            return result.data if result.data else None
+            return self.cache.cached(
+                ('daily_summary', user_id, target_date), (target_date, target_date),
+                lambda: self.supabase.table('daily_summary')
+                    .select(DAILY_SUMMARY_COLUMNS)
+                    .eq('user_id', user_id)
+                    .eq('date', target_date.isoformat())
+                    .single()
+                    .execute().data or None)
             
         except Exception as e:
+            if raise_errors and not _is_no_rows(e):
+                raise
             # Only print error if it's not a "no rows" error
             error_dict = e.args[0] if e.args else {}
             if isinstance(error_dict, dict) and error_dict.get('code') != 'PGRST116':
                 print(f"Error getting daily summary: {e}")
             return None
     
-    def get_weekly_summary(self, target_date: date = None) -> Optional[Dict[str, Any]]:
-        """Get weekly summary for the week containing target_date"""
+    def get_weekly_summary(self, target_date: date = None, user_id: Optional[str] = None,
+                           raise_errors: bool = False) -> Optional[Dict[str, Any]]:
+        """Get weekly summary for the week containing target_date (raise_errors: as for get_daily_summary)"""
         try:
-            if not self.user_id:
-                self.get_demo_user_id()
+            user_id = self._user(user_id)
             
             if target_date is None:
                 target_date = date.today()
@@ -153,119 +232,173 @@ class SupabaseHelper:
             year = target_date.year
             week_number = target_date.isocalendar()[1]
             
-            result = self.supabase.table('weekly_summary')\
-                .select('*')\
-                .eq('user_id', self.user_id)\
-                .eq('year', year)\
-                .eq('week_number', week_number)\
-                .single()\
-                .execute()
-            
-            return result.data if result.data else None
+            week_start = target_date - timedelta(days=target_date.weekday())
+            return self.cache.cached(
+                ('weekly_summary', user_id, year, week_number), (week_start, week_start + timedelta(days=6)),
+                lambda: self.supabase.table('weekly_summary')
+                    .select(WEEKLY_SUMMARY_COLUMNS)
+                    .eq('user_id', user_id)
+                    .eq('year', year)
+                    .eq('week_number', week_number)
+                    .single()
+                    .execute().data or None)
             
         except Exception as e:
+            if raise_errors and not _is_no_rows(e):
+                raise
             # Only print error if it's not a "no rows" error
             error_dict = e.args[0] if e.args else {}
             if isinstance(error_dict, dict) and error_dict.get('code') != 'PGRST116':
                 print(f"Error getting weekly summary: {e}")
             return None
     
-    def get_last_n_days(self, days: int = 7) -> List[Dict[str, Any]]:
-        """Get daily summaries for the last N days"""
+    def get_last_n_days(self, days: int = 7, user_id: Optional[str] = None,
+                        raise_errors: bool = False) -> List[Dict[str, Any]]:
+        """Get daily summaries for the last N days (raise_errors: raise failures instead of returning [])"""
         try:
-            if not self.user_id:
-                self.get_demo_user_id()
-            
-            start_date = date.today() - timedelta(days=days-1)
+            user_id = self._user(user_id)
             
-            result = self.supabase.table('daily_summary')\
-                .select('*')\
-                .eq('user_id', self.user_id)\
-                .gte('date', start_date.isoformat())\
-                .order('date', desc=False)\
-                .execute()
+            today = date.today()
+            start_date = today - timedelta(days=days-1)
             
-            return result.data if result.data else []
+            return self.cache.cached(
+                ('last_n_days', user_id, days, today), (start_date, today),
+                lambda: self.supabase.table('daily_summary')
+                    .select(DAILY_SUMMARY_COLUMNS)
+                    .eq('user_id', user_id)
+                    .gte('date', start_date.isoformat())
+                    .order('date', desc=False)
+                    .execute().data or [])
             
         except Exception as e:
+            if raise_errors and not _is_no_rows(e):
+                raise
             error_dict = e.args[0] if e.args else {}
             if isinstance(error_dict, dict) and error_dict.get('code') != 'PGRST116':
                 print(f"Error getting last {days} days: {e}")
             return []
     
-    def get_top_apps(self, days: int = 7) -> Dict[str, List[Dict[str, Any]]]:
-        """Get top apps by category for the last N days"""
+    def get_top_apps(self, days: int = 7, limit: int = 5, user_id: Optional[str] = None,
+                     raise_errors: bool = False) -> Dict[str, List[Dict[str, Any]]]:
+        """Get top apps by category for the last N days (raise_errors: raise failures instead of returning {})
+        
+        Ranked in Postgres by the top_apps_by_category function
+        (supabase/migrations/20261017020000_top_apps_by_category.sql), so only
+        limit rows per category are transferred.
+        """
         try:
-            if not self.user_id:
-                self.get_demo_user_id()
+            user_id = self._user(user_id)
             
-            start_date = date.today() - timedelta(days=days-1)
+            today = date.today()
+            start_date = today - timedelta(days=days-1)
+            rows = self.cache.cached(('top_apps', user_id, days, limit, today), (start_date, today),
+                                     lambda: self._top_app_rows(user_id, start_date, limit))
             
-            result = self.supabase.table('app_usage')\
-                .select('*')\
-                .eq('user_id', self.user_id)\
-                .gte('date', start_date.isoformat())\
-                .order('total_minutes', desc=True)\
-                .execute()
-            
-            # Group by category
+            # Group by category (rows arrive ranked within each category)
             apps_by_category = {}
-            for app in result.data:
-                category = app['category']
-                if category not in apps_by_category:
-                    apps_by_category[category] = []
-                apps_by_category[category].append(app)
-            
-            # Limit to top 5 per category
-            for category in apps_by_category:
-                apps_by_category[category] = apps_by_category[category][:5]
+            for app in rows:
+                apps_by_category.setdefault(app['category'], []).append(app)
             
             return apps_by_category
             
         except Exception as e:
+            if raise_errors and not _is_no_rows(e):
+                raise
             error_dict = e.args[0] if e.args else {}
             if isinstance(error_dict, dict) and error_dict.get('code') != 'PGRST116':
                 print(f"Error getting top apps: {e}")
             return {}
     
-    def get_activity_logs(self, target_date: date = None, limit: int = 100) -> List[Dict[str, Any]]:
-        """Get activity logs for a specific date"""
+    def _top_app_rows(self, user_id: str, start_date: date, limit: int) -> List[Dict[str, Any]]:
+        """Top apps per category since start_date, ranked by category"""
         try:
-            if not self.user_id:
-                self.get_demo_user_id()
+            return self.supabase.rpc('top_apps_by_category', {
+                'p_user_id': user_id,
+                'start_date': start_date.isoformat(),
+                'max_per_category': limit
+            }).execute().data or []
+        except Exception as e:
+            print(f"top_apps_by_category RPC unavailable, ranking in Python: {e}")
+            return self._rank_top_apps(user_id, start_date, limit)
+    
+    def _rank_top_apps(self, user_id: str, start_date: date, limit: int) -> List[Dict[str, Any]]:
+        """Fallback for top_apps_by_category: per-app totals ranked here"""
+        result = self.supabase.table('app_usage')\
+            .select(APP_USAGE_COLUMNS)\
+            .eq('user_id', user_id)\
+            .gte('date', start_date.isoformat())\
+            .execute()
+        
+        totals = {}
+        for app in result.data or []:
+            key = (app['category'], app['app_name'])
+            total = totals.setdefault(key, {'app_name': app['app_name'], 'category': app['category'],
+                                            'total_minutes': 0, 'usage_count': 0})
+            total['total_minutes'] += app.get('total_minutes') or 0
+            total['usage_count'] += app.get('usage_count') or 0
+        
+        ranked = sorted(totals.values(), key=lambda app: (app['category'], -app['total_minutes'], app['app_name']))
+        rows, per_category = [], {}
+        for app in ranked:
+            per_category[app['category']] = per_category.get(app['category'], 0) + 1
+            if per_category[app['category']] <= limit:
+                rows.append(app)
+        return rows
+    
+    def get_activity_logs(self, target_date: date = None, limit: int = 100,
+                          before: Optional[Dict[str, str]] = None,
+                          user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Get activity logs for a specific date, newest first
+        
+        Keyset pagination: pass the last row of a page as before
+        ({'timestamp', 'app_name'}) to get the next page.
+        """
+        try:
+            user_id = self._user(user_id)
             
             if target_date is None:
                 target_date = date.today()
             
-            result = self.supabase.table('activity_logs')\
-                .select('*')\
-                .eq('user_id', self.user_id)\
-                .eq('date', target_date.isoformat())\
-                .order('timestamp', desc=True)\
-                .limit(limit)\
-                .execute()
-            
-            return result.data if result.data else []
+            query = self.supabase.table('activity_logs')\
+                .select(ACTIVITY_LOG_COLUMNS)\
+                .eq('user_id', user_id)\
+                .eq('date', target_date.isoformat())
+            
+            if before:
+                # (timestamp, app_name) is unique per user, so the cursor never skips or repeats rows
+                timestamp = _filter_value(before['timestamp'])
+                query = query.or_(f"timestamp.lt.{timestamp},"
+                                  f"and(timestamp.eq.{timestamp},app_name.lt.{_filter_value(before['app_name'])})")
+            
+            cursor = (before['timestamp'], before['app_name']) if before else None
+            return self.cache.cached(
+                ('activity_logs', user_id, target_date, limit, cursor), (target_date, target_date),
+                lambda: query
+                    .order('timestamp', desc=True)
+                    .order('app_name', desc=True)
+                    .limit(limit)
+                    .execute().data or [])
             
         except Exception as e:
             print(f"Error getting activity logs: {e}")
             return []
     
-    def update_weekly_summary(self, target_date: date = None):
+    def update_weekly_summary(self, target_date: date = None, user_id: Optional[str] = None):
         """Manually trigger weekly summary calculation"""
         try:
-            if not self.user_id:
-                self.get_demo_user_id()
+            user_id = self._user(user_id)
             
             if target_date is None:
                 target_date = date.today()
             
             # Call the PostgreSQL function
             result = self.supabase.rpc('calculate_weekly_summary', {
-                'target_user_id': self.user_id,
+                'target_user_id': user_id,
                 'target_date': target_date.isoformat()
             }).execute()
             
+            week_start = target_date - timedelta(days=target_date.weekday())
+            self.cache.invalidate_dates([week_start + timedelta(days=i) for i in range(7)])
             print(f"Weekly summary updated for {target_date}")
             return True
             
@@ -273,21 +406,21 @@ class SupabaseHelper:
             print(f"Error updating weekly summary: {e}")
             return False
     
-    def cleanup_old_data(self, days_to_keep: int = 30):
+    def cleanup_old_data(self, days_to_keep: int = 30, user_id: Optional[str] = None):
         """Clean up old activity logs (keep only last N days)"""
         try:
-            if not self.user_id:
-                self.get_demo_user_id()
+            user_id = self._user(user_id)
             
             cutoff_date = date.today() - timedelta(days=days_to_keep)
             
             # Delete old activity logs
             result = self.supabase.table('activity_logs')\
                 .delete()\
-                .eq('user_id', self.user_id)\
+                .eq('user_id', user_id)\
                 .lt('date', cutoff_date.isoformat())\
                 .execute()
             
+            self.cache.clear()
             print(f"Cleaned up activity logs older than {cutoff_date}")
             return True
             
@@ -295,19 +428,46 @@ class SupabaseHelper:
             print(f"Error cleaning up old data: {e}")
             return False
     
-    def get_comprehensive_stats(self) -> Dict[str, Any]:
-        """Get all stats in one call for dashboard"""
+    def fetch_parallel(self, queries: Dict[str, Callable[[], Any]],
+                       timeout: float = QUERY_TIMEOUT) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """Run independent queries concurrently, waiting at most timeout seconds in total.
+        
+        Returns (results, errors): a query that raised or did not finish in
+        time is None in results and explained in errors, so callers can still
+        serve the parts that did arrive. Pass getters with raise_errors=True,
+        or their failures look like empty data.
+        """
+        futures = {name: self._pool.submit(query) for name, query in queries.items()}
+        deadline = time.monotonic() + timeout
+        results, errors = {}, {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result(timeout=max(0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                results[name] = None
+                errors[name] = f"timed out after {timeout}s"
+            except Exception as e:
+                results[name] = None
+                errors[name] = str(e)
+        if errors:
+            print(f"Partial results, failed queries: {errors}")
+        return results, errors
+    
+    def get_comprehensive_stats(self, timeout: float = QUERY_TIMEOUT,
+                                user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Get all stats in one call for dashboard (queries run in parallel)"""
         try:
-            today_summary = self.get_daily_summary()
-            last_7_days = self.get_last_n_days(7)
-            top_apps = self.get_top_apps(7)
-            
-            return {
-                'today': today_summary,
-                'last_7_days': last_7_days,
-                'top_apps': top_apps,
-                'timestamp': datetime.now().isoformat()
-            }
+            user_id = self._user(user_id)
+            stats, errors = self.fetch_parallel({
+                'today': lambda: self.get_daily_summary(user_id=user_id, raise_errors=True),
+                'last_7_days': lambda: self.get_last_n_days(7, user_id=user_id, raise_errors=True),
+                'top_apps': lambda: self.get_top_apps(7, user_id=user_id, raise_errors=True)
+            }, timeout)
+            
+            stats['timestamp'] = datetime.now().isoformat()
+            if errors:
+                stats['errors'] = errors
+            return stats
             
         except Exception as e:
             print(f"Error getting comprehensive stats: {e}")
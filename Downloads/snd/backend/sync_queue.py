@@ -0,0 +1,248 @@
+# sync_queue.py
+"""
+Write-behind Supabase sync for the desktop tracker.
+
+Activities are first written to a durable SQLite spool, then a background
+worker sends them to Supabase in batches (by size or age), retrying with
+exponential backoff. Rows are only removed from the spool once Supabase has
+accepted them, so a crash or an offline afternoon never loses data: whatever
+is left is sent on the next run. Every row carries an idempotency key so a
+replayed row maps onto the same spool entry instead of a second copy.
+
+Only transient failures (network, timeouts, 5xx) are retried as is. When
+Supabase rejects a batch outright (4xx: a constraint violation, bad data) the
+batch is bisected to find the offending rows, which move to the spool's
+`failed` table so the rows behind them keep syncing.
+"""
+
+import hashlib
+import json
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+SPOOL_PATH = 'sync_spool.db'
+# Error codes worth retrying: SQLSTATE classes for connection, resource and
+# transaction failures, and auth/permission errors (fixed by configuration,
+# not by dropping rows)
+TRANSIENT_SQLSTATE_CLASSES = ('08', '28', '40', '53', '54', '55', '57', '58', 'XX')
+TRANSIENT_CODES = ('42501', 'PGRST0', 'PGRST3')  # code prefixes
+TRANSIENT_HTTP_STATUSES = (401, 403, 408, 429)
+
+def activity_key(user_id: Optional[str], activity: Dict[str, Any]) -> str:
+    """Deterministic key for an activity row: (user_id, timestamp, app_name)"""
+    natural_key = f"{user_id or ''}|{activity['timestamp']}|{activity['app_name']}"
+    return hashlib.sha1(natural_key.encode('utf-8')).hexdigest()
+
+def is_permanent_error(error: Exception) -> bool:
+    """True when Supabase rejected the rows themselves, so resending them can't succeed
+
+    PostgREST errors carry a SQLSTATE, a PGRST code or (for non-JSON error
+    bodies) the HTTP status as `code` (a str or an int); anything without one, such as a
+    network error or a timeout, is transient.
+    """
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        code = str(code)
+    if not isinstance(code, str) or not code:
+        return False
+    if code.isdigit() and len(code) == 3:
+        status = int(code)
+        return 400 <= status < 500 and status not in TRANSIENT_HTTP_STATUSES
+    return not (code.startswith(TRANSIENT_CODES) or code[:2] in TRANSIENT_SQLSTATE_CLASSES)
+
+
+class SyncSpool:
+    """Durable FIFO of activity rows waiting to be synced (SQLite)."""
+
+    def __init__(self, path: str = SPOOL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pending (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                idempotency_key TEXT NOT NULL UNIQUE,
+                payload TEXT NOT NULL,
+                enqueued_at REAL NOT NULL
+            )
+        """)
+        # Rows Supabase rejected, kept for inspection instead of blocking the queue
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS failed (
+                seq INTEGER PRIMARY KEY,
+                idempotency_key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                error TEXT NOT NULL,
+                failed_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def add(self, key: str, activity: Dict[str, Any]) -> bool:
+        """Spool an activity; returns False if the key is already pending"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT OR IGNORE INTO pending (idempotency_key, payload, enqueued_at) VALUES (?, ?, ?)",
+                (key, json.dumps(activity), time.time()))
+            self._conn.commit()
+            return cursor.rowcount == 1
+
+    def peek(self, limit: int) -> List[tuple]:
+        """Oldest (seq, payload) rows, without removing them"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, payload FROM pending ORDER BY seq LIMIT ?", (limit,)).fetchall()
+        return [(seq, json.loads(payload)) for seq, payload in rows]
+
+    def remove(self, seqs: List[int]):
+        """Drop rows that Supabase has accepted"""
+        with self._lock:
+            self._conn.executemany("DELETE FROM pending WHERE seq = ?", [(seq,) for seq in seqs])
+            self._conn.commit()
+
+    def dead_letter(self, seq: int, error: str):
+        """Move a row Supabase rejected to the failed table"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO failed (seq, idempotency_key, payload, enqueued_at, error, failed_at) "
+                "SELECT seq, idempotency_key, payload, enqueued_at, ?, ? FROM pending WHERE seq = ?",
+                (error, time.time(), seq))
+            self._conn.execute("DELETE FROM pending WHERE seq = ?", (seq,))
+            self._conn.commit()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def failed_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM failed").fetchone()[0]
+
+    def oldest_age(self) -> float:
+        """Seconds since the oldest pending row was spooled (0 when empty)"""
+        with self._lock:
+            oldest = self._conn.execute("SELECT MIN(enqueued_at) FROM pending").fetchone()[0]
+        return time.time() - oldest if oldest else 0.0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SupabaseSyncWorker(threading.Thread):
+    """Background thread that drains the spool into Supabase.
+
+    send_batch receives a list of activity dicts and returns True once they
+    are stored, or raises (e.g. SupabaseHelper.upsert_activity_batch with
+    raise_errors=True). A batch is sent when batch_size rows are pending or
+    the oldest row is max_batch_age seconds old. Transient failures back off
+    exponentially up to max_backoff; permanently rejected rows are isolated
+    by bisection and dead-lettered (see is_permanent_error).
+    """
+
+    def __init__(self, send_batch: Callable[[List[Dict[str, Any]]], bool], spool: SyncSpool,
+                 user_id: Optional[str] = None, batch_size: int = 20, max_batch_age: float = 30,
+                 base_backoff: float = 2, max_backoff: float = 300,
+                 on_synced: Optional[Callable[[List[Dict[str, Any]]], None]] = None):
+        super().__init__(name="supabase-sync", daemon=True)
+        self.send_batch = send_batch
+        self.spool = spool
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.max_batch_age = max_batch_age
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.on_synced = on_synced
+        self.synced = 0
+        self.rejected = 0
+        self._failures = 0
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def enqueue(self, activity: Dict[str, Any]):
+        """Durably queue one activity row (never touches the network)"""
+        self.spool.add(activity_key(self.user_id, activity), activity)
+        if self.spool.count() >= self.batch_size:
+            self._wake.set()
+
+    def _due(self) -> bool:
+        pending = self.spool.count()
+        if not pending:
+            return False
+        return (self._stopping.is_set() or pending >= self.batch_size
+                or self.spool.oldest_age() >= self.max_batch_age)
+
+    def _send_next_batch(self) -> bool:
+        rows = self.spool.peek(self.batch_size)
+        if not rows:
+            return True
+        return self._send_rows(rows)
+
+    def _send_rows(self, rows: List[tuple]) -> bool:
+        """Send (seq, activity) rows; False on a transient failure (retry later)"""
+        activities = [activity for _, activity in rows]
+        try:
+            ok = self.send_batch(activities)
+        except Exception as e:
+            if not is_permanent_error(e):
+                print(f"Error syncing to Supabase: {e}")
+                return False
+            if len(rows) > 1:
+                # Bisect: the accepted halves are removed, the rejected rows isolated
+                middle = len(rows) // 2
+                return self._send_rows(rows[:middle]) and self._send_rows(rows[middle:])
+            self.spool.dead_letter(rows[0][0], str(e))
+            self.rejected += 1
+            print(f"❌ Supabase rejected an activity ({e}), moved it to the failed table of {self.spool.path}")
+            return True
+        if not ok:
+            return False
+
+        self.spool.remove([seq for seq, _ in rows])
+        self.synced += len(rows)
+        print(f"✅ Synced {len(rows)} activities to Supabase")
+        if self.on_synced:
+            try:
+                self.on_synced(activities)
+            except Exception as e:
+                print(f"Sync callback failed: {e}")
+        return True
+
+    def run(self):
+        poll_interval = min(self.max_batch_age, 1.0)
+        while True:
+            self._wake.wait(poll_interval)
+            self._wake.clear()
+
+            while self._due():
+                if self._send_next_batch():
+                    self._failures = 0
+                    continue
+
+                self._failures += 1
+                if self._stopping.is_set():
+                    break
+                delay = min(self.max_backoff, self.base_backoff * 2 ** (self._failures - 1))
+                delay *= random.uniform(0.8, 1.2)
+                print(f"⚠️  Supabase sync failed, retrying in {delay:.0f}s ({self.spool.count()} pending)")
+                # Sleep through the backoff, but wake up immediately on stop()
+                if self._stopping.wait(delay):
+                    continue
+
+            if self._stopping.is_set():
+                break
+
+    def stop(self, timeout: float = 10):
+        """Try a final flush, then stop; anything unsent stays in the spool"""
+        self._stopping.set()
+        self._wake.set()
+        self.join(timeout)
+        pending = self.spool.count()
+        if pending:
+            print(f"💾 {pending} activities kept in {self.spool.path}, they will sync on the next run")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test script for the phone usage endpoints
+Runs /api/phone-usage-today and /api/phone-usage-weekly against the SQLite
+stand-in (sqlite_rpc.py) and checks them against totals computed here:
+through the phone_usage_daily rollups (also after late and deleted logs),
+and through the pandas fallback (no migrations deployed)
+"""
+
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from sqlite_rpc import NIL_USER_ID, SqliteRpcClient, phone_duration_seconds
+from auth_context import DEMO_USER_ID, JWT_AUDIENCE, encode_jwt
+import flask_backend_step2 as backend
+
+JWT_SECRET = 'phone-usage-test-secret'
+OTHER_USER_ID = '6b1d7c38-2f4e-4d8a-9c1b-2a7e5d9f0c11'
+
+def build_sample_rows():
+    """A week of phone usage with a few malformed durations"""
+    now = datetime.now(timezone.utc)
+    apps = ['WhatsApp', 'YouTube', 'Chrome', 'Instagram', 'Spotify', 'Maps']
+    rows = []
+    for day in range(7):
+        for i, app in enumerate(apps):
+            for repeat in range(day % 3 + 1):
+                rows.append({
+                    'app_name': app,
+                    'duration': f"00:{(i + repeat) % 60:02d}:{(day * 7 + i) % 60:02d}" if i % 2 else f"{i + day}:{repeat * 10:02d}",
+                    'created_at': (now - timedelta(days=day, minutes=(30 if day else 0) + i * 13 + repeat)).isoformat()
+                })
+    rows.append({'app_name': None, 'duration': '00:05:00', 'created_at': now.isoformat()})
+    rows.append({'app_name': 'Broken', 'duration': 'n/a', 'created_at': now.isoformat()})
+    return rows
+
+def expected_totals(rows, user_ids):
+    """Per-app seconds for today and per-day seconds (UTC days) of user_ids, computed row by row"""
+    today = datetime.now(timezone.utc).date()
+    app_seconds = {}
+    day_seconds = {}
+    for row in rows:
+        if (row.get('user_id') or NIL_USER_ID) not in user_ids:
+            continue
+        created_at = datetime.fromisoformat(row['created_at']).astimezone(timezone.utc)
+        seconds = phone_duration_seconds(row['duration'])
+        app_name = row['app_name'] or 'Unknown'
+        if created_at.date() == today:
+            app_seconds[app_name] = app_seconds.get(app_name, 0) + seconds
+        day = created_at.date().isoformat()
+        day_seconds[day] = day_seconds.get(day, 0) + seconds
+    return app_seconds, day_seconds
+
+def check_endpoints(api, rows, mode, user_id=DEMO_USER_ID):
+    # The demo user also sees logs sent without a user
+    app_seconds, day_seconds = expected_totals(rows, [user_id, NIL_USER_ID] if user_id == DEMO_USER_ID else [user_id])
+    headers = {}
+    if user_id != DEMO_USER_ID:
+        token = encode_jwt({'sub': user_id, 'aud': JWT_AUDIENCE, 'exp': time.time() + 300}, JWT_SECRET)
+        headers['Authorization'] = f'Bearer {token}'
+        mode += ', other user'
+
+    today = api.get('/api/phone-usage-today', headers=headers).get_json()
+    assert today['total_apps'] == len(app_seconds), today
+    assert today['total_minutes'] == round(sum(app_seconds.values()) / 60.0, 2), today
+    expected_top = sorted(app_seconds.items(), key=lambda x: (-x[1], x[0]))[:5]
+    assert [app['app'] for app in today['top_apps']] == [app for app, _ in expected_top], today
+    print(f"✅ Today ({mode}): {today['total_minutes']} min over {today['total_apps']} apps")
+
+    weekly = api.get('/api/phone-usage-weekly', headers=headers).get_json()['weekly_data']
+    assert len(weekly) == 7
+    for day in weekly:
+        assert day['minutes'] == round(day_seconds.get(day['date'], 0) / 60.0, 2), day
+    print(f"✅ Weekly ({mode}): {[day['minutes'] for day in weekly]}")
+
+def test_phone_usage():
+    print("=" * 60)
+    print("🧪 Phone Usage RPC Test (SQLite stand-in)")
+    print("=" * 60)
+
+    os.environ['SUPABASE_JWT_SECRET'] = JWT_SECRET
+    rows = build_sample_rows()
+    for row in rows[::2]:
+        row['user_id'] = DEMO_USER_ID  # The rest are unowned
+    other_rows = [dict(row, user_id=OTHER_USER_ID, duration='00:01:00') for row in build_sample_rows()[::3]]
+    rows += other_rows
+    client = SqliteRpcClient()
+    client.insert_app_usage(rows)
+    backend.use_supabase(client)  # After the background connect, which would replace it
+    api = backend.app.test_client()
+    check_endpoints(api, rows, 'rollups')
+    check_endpoints(api, rows, 'rollups', OTHER_USER_ID)
+
+    response = api.get('/api/phone-usage-today', headers={'Authorization': 'Bearer not.a.token'})
+    assert response.status_code == 401, response.status_code
+    print("✅ Invalid token rejected with 401")
+
+    # Rollups follow late logs for closed days and deleted logs
+    now = datetime.now(timezone.utc)
+    late = [{'app_name': 'YouTube', 'duration': '01:00:00', 'created_at': (now - timedelta(days=3)).isoformat()}]
+    client.insert_app_usage(late)
+    cutoff = now - timedelta(days=5)
+    client.delete_app_usage(cutoff)
+    rows = [row for row in rows + late if datetime.fromisoformat(row['created_at']) >= cutoff]
+    check_endpoints(api, rows, 'rollups after a late log and a delete')
+
+    # As if the migrations weren't deployed
+    client.functions.clear()
+    client.drop_rollups()
+    check_endpoints(api, rows, 'pandas fallback')
+    check_endpoints(api, rows, 'pandas fallback', OTHER_USER_ID)
+
+    print("\n✅ Phone usage endpoints match the row-by-row totals")
+
+if __name__ == "__main__":
+    test_phone_usage()
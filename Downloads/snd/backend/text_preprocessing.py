@@ -0,0 +1,74 @@
+# text_preprocessing.py
+"""
+Text preprocessing shared by the classifier backend and the tracker.
+
+Produces exactly the same tokens as the notebook's original preprocessing():
+lowercase, strip URLs, keep ASCII letter runs, drop English stopwords and
+Porter-stem what is left. Patterns are compiled once and stems are memoized,
+since window titles repeat the same handful of words all day.
+
+NLTK (which pulls in scipy) is only imported when the first title is
+processed, or when load_nltk() is called, so importing this module is cheap.
+"""
+
+import re
+import threading
+
+URL_PATTERN = re.compile(r"http\S+")
+# Everything outside [a-zA-Z] used to be replaced by spaces and then split on
+# whitespace, which is the same as collecting the runs of ASCII letters.
+TOKEN_PATTERN = re.compile(r"[a-z]+")
+MAX_STEM_TABLE_SIZE = 100_000
+
+_stop_words = None
+_port_stemmer = None
+_stem_table = {}
+_load_lock = threading.Lock()
+
+def load_nltk():
+    """Imports NLTK and loads the stopwords (downloading them if missing). Runs once."""
+    global _stop_words, _port_stemmer
+    with _load_lock:
+        if _stop_words is not None:
+            return
+        import nltk
+        from nltk.corpus import stopwords
+        from nltk import PorterStemmer
+
+        try:
+            stopwords.words('english')
+        except LookupError:
+            nltk.download('stopwords')
+            nltk.download('punkt')
+
+        _port_stemmer = PorterStemmer()
+        _stop_words = frozenset(stopwords.words('english'))
+
+def __getattr__(name):
+    # STOP_WORDS stays importable, but loading it is deferred to first use
+    if name == 'STOP_WORDS':
+        load_nltk()
+        return _stop_words
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def stem(word):
+    """Porter-stems a single token, memoizing the result."""
+    stemmed = _stem_table.get(word)
+    if stemmed is None:
+        if _port_stemmer is None:
+            load_nltk()
+        stemmed = _port_stemmer.stem(word)
+        if len(_stem_table) < MAX_STEM_TABLE_SIZE:
+            _stem_table[word] = stemmed
+    return stemmed
+
+def tokenize(text):
+    """Lowercases text, removes URLs and returns the ASCII letter runs."""
+    return TOKEN_PATTERN.findall(URL_PATTERN.sub("", text.lower()))
+
+def preprocessing(text):
+    """Normalizes a window title for the TF-IDF vectorizer."""
+    if _stop_words is None:
+        load_nltk()
+    stop_words = _stop_words
+    return ' '.join([stem(word) for word in tokenize(text) if word not in stop_words])
@@ -0,0 +1,115 @@
+# conversation_store.py
+"""
+Per-session chat history for main.py, kept in SQLite.
+
+Each message is one row keyed by session_id, so appending a turn is a single
+insert and loading the context for a reply reads only the session's last few
+rows through the (session_id, id) index, however long the history grows.
+Messages are stored whole, so multi-line replies come back unchanged.
+
+The database runs in WAL mode: readers never block the writer, and writers
+from several threads (or gunicorn workers) queue on SQLite's lock instead of
+interleaving appends the way the old shared text file did.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB_PATH = os.getenv('CONVERSATION_DB', 'conversations.db')
+DEFAULT_SESSION = 'default'  # Requests that don't send a session_id
+MAX_SESSION_ID_LENGTH = 128
+BUSY_TIMEOUT = 30  # seconds a writer waits for another writer's lock
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_session_idx ON messages (session_id, id);
+"""
+
+
+def session_key(session_id):
+    """Normalize a client-supplied session id ('default' when missing)"""
+    if session_id is None or str(session_id).strip() == '':
+        return DEFAULT_SESSION
+    return str(session_id).strip()[:MAX_SESSION_ID_LENGTH]
+
+
+class ConversationStore:
+    """Chat messages grouped by session, in one SQLite file"""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()  # sqlite3 connections are per thread
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")  # Durable at checkpoints, safe against corruption
+            self._local.conn = conn
+        return conn
+
+    def append(self, session_id, *messages):
+        """Append (role, content) pairs to a session in one transaction"""
+        now = time.time()
+        rows = [(session_key(session_id), role, content, now) for role, content in messages]
+        with self._connection() as conn:
+            conn.executemany(
+                "INSERT INTO messages (session_id, role, content, created_at) VALUES (?, ?, ?, ?)", rows)
+
+    def recent(self, session_id, limit):
+        """The session's last `limit` messages, oldest first, as Ollama chat messages"""
+        rows = self._connection().execute(
+            "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+            (session_key(session_id), limit)).fetchall()
+        return [{"role": role, "content": content} for role, content in reversed(rows)]
+
+    def clear(self, session_id=None):
+        """Forget one session, or every session when none is given"""
+        with self._connection() as conn:
+            if session_id is None:
+                conn.execute("DELETE FROM messages")
+            else:
+                conn.execute("DELETE FROM messages WHERE session_id = ?", (session_key(session_id),))
+
+
+if __name__ == "__main__":
+    # Self-check on a throwaway database
+    import tempfile
+    from concurrent.futures import ThreadPoolExecutor
+
+    store = ConversationStore(os.path.join(tempfile.mkdtemp(), 'conversations.db'))
+    reply = "1. 📊 **Overall Impression**:\n   - Solid.\n\nAssistant: not a new message"
+    store.append('alice', ('user', 'Review this'), ('assistant', reply))
+    store.append(None, ('user', 'hi'))
+    assert store.recent('alice', 10) == [{"role": "user", "content": "Review this"},
+                                         {"role": "assistant", "content": reply}]
+    assert store.recent('', 10) == [{"role": "user", "content": "hi"}]
+    print("✅ Multi-line replies and sessions kept apart")
+
+    def chat(worker):
+        for turn in range(200):
+            store.append(f'session-{worker}', ('user', f'{worker}:{turn}'), ('assistant', f'reply {turn}'))
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(chat, range(8)))
+    for worker in range(8):
+        last = store.recent(f'session-{worker}', 4)
+        assert [m['content'] for m in last] == [f'{worker}:198', 'reply 198', f'{worker}:199', 'reply 199'], last
+    print("✅ 8 concurrent writers, 3,200 messages, last turns in order")
+
+    store.clear('alice')
+    assert store.recent('alice', 10) == [] and store.recent('session-0', 1)
+    store.clear()
+    assert store.recent('session-0', 1) == []
+    print("✅ Conversation store checks passed")
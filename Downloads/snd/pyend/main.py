@@ -1,18 +1,55 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 import ollama
 from dotenv import load_dotenv
+import json
 import os
+import time
 import fitz  # PyMuPDF for PDF
 import docx  # python-docx for DOCX
+from conversation_store import ConversationStore
 
 load_dotenv()
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for frontend integration
 
-# Path to store the conversation in a text file
-CONVERSATION_FILE = "conversation_history.txt"
+# Chat history, per session (see conversation_store.py)
+conversations = ConversationStore()
+HISTORY_MESSAGES = 20  # Earlier messages sent to the model with each request (10 turns)
+
+OLLAMA_MODEL = "llama3.2:3b"
+OLLAMA_OPTIONS = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "max_tokens": 1024
+}
+
+CHAT_SYSTEM_PROMPT = (
+    "You are a helpful, knowledgeable AI assistant specializing in resume writing and career advice. "
+    "Provide thoughtful, detailed, and professional guidance to help users create strong, polished resumes "
+    "that effectively showcase their skills, experience, and achievements."
+)
+
+RESUME_SYSTEM_PROMPT = """
+You are a powerful and strict resume-analyzing bot. Your job is to provide no-fluff, high-precision feedback. Be blunt, professional, and results-oriented.
+
+Structure your response using the following format:
+
+1. 📊 **Overall Impression**:
+   - Write a 2–3 sentence summary of how effective this resume is for recruiters and ATS systems.
+   - Include an estimated **ATS score out of 100** based on keyword relevance, formatting, structure, and clarity.
+
+2. 🔴 **Critical Drawbacks**: Directly point out all major issues. Be specific and strict. Do not sugar-coat. Be brutally honest if necessary.
+
+3. 🟡 **Weak Keywords to Replace**: List vague or overused terms that should be replaced with stronger, results-driven alternatives.
+
+4. 🟢 **Must-Have Skills to Add**: Suggest relevant skills missing from the resume, based on current industry/job expectations.
+
+5. ⚙️ **Direct Action Tips**: Provide concise and powerful improvement tips.
+
+Be firm. Your goal is to prepare this resume to compete with the top 5% in the job market.
+"""
 
 # ======== Resume Extraction Helpers ========
 
@@ -41,91 +78,133 @@ def extract_resume_content(filepath):
     else:
         return "Unsupported file format."
 
-# ======== Chat API with Text File Conversation Storage ========
+# ======== Chat API with Per-Session Conversation Storage ========
+
+def build_chat_messages(session_id, user_input):
+    # Start with the system message to define AI behavior
+    messages = [{"role": "system", "content": CHAT_SYSTEM_PROMPT}]
+
+    # Add this session's most recent messages
+    try:
+        messages.extend(conversations.recent(session_id, HISTORY_MESSAGES))
+    except Exception as e:
+        app.logger.error(f"Failed to read conversation history: {str(e)}")
+        # Continue with an empty conversation
+
+    # Append current user input
+    messages.append({"role": "user", "content": user_input})
+    return messages
+
+def save_chat_turn(session_id, user_input, ai_reply):
+    try:
+        conversations.append(session_id, ("user", user_input), ("assistant", ai_reply))
+    except Exception as e:
+        app.logger.error(f"Failed to save conversation history: {str(e)}")
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
     user_input = request.json.get('message')
-    session_id = request.json.get('session_id')  # Optional session id if you want to extend
+    session_id = request.json.get('session_id')  # Optional; requests without one share the 'default' session
 
     if not user_input:
         return jsonify({"error": "Message is required."}), 400
 
-    # Start with the system message to define AI behavior
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are a helpful, knowledgeable AI assistant specializing in resume writing and career advice. "
-                "Provide thoughtful, detailed, and professional guidance to help users create strong, polished resumes "
-                "that effectively showcase their skills, experience, and achievements."
-            )
-        }
-    ]
-
-    # Read existing conversation from file if exists, and parse into messages
-    if os.path.exists(CONVERSATION_FILE):
-        try:
-            with open(CONVERSATION_FILE, 'r', encoding='utf-8') as file:
-                for line in file:
-                    line = line.strip()
-                    if line.startswith("User:"):
-                        # Extract user content and append
-                        content = line[len("User:"):].strip()
-                        if content:
-                            messages.append({"role": "user", "content": content})
-                    elif line.startswith("Assistant:"):
-                        # Extract assistant content and append
-                        content = line[len("Assistant:"):].strip()
-                        if content:
-                            messages.append({"role": "assistant", "content": content})
-        except Exception as e:
-            app.logger.error(f"Failed to read conversation history: {str(e)}")
-            # Optionally continue with empty conversation
-
-    # Append current user input
-    messages.append({"role": "user", "content": user_input})
+    messages = build_chat_messages(session_id, user_input)
 
     try:
         # Call the Ollama chat API with the full conversation
-        response = ollama.chat(
-            model="llama3.2:3b",
-            messages=messages,
-            options={
-                "temperature": 0.7,
-                "top_p": 0.95,
-                "max_tokens": 1024
-            }
-        )
+        response = ollama.chat(model=OLLAMA_MODEL, messages=messages, options=OLLAMA_OPTIONS)
 
         ai_reply = response['message']['content']
-
-        # Append the new messages to the conversation history file
-        try:
-            with open(CONVERSATION_FILE, 'a', encoding='utf-8') as file:
-                file.write(f"User: {user_input}\nAssistant: {ai_reply}\n")
-        except Exception as e:
-            app.logger.error(f"Failed to save conversation history: {str(e)}")
-
+        save_chat_turn(session_id, user_input, ai_reply)
         return jsonify({"reply": ai_reply})
 
     except Exception as e:
         app.logger.error(f"Chat error: {str(e)}")
         return jsonify({"error": f"Chat error: {str(e)}"}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """Same as /api/chat, but forwards the reply token by token as Server-Sent Events."""
+    user_input = request.json.get('message')
+    session_id = request.json.get('session_id')  # Optional; requests without one share the 'default' session
+
+    if not user_input:
+        return jsonify({"error": "Message is required."}), 400
+
+    messages = build_chat_messages(session_id, user_input)
+    return sse_response(stream_completion(messages, lambda reply: save_chat_turn(session_id, user_input, reply)))
+
+
+# ======== Streaming (Server-Sent Events) ========
+# Tokens are forwarded as Ollama yields them:
+#   event: token   data: {"content": "..."}
+#   event: done    data: {"reply": "<full text>", "metrics": {...}}
+#   event: error   data: {"error": "..."}
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def sse_response(events):
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+def stream_completion(messages, on_complete, done_fields=None):
+    started = time.perf_counter()
+    first_token_at = None
+    parts = []
+    chunks = 0
+    final = None
+
+    try:
+        for chunk in ollama.chat(model=OLLAMA_MODEL, messages=messages, options=OLLAMA_OPTIONS, stream=True):
+            content = chunk['message']['content']
+            if content:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(content)
+                chunks += 1
+                yield sse_event('token', {'content': content})
+            if chunk.get('done'):
+                final = chunk
+    except Exception as e:
+        app.logger.error(f"Streaming error: {str(e)}")
+        yield sse_event('error', {'error': f"Chat error: {str(e)}"})
+        return
+
+    finished = time.perf_counter()
+    ai_reply = ''.join(parts)
+    # Ollama reports the generated token count and generation time (ns) in the last chunk
+    tokens = (final or {}).get('eval_count') or chunks
+    generating = finished - first_token_at if first_token_at is not None else 0
+    metrics = {
+        'time_to_first_token_ms': round((first_token_at - started) * 1000, 1) if first_token_at is not None else None,
+        'total_ms': round((finished - started) * 1000, 1),
+        'tokens': tokens,
+        'tokens_per_second': round(tokens / generating, 2) if generating > 0 else None,
+    }
+    eval_duration = (final or {}).get('eval_duration')
+    if eval_duration:
+        metrics['model_tokens_per_second'] = round(tokens / (eval_duration / 1e9), 2)
+    app.logger.info(f"Streamed {tokens} tokens: TTFT {metrics['time_to_first_token_ms']} ms, "
+                    f"{metrics['tokens_per_second']} tokens/s")
+
+    on_complete(ai_reply)
+    yield sse_event('done', {**(done_fields or {}), 'reply': ai_reply, 'metrics': metrics})
+
 
 # ======== File Upload and Resume Analysis API ========
 
-@app.route('/api/upload', methods=['POST'])
-def upload_file():
+def save_and_extract_upload():
+    # Returns (filename, resume_text, None) or (None, None, error response)
     if 'file' not in request.files:
-        return jsonify({'error': 'No file part in the request'}), 400
+        return None, None, (jsonify({'error': 'No file part in the request'}), 400)
 
     file = request.files['file']
     filename = file.filename
 
     if filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+        return None, None, (jsonify({'error': 'No file selected'}), 400)
 
     uploads_dir = os.path.join(os.getcwd(), 'uploads')
     os.makedirs(uploads_dir, exist_ok=True)
@@ -136,52 +215,35 @@ def upload_file():
     resume_text = extract_resume_content(file_path)
 
     if resume_text.startswith("Error") or resume_text == "Unsupported file format.":
-        return jsonify({'error': resume_text}), 400
-
-    try:
-        response = ollama.chat(
-            model="llama3.2:3b",
-            messages=[
-                 {
-                    "role": "system",
-"content": """
-You are a powerful and strict resume-analyzing bot. Your job is to provide no-fluff, high-precision feedback. Be blunt, professional, and results-oriented.
-
-Structure your response using the following format:
+        return None, None, (jsonify({'error': resume_text}), 400)
+    return filename, resume_text, None
 
-1. 📊 **Overall Impression**:
-   - Write a 2–3 sentence summary of how effective this resume is for recruiters and ATS systems.
-   - Include an estimated **ATS score out of 100** based on keyword relevance, formatting, structure, and clarity.
-
-2. 🔴 **Critical Drawbacks**: Directly point out all major issues. Be specific and strict. Do not sugar-coat. Be brutally honest if necessary.
-
-3. 🟡 **Weak Keywords to Replace**: List vague or overused terms that should be replaced with stronger, results-driven alternatives.
-
-4. 🟢 **Must-Have Skills to Add**: Suggest relevant skills missing from the resume, based on current industry/job expectations.
+def build_resume_messages(resume_text):
+    return [
+        {"role": "system", "content": RESUME_SYSTEM_PROMPT},
+        {"role": "user", "content": resume_text}
+    ]
 
-5. ⚙️ **Direct Action Tips**: Provide concise and powerful improvement tips.
+def save_upload_turn(session_id, filename, ai_reply):
+    try:
+        conversations.append(session_id,
+                             ("user", f"Uploaded file {filename}"),
+                             ("assistant", f"File {filename} uploaded and analyzed."),
+                             ("assistant", ai_reply))
+    except Exception as e:
+        app.logger.error(f"Failed to save conversation history: {str(e)}")
 
-Be firm. Your goal is to prepare this resume to compete with the top 5% in the job market.
-"""
+@app.route('/api/upload', methods=['POST'])
+def upload_file():
+    filename, resume_text, error = save_and_extract_upload()
+    if error:
+        return error
 
-                },
-                {
-                    "role": "user",
-                    "content": resume_text
-                }
-            ],
-            options={
-                "temperature": 0.7,
-                "top_p": 0.95,
-                "max_tokens": 1024
-            }
-        )
+    try:
+        response = ollama.chat(model=OLLAMA_MODEL, messages=build_resume_messages(resume_text), options=OLLAMA_OPTIONS)
 
         ai_reply = response['message']['content']
-        with open(CONVERSATION_FILE, 'a', encoding='utf-8') as file:
-            file.write(f"User: Uploaded file {filename}\n")
-            file.write(f"Assistant: File {filename} uploaded and analyzed.\n")
-            file.write(f"Assistant: {ai_reply}\n\n")
+        save_upload_turn(request.form.get('session_id'), filename, ai_reply)
         return jsonify({
             'message': f'File {filename} uploaded and analyzed successfully.',
             'analysis': ai_reply
@@ -190,6 +252,18 @@ Be firm. Your goal is to prepare this resume to compete with the top 5% in the j
     except Exception as e:
         return jsonify({'error': f'Failed to analyze resume: {str(e)}'}), 500
 
+@app.route('/api/upload/stream', methods=['POST'])
+def upload_file_stream():
+    """Same as /api/upload, but streams the analysis as Server-Sent Events."""
+    filename, resume_text, error = save_and_extract_upload()
+    if error:
+        return error
+
+    session_id = request.form.get('session_id')
+    done_fields = {'message': f'File {filename} uploaded and analyzed successfully.'}
+    return sse_response(stream_completion(build_resume_messages(resume_text),
+                                          lambda reply: save_upload_turn(session_id, filename, reply), done_fields))
+
 # (Optional) Serve uploaded files if needed for preview/download
 @app.route('/uploads/<filename>')
 def uploaded_file(filename):
@@ -199,8 +273,7 @@ def uploaded_file(filename):
 # ======== Run App ========
 
 if __name__ == '__main__':
-    # Clear the conversation history file when the server starts
-    if os.path.exists(CONVERSATION_FILE):
-        os.remove(CONVERSATION_FILE)
+    # Clear the conversation history when the server starts
+    conversations.clear()
     
     app.run(debug=True)
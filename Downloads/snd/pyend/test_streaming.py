@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test the streaming endpoints (/api/chat/stream, /api/upload/stream) against a
+fake Ollama server that sends its reply slowly, one token at a time
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOKENS = ["Tighten ", "your ", "summary.\n", "- Quantify ", "your ", "results."]
+TOKEN_DELAY = 0.2  # seconds between tokens
+
+class FakeOllama(BaseHTTPRequestHandler):
+    """Answers POST /api/chat like Ollama: NDJSON chunks, then a final chunk with eval stats"""
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        chunks = [{'model': body['model'], 'message': {'role': 'assistant', 'content': token}, 'done': False}
+                  for token in TOKENS]
+        chunks.append({'model': body['model'], 'message': {'role': 'assistant', 'content': ''}, 'done': True,
+                       'done_reason': 'stop', 'eval_count': len(TOKENS),
+                       'eval_duration': int(TOKEN_DELAY * len(TOKENS) * 1e9)})
+        for chunk in chunks:
+            data = (json.dumps(chunk) + '\n').encode('utf-8')
+            self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+            self.wfile.flush()
+            time.sleep(TOKEN_DELAY)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+def read_events(response):
+    """Parse the SSE stream, noting when each event arrived"""
+    started = time.perf_counter()
+    events, buffer = [], ''
+    for data in response.response:
+        buffer += data.decode('utf-8') if isinstance(data, bytes) else data
+        while '\n\n' in buffer:
+            block, buffer = buffer.split('\n\n', 1)
+            fields = dict(line.split(': ', 1) for line in block.split('\n'))
+            events.append((fields['event'], json.loads(fields['data']), time.perf_counter() - started))
+    return events
+
+def check_stream(name, events):
+    tokens = [data['content'] for event, data, _ in events if event == 'token']
+    event, done, done_at = events[-1]
+    first_token_at = next(at for event, _, at in events if event == 'token')
+    metrics = done['metrics']
+
+    ok = True
+    ok &= check(event == 'done', f"{name}: ends with a done event")
+    ok &= check(tokens == TOKENS and done['reply'] == ''.join(TOKENS), f"{name}: {len(tokens)} tokens forwarded in order")
+    ok &= check(first_token_at < done_at - TOKEN_DELAY * (len(TOKENS) - 2),
+                f"{name}: first token after {first_token_at * 1000:.0f} ms, reply done after {done_at * 1000:.0f} ms")
+    ok &= check(metrics['tokens'] == len(TOKENS) and metrics['time_to_first_token_ms'] < metrics['total_ms'],
+                f"{name}: metrics {metrics}")
+    ok &= check(abs(metrics['model_tokens_per_second'] - 1 / TOKEN_DELAY) < 0.01, f"{name}: tokens/s from eval_duration")
+    return ok
+
+def check(condition, message):
+    print(f"{'✅' if condition else '❌'} {message}")
+    return condition
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeOllama)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['OLLAMA_HOST'] = f"http://127.0.0.1:{server.server_port}"  # Read when ollama is imported
+
+    os.chdir(tempfile.mkdtemp())  # Keep conversations.db and uploads/ out of the repo
+    import sys
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import docx
+    from main import app, conversations
+
+    client = app.test_client()
+    passed = True
+
+    print("💬 /api/chat/stream")
+    response = client.post('/api/chat/stream', json={'message': 'How do I improve my resume?', 'session_id': 'alice'})
+    passed &= check(response.mimetype == 'text/event-stream', "Served as text/event-stream")
+    passed &= check_stream('chat', read_events(response))
+
+    print("📄 /api/upload/stream")
+    resume = docx.Document()
+    resume.add_paragraph("Jane Doe - Software Engineer")
+    resume.add_paragraph("Worked on various projects.")
+    resume.save('resume.docx')
+    with open('resume.docx', 'rb') as file:
+        response = client.post('/api/upload/stream', data={'file': (file, 'resume.docx'), 'session_id': 'bob'},
+                               content_type='multipart/form-data')
+    events = read_events(response)
+    passed &= check_stream('upload', events)
+    passed &= check(events[-1][1]['message'] == 'File resume.docx uploaded and analyzed successfully.',
+                    "upload: done event carries the upload message")
+
+    reply = ''.join(TOKENS)
+    passed &= check(conversations.recent('alice', 10) == [{'role': 'user', 'content': 'How do I improve my resume?'},
+                                                          {'role': 'assistant', 'content': reply}],
+                    "Chat turn saved to its own session, multi-line reply intact")
+    bob = conversations.recent('bob', 10)
+    passed &= check(len(bob) == 3 and bob[0]['content'] == 'Uploaded file resume.docx' and bob[-1]['content'] == reply,
+                    "Upload saved to its own session")
+
+    response = client.post('/api/chat/stream', json={})
+    passed &= check(response.status_code == 400, "Missing message rejected before streaming")
+
+    server.shutdown()
+    print("✅ Streaming checks passed" if passed else "❌ Streaming checks failed")
+    sys.exit(0 if passed else 1)
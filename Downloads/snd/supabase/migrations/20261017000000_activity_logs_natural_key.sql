@@ -0,0 +1,75 @@
+-- Natural key for activity_logs: one row per (user_id, timestamp, app_name).
+-- Lets SupabaseHelper.upsert_activity_batch replay batches (importer reruns,
+-- tracker sync retries) without creating duplicates.
+
+-- Days that had duplicates: their summaries were built from the duplicates too
+CREATE TEMP TABLE deduplicated_days AS
+SELECT user_id, date FROM activity_logs WITH NO DATA;
+
+-- Remove duplicates left by earlier plain inserts, keeping the first row of each key
+WITH removed AS (
+    DELETE FROM activity_logs
+    WHERE id IN (
+        SELECT id FROM (
+            SELECT id,
+                   row_number() OVER (PARTITION BY user_id, "timestamp", app_name ORDER BY id) AS duplicate_rank
+            FROM activity_logs
+        ) ranked
+        WHERE duplicate_rank > 1
+    )
+    RETURNING user_id, date
+)
+INSERT INTO deduplicated_days
+SELECT DISTINCT user_id, date FROM removed;
+
+ALTER TABLE activity_logs
+    ADD CONSTRAINT activity_logs_natural_key UNIQUE (user_id, "timestamp", app_name);
+
+-- Rebuild those days' daily_summary rows from the remaining logs
+-- (same figures as the update_daily_summary trigger)
+DELETE FROM daily_summary s
+USING deduplicated_days d
+WHERE s.user_id = d.user_id AND s.date = d.date;
+
+INSERT INTO daily_summary (user_id, date, study_minutes, entertainment_minutes, others_minutes, total_minutes,
+                           study_percentage, entertainment_percentage, others_percentage,
+                           most_used_app, total_activities)
+WITH per_day AS (
+    SELECT l.user_id, l.date,
+           coalesce(sum(l.duration_seconds) FILTER (WHERE l.category = 'study'), 0) / 60.0 AS study_minutes,
+           coalesce(sum(l.duration_seconds) FILTER (WHERE l.category = 'entertainment'), 0) / 60.0 AS entertainment_minutes,
+           coalesce(sum(l.duration_seconds) FILTER (WHERE l.category = 'others'), 0) / 60.0 AS others_minutes,
+           sum(l.duration_seconds) / 60.0 AS total_minutes,
+           count(*) AS total_activities
+    FROM activity_logs l
+    JOIN deduplicated_days d ON d.user_id = l.user_id AND d.date = l.date
+    GROUP BY l.user_id, l.date
+),
+top_app AS (
+    SELECT DISTINCT ON (l.user_id, l.date) l.user_id, l.date, l.app_name
+    FROM activity_logs l
+    JOIN deduplicated_days d ON d.user_id = l.user_id AND d.date = l.date
+    GROUP BY l.user_id, l.date, l.app_name
+    ORDER BY l.user_id, l.date, sum(l.duration_seconds) DESC, l.app_name
+)
+SELECT p.user_id, p.date,
+       round(p.study_minutes::numeric, 2),
+       round(p.entertainment_minutes::numeric, 2),
+       round(p.others_minutes::numeric, 2),
+       round(p.total_minutes::numeric, 2),
+       CASE WHEN p.total_minutes > 0 THEN round((p.study_minutes / p.total_minutes * 100)::numeric, 2) ELSE 0 END,
+       CASE WHEN p.total_minutes > 0 THEN round((p.entertainment_minutes / p.total_minutes * 100)::numeric, 2) ELSE 0 END,
+       CASE WHEN p.total_minutes > 0 THEN round((p.others_minutes / p.total_minutes * 100)::numeric, 2) ELSE 0 END,
+       t.app_name,
+       p.total_activities
+FROM per_day p
+JOIN top_app t ON t.user_id = p.user_id AND t.date = p.date;
+
+-- ...and the weeks containing them
+SELECT calculate_weekly_summary(weeks.user_id, weeks.week_start)
+FROM (
+    SELECT DISTINCT user_id, date_trunc('week', date)::date AS week_start
+    FROM deduplicated_days
+) weeks;
+
+DROP TABLE deduplicated_days;
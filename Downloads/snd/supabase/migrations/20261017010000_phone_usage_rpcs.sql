@@ -0,0 +1,55 @@
+-- Server-side aggregation for the phone usage endpoints.
+-- /api/phone-usage-today and /api/phone-usage-weekly call these through
+-- supabase.rpc(...) instead of downloading and parsing every app_usage_logs row.
+-- backend/sqlite_rpc.py mirrors them for local tests.
+
+CREATE INDEX IF NOT EXISTS app_usage_logs_created_at_idx ON app_usage_logs (created_at);
+
+-- 'HH:MM:SS' or 'MM:SS' -> seconds (anything else counts as 0)
+CREATE OR REPLACE FUNCTION phone_duration_seconds(duration text)
+RETURNS integer
+LANGUAGE sql IMMUTABLE AS $$
+    SELECT CASE
+        WHEN duration ~ '^\d+:\d+:\d+$'
+            THEN split_part(duration, ':', 1)::int * 3600
+               + split_part(duration, ':', 2)::int * 60
+               + split_part(duration, ':', 3)::int
+        WHEN duration ~ '^\d+:\d+$'
+            THEN split_part(duration, ':', 1)::int * 60
+               + split_part(duration, ':', 2)::int
+        ELSE 0
+    END
+$$;
+
+-- Total seconds per app since a point in time, largest first
+CREATE OR REPLACE FUNCTION phone_usage_by_app(since timestamptz)
+RETURNS TABLE (app_name text, total_seconds bigint)
+LANGUAGE sql STABLE AS $$
+    SELECT coalesce(l.app_name, 'Unknown') AS app_name,
+           sum(phone_duration_seconds(l.duration))::bigint AS total_seconds
+    FROM app_usage_logs l
+    WHERE l.created_at >= since
+    GROUP BY 1
+    ORDER BY 2 DESC, 1
+$$;
+
+-- Total seconds and most used app per (UTC) day between two dates, inclusive
+CREATE OR REPLACE FUNCTION phone_usage_by_day(start_date date, end_date date)
+RETURNS TABLE (usage_date date, total_seconds bigint, top_app text)
+LANGUAGE sql STABLE AS $$
+    WITH per_app AS (
+        SELECT (l.created_at AT TIME ZONE 'UTC')::date AS usage_date,
+               coalesce(l.app_name, 'Unknown') AS app_name,
+               sum(phone_duration_seconds(l.duration)) AS seconds
+        FROM app_usage_logs l
+        WHERE l.created_at >= (start_date::timestamp AT TIME ZONE 'UTC')
+          AND l.created_at < ((end_date + 1)::timestamp AT TIME ZONE 'UTC')
+        GROUP BY 1, 2
+    )
+    SELECT DISTINCT ON (p.usage_date)
+           p.usage_date,
+           (sum(p.seconds) OVER (PARTITION BY p.usage_date))::bigint AS total_seconds,
+           p.app_name AS top_app
+    FROM per_app p
+    ORDER BY p.usage_date, p.seconds DESC, p.app_name
+$$;
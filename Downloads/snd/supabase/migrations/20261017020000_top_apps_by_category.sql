@@ -0,0 +1,27 @@
+-- Top N apps per category over a date range, ranked in Postgres.
+-- SupabaseHelper.get_top_apps calls this instead of downloading every
+-- app_usage row for the range and truncating to N per category in Python.
+
+CREATE INDEX IF NOT EXISTS app_usage_user_date_idx ON app_usage (user_id, date);
+CREATE INDEX IF NOT EXISTS activity_logs_user_date_timestamp_idx
+    ON activity_logs (user_id, date, "timestamp" DESC, app_name DESC);
+
+CREATE OR REPLACE FUNCTION top_apps_by_category(p_user_id uuid, start_date date, max_per_category int DEFAULT 5)
+RETURNS TABLE (app_name text, category text, total_minutes numeric, usage_count bigint)
+LANGUAGE sql STABLE AS $$
+    SELECT ranked.app_name, ranked.category, ranked.total_minutes, ranked.usage_count
+    FROM (
+        SELECT a.app_name,
+               a.category,
+               sum(a.total_minutes)::numeric AS total_minutes,
+               sum(a.usage_count)::bigint AS usage_count,
+               row_number() OVER (PARTITION BY a.category
+                                  ORDER BY sum(a.total_minutes) DESC, a.app_name) AS app_rank
+        FROM app_usage a
+        WHERE a.user_id = p_user_id
+          AND a.date >= start_date
+        GROUP BY a.category, a.app_name
+    ) ranked
+    WHERE ranked.app_rank <= max_per_category
+    ORDER BY ranked.category, ranked.app_rank
+$$;
@@ -0,0 +1,87 @@
+-- Per-(user, day, app) phone usage rollups, kept current by a trigger.
+-- /api/phone-usage-today and /api/phone-usage-weekly read these instead of
+-- re-aggregating the raw app_usage_logs of every day in range on each call,
+-- so their cost no longer grows with the number of logs.
+-- Days are UTC dates, durations are parsed by phone_duration_seconds()
+-- (20261017010000_phone_usage_rpcs.sql). backend/sqlite_rpc.py mirrors this.
+
+-- Logs sent without a user are counted under the nil UUID
+ALTER TABLE app_usage_logs ADD COLUMN IF NOT EXISTS user_id uuid;
+
+CREATE TABLE IF NOT EXISTS phone_usage_daily (
+    user_id uuid NOT NULL DEFAULT '00000000-0000-0000-0000-000000000000',
+    usage_date date NOT NULL,
+    app_name text NOT NULL,
+    total_seconds bigint NOT NULL DEFAULT 0,
+    log_count integer NOT NULL DEFAULT 0,
+    updated_at timestamptz NOT NULL DEFAULT now(),
+    PRIMARY KEY (user_id, usage_date, app_name)
+);
+
+-- Adds (sign = 1) or removes (sign = -1) one log's contribution
+CREATE OR REPLACE FUNCTION phone_usage_daily_apply(log app_usage_logs, sign integer)
+RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO phone_usage_daily AS d (user_id, usage_date, app_name, total_seconds, log_count)
+    VALUES (coalesce(log.user_id, '00000000-0000-0000-0000-000000000000'),
+            (log.created_at AT TIME ZONE 'UTC')::date,
+            coalesce(log.app_name, 'Unknown'),
+            sign * phone_duration_seconds(log.duration),
+            sign)
+    ON CONFLICT (user_id, usage_date, app_name) DO UPDATE
+        SET total_seconds = d.total_seconds + excluded.total_seconds,
+            log_count = d.log_count + excluded.log_count,
+            updated_at = now()
+$$;
+
+CREATE OR REPLACE FUNCTION phone_usage_daily_trigger()
+RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM phone_usage_daily_apply(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM phone_usage_daily_apply(NEW, 1);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS app_usage_logs_rollup ON app_usage_logs;
+CREATE TRIGGER app_usage_logs_rollup
+    AFTER INSERT OR UPDATE OR DELETE ON app_usage_logs
+    FOR EACH ROW EXECUTE FUNCTION phone_usage_daily_trigger();
+
+-- Backfill from the logs that predate the trigger
+INSERT INTO phone_usage_daily (user_id, usage_date, app_name, total_seconds, log_count)
+SELECT coalesce(l.user_id, '00000000-0000-0000-0000-000000000000'),
+       (l.created_at AT TIME ZONE 'UTC')::date,
+       coalesce(l.app_name, 'Unknown'),
+       sum(phone_duration_seconds(l.duration)),
+       count(*)
+FROM app_usage_logs l
+GROUP BY 1, 2, 3
+ON CONFLICT (user_id, usage_date, app_name) DO UPDATE
+    SET total_seconds = excluded.total_seconds,
+        log_count = excluded.log_count,
+        updated_at = now();
+
+-- Same result as before, now read from the rollups (a handful of rows per day)
+CREATE OR REPLACE FUNCTION phone_usage_by_day(start_date date, end_date date)
+RETURNS TABLE (usage_date date, total_seconds bigint, top_app text)
+LANGUAGE sql STABLE AS $$
+    WITH per_app AS (
+        SELECT d.usage_date, d.app_name, sum(d.total_seconds) AS seconds
+        FROM phone_usage_daily d
+        WHERE d.usage_date BETWEEN start_date AND end_date
+          AND d.log_count > 0
+        GROUP BY 1, 2
+    )
+    SELECT DISTINCT ON (p.usage_date)
+           p.usage_date,
+           (sum(p.seconds) OVER (PARTITION BY p.usage_date))::bigint AS total_seconds,
+           p.app_name AS top_app
+    FROM per_app p
+    ORDER BY p.usage_date, p.seconds DESC, p.app_name
+$$;
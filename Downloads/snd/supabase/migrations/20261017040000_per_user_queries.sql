@@ -0,0 +1,48 @@
+-- Per-user scoping for the multi-user backend.
+-- Every backend query now names the user it serves (from the request's JWT),
+-- so each one can be answered from a (user_id, ...) index instead of a scan
+-- over all users' rows. The phone functions take the user ids to include:
+-- the demo user also sees logs sent without a user (rolled up under the nil
+-- UUID, see 20261017030000_phone_usage_daily.sql).
+
+CREATE INDEX IF NOT EXISTS daily_summary_user_date_idx ON daily_summary (user_id, date);
+CREATE INDEX IF NOT EXISTS weekly_summary_user_week_idx ON weekly_summary (user_id, year, week_number);
+CREATE INDEX IF NOT EXISTS app_usage_logs_owner_created_at_idx
+    ON app_usage_logs ((coalesce(user_id, '00000000-0000-0000-0000-000000000000'::uuid)), created_at);
+-- phone_usage_daily is already keyed (user_id, usage_date, app_name)
+
+DROP FUNCTION IF EXISTS phone_usage_by_app(timestamptz);
+DROP FUNCTION IF EXISTS phone_usage_by_day(date, date);
+
+-- Total seconds per app since a point in time, largest first
+CREATE OR REPLACE FUNCTION phone_usage_by_app(p_user_ids uuid[], since timestamptz)
+RETURNS TABLE (app_name text, total_seconds bigint)
+LANGUAGE sql STABLE AS $$
+    SELECT coalesce(l.app_name, 'Unknown') AS app_name,
+           sum(phone_duration_seconds(l.duration))::bigint AS total_seconds
+    FROM app_usage_logs l
+    WHERE coalesce(l.user_id, '00000000-0000-0000-0000-000000000000'::uuid) = ANY (p_user_ids)
+      AND l.created_at >= since
+    GROUP BY 1
+    ORDER BY 2 DESC, 1
+$$;
+
+-- Total seconds and most used app per (UTC) day between two dates, from the rollups
+CREATE OR REPLACE FUNCTION phone_usage_by_day(p_user_ids uuid[], start_date date, end_date date)
+RETURNS TABLE (usage_date date, total_seconds bigint, top_app text)
+LANGUAGE sql STABLE AS $$
+    WITH per_app AS (
+        SELECT d.usage_date, d.app_name, sum(d.total_seconds) AS seconds
+        FROM phone_usage_daily d
+        WHERE d.user_id = ANY (p_user_ids)
+          AND d.usage_date BETWEEN start_date AND end_date
+          AND d.log_count > 0
+        GROUP BY 1, 2
+    )
+    SELECT DISTINCT ON (p.usage_date)
+           p.usage_date,
+           (sum(p.seconds) OVER (PARTITION BY p.usage_date))::bigint AS total_seconds,
+           p.app_name AS top_app
+    FROM per_app p
+    ORDER BY p.usage_date, p.seconds DESC, p.app_name
+$$;